@@ -0,0 +1,99 @@
+"""
+Compares single-pass item hydration (ZoteroDatabase.hydrate_items_local) with
+the previous five-query path, which stitched item data, creators, tags,
+relations and collections together by key.
+
+Usage:
+    source .env
+    python -m benchmarks.bench_hydration [-r REPEAT] [-n LIMIT]
+"""
+
+import time
+import argparse
+import statistics
+from src.db import ZoteroDatabase
+
+
+def five_query_items(db, keys=[], item_type='-note || attachment', tags=[], limit=-1):
+    """
+    Previous implementation of ZoteroDatabase.get_items for the local database.
+    """
+    items = db.get_items_data_local(None, keys, item_type, tags, limit)
+    creators_data = db.get_items_creators_local(None, keys, item_type, tags, limit)
+    tags_data = db.get_items_tags_local(None, keys, item_type, tags, limit)
+    relations_data = db.get_items_relations_local(None, keys, item_type, tags, limit)
+    collections_data = db.get_items_collections_local(None, keys, item_type, tags, limit)
+    for i in items:
+        if i['key'] in creators_data:
+            i['creators'] = creators_data[i['key']]
+        if i['key'] in tags_data:
+            i['tags'] = tags_data[i['key']]
+        if i['key'] in relations_data:
+            i['relations'] = relations_data[i['key']]
+        if i['key'] in collections_data:
+            i['collections'] = collections_data[i['key']]
+    return items
+
+
+def single_pass_items(db, limit=-1):
+    return db.hydrate_items_local(item_type='-note || attachment', limit=limit)
+
+
+def normalize(item):
+    """
+    Makes items comparable regardless of list order.
+    """
+    item = dict(item)
+    for k in ['creators', 'tags', 'collections']:
+        if k in item:
+            item[k] = sorted(map(str, item[k]))
+    if 'relations' in item:
+        item['relations'] = {p: sorted(o) for p, o in item['relations'].items()}
+    return item
+
+
+def mismatches(old_items, new_items):
+    """
+    Returns keys whose items differ between both paths. Fields the old path did
+    not select at all are ignored.
+    """
+    new = {i['key']: normalize(i) for i in new_items}
+    keys = []
+    for i in old_items:
+        old = normalize(i)
+        other = new.get(i['key'], {})
+        if any(other.get(k) != v for k, v in old.items()):
+            keys.append(i['key'])
+    return keys
+
+
+def timeit(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return result, timings
+
+
+def main(repeat=5, limit=-1):
+    db = ZoteroDatabase()
+    old_items, old_t = timeit(lambda: five_query_items(db, limit=limit), repeat)
+    new_items, new_t = timeit(lambda: single_pass_items(db, limit=limit), repeat)
+    db.close_connection()
+
+    print('items: {} (five queries) / {} (single pass)'.format(len(old_items), len(new_items)))
+    for name, t in [('five queries', old_t), ('single pass', new_t)]:
+        print('{:>13}: min {:.3f}s  median {:.3f}s'.format(name, min(t), statistics.median(t)))
+    print('speedup (median): {:.2f}x'.format(statistics.median(old_t) / statistics.median(new_t)))
+    if limit < 0:
+        diff = mismatches(old_items, new_items)
+        print('mismatching items:', len(diff), diff[:10])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-r', '--repeat', type=int, default=5)
+    parser.add_argument('-n', '--limit', type=int, default=-1)
+    args = parser.parse_args()
+    main(args.repeat, args.limit)
@@ -0,0 +1,259 @@
+"""
+Times the hot paths of papiermache on synthetic libraries of increasing size:
+ZoteroDatabase.get_items, get_autocompletes, get_autocomplete_tags,
+Dispatcher.__init__ with and without snapshot, Dispatcher.fix_names, Dispatcher.build_file_name, the
+latency of the completer per keystroke and the time to the first prompt with
+autocompletes built in the background.
+
+Libraries are generated once per size and seed (see synthetic.py) and kept
+in benchmarks/data. Results are written as JSON to benchmarks/results, one
+file per commit, so regressions show up by comparing two files, see compare.
+
+Usage:
+    source .env
+    python -m benchmarks.bench_suite [-s SIZES ...] [-r REPEAT] [-o OUTPUT]
+    python -m benchmarks.bench_suite --compare OLD.json NEW.json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import contextlib
+import platform
+import datetime
+import statistics
+import subprocess
+from prompt_toolkit.document import Document
+from prompt_toolkit.completion import CompleteEvent
+from benchmarks.synthetic import generate_library
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BENCH_DIR, 'data')
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+
+SIZES = [1000, 10000, 100000]
+
+# number of items fix_names and build_file_name are timed on
+SAMPLE_SIZE = 100
+
+
+def git_commit():
+    """
+    Returns:
+        hash of the checked out commit, suffixed with '-dirty' if the tree has
+        uncommitted changes, 'unknown' outside of git
+    """
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                         cwd=BENCH_DIR, text=True).strip()
+        dirty = subprocess.check_output(['git', 'status', '--porcelain', '--untracked-files=no'],
+                                        cwd=BENCH_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+    return commit + ('-dirty' if dirty else '')
+
+
+def library(size, seed=0):
+    """
+    Returns:
+        path of the synthetic library of the given size, generated if missing
+    """
+    os.makedirs(DATA_DIR, exist_ok=True)
+    path = os.path.join(DATA_DIR, 'zotero_{}_{}.sqlite'.format(size, seed))
+    if not os.path.exists(path):
+        print('generating library with {} items...'.format(size))
+        start = time.perf_counter()
+        generate_library(path + '.tmp', size, seed)
+        os.replace(path + '.tmp', path)
+        print('  done in {:.1f}s'.format(time.perf_counter() - start))
+    return path
+
+
+def timeit(func, repeat):
+    """
+    Returns:
+        dict with min, median and max of the wall times in seconds
+    """
+    timings = []
+    # progress output of the timed functions would distort the timings
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+    return {'min': min(timings), 'median': statistics.median(timings),
+            'max': max(timings), 'repeat': repeat}
+
+
+def keystrokes(completer, inputs):
+    """
+    Types each input character by character, collecting all completions
+    after each keystroke like the prompt does.
+
+    Returns:
+        dict with min, median and max of the wall times per keystroke
+    """
+    timings = []
+    for text in inputs:
+        for n in range(1, len(text) + 1):
+            start = time.perf_counter()
+            list(completer.get_completions(Document(text[:n]), CompleteEvent()))
+            timings.append(time.perf_counter() - start)
+    return {'min': min(timings), 'median': statistics.median(timings),
+            'max': max(timings), 'repeat': len(timings)}
+
+
+def bench_size(size, repeat, seed=0):
+    """
+    Runs all benchmarks against one library.
+
+    Returns:
+        dict {benchmark: timings}
+    """
+    # imported late, the modules read their configuration from the environment
+    from src.db import ZoteroDatabase
+    from src.dispatcher import Dispatcher
+
+    workdir = os.path.join(DATA_DIR, 'run_{}_{}'.format(size, seed))
+    os.makedirs(workdir, exist_ok=True)
+    os.environ['ZOTERO_DB_PATH'] = library(size, seed)
+    # the sidecar cache and journal of the user must not be touched
+    os.environ['PAPIERMACHE_CACHE_PATH'] = os.path.join(workdir, 'cache.sqlite')
+    os.environ['PAPIERMACHE_JOURNAL_PATH'] = os.path.join(workdir, 'journal.jsonl')
+    os.environ['PAPIERMACHE_SNAPSHOT_PATH'] = os.path.join(workdir, 'snapshot.bin')
+    os.environ.pop('PAPIERMACHE_PROFILE', None)
+    for name in ['cache.sqlite', 'journal.jsonl', 'snapshot.bin']:
+        if os.path.exists(os.path.join(workdir, name)):
+            os.remove(os.path.join(workdir, name))
+
+    results = dict()
+    db = ZoteroDatabase()
+    results['get_items'] = timeit(lambda: db.get_items(local_cursor=db.cursor), repeat)
+    results['get_autocompletes'] = timeit(lambda: db.get_autocompletes(db.cursor), repeat)
+    results['get_autocomplete_tags'] = timeit(lambda: db.get_autocomplete_tags(db.cursor), repeat)
+    db.close_connection()
+
+    dispatchers = []
+
+    def init():
+        dispatcher = Dispatcher(None)
+        dispatchers.append(dispatcher)
+
+    # the first run builds the sidecar cache and the snapshot, later runs
+    # refresh the cache and load the snapshot
+    results['Dispatcher.__init__ (cold)'] = timeit(init, 1)
+    results['Dispatcher.__init__'] = timeit(init, repeat)
+
+    def rebuild():
+        os.remove(os.environ['PAPIERMACHE_SNAPSHOT_PATH'])
+        init()
+
+    results['Dispatcher.__init__ (no snapshot)'] = timeit(rebuild, repeat)
+
+    # the prompt shows before the autocompletes are built in the background
+    def first_prompt():
+        dispatchers.append(Dispatcher(None, background=True))
+
+    results['time to first prompt'] = timeit(first_prompt, repeat)
+    for d in dispatchers[-repeat:]:
+        d.wait_ready()
+    warm_up = [d.warm_up_time for d in dispatchers[-repeat:]]
+    results['warm-up'] = {'min': min(warm_up), 'median': statistics.median(warm_up),
+                          'max': max(warm_up), 'repeat': repeat}
+
+    dispatcher = dispatchers.pop()
+    for d in dispatchers:
+        d.db.close_connection()
+        d.journal.close()
+
+    keys = list(dispatcher.papers)[:SAMPLE_SIZE]
+    # a paper typed from its start, and words of a title
+    names = [dispatcher.papers[k] for k in keys[:10]]
+    inputs = ['select ' + n for n in names] + ['select ' + n.split(' - ', 1)[-1][:20] for n in names]
+    results['completer keystroke'] = keystrokes(dispatcher.completer, inputs)
+    results['fix_names'] = timeit(lambda: dispatcher.fix_names(keys, safe_mode=True), repeat)
+    items = dispatcher.db.get_items(keys, local_cursor=dispatcher.db.cursor)
+    results['build_file_name'] = timeit(lambda: [dispatcher.build_file_name(i) for i in items], repeat)
+    dispatcher.db.close_connection()
+    dispatcher.journal.close()
+    return results
+
+
+def run(sizes=SIZES, repeat=5, seed=0, output=None):
+    """
+    Runs the suite and writes the results.
+
+    Returns:
+        path of the results file
+    """
+    commit = git_commit()
+    report = {
+        'commit': commit,
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'seed': seed,
+        'sample_size': SAMPLE_SIZE,
+        'results': dict(),
+        }
+    for size in sizes:
+        print('{} items'.format(size))
+        results = bench_size(size, repeat, seed)
+        for name, t in results.items():
+            print('  {:>32}: min {:.4f}s  median {:.4f}s'.format(name, t['min'], t['median']))
+        report['results'][str(size)] = results
+
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, commit + '.json')
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print('results written to', output)
+    return output
+
+
+def compare(old_path, new_path, threshold=0.1):
+    """
+    Prints the change of median timings between two results files.
+
+    Arguments:
+        threshold: relative slowdown reported as regression
+
+    Returns:
+        list of (size, benchmark) regressions
+    """
+    with open(old_path, encoding='utf-8') as f:
+        old = json.load(f)
+    with open(new_path, encoding='utf-8') as f:
+        new = json.load(f)
+
+    print('{} -> {}'.format(old['commit'], new['commit']))
+    regressions = []
+    for size, results in new['results'].items():
+        for name, t in results.items():
+            before = old['results'].get(size, {}).get(name)
+            if before is None:
+                continue
+            change = t['median'] / before['median'] - 1 if before['median'] > 0 else 0
+            flag = ''
+            if change > threshold:
+                flag = '  REGRESSION'
+                regressions.append((size, name))
+            print('{:>8} {:>32}: {:.4f}s -> {:.4f}s ({:+.0%}){}'.format(
+                size, name, before['median'], t['median'], change, flag))
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-s', '--sizes', type=int, nargs='+', default=SIZES)
+    parser.add_argument('-r', '--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-o', '--output')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'))
+    args = parser.parse_args()
+    if args.compare:
+        sys.exit(1 if compare(*args.compare) else 0)
+    run(args.sizes, args.repeat, args.seed, args.output)
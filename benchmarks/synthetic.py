@@ -0,0 +1,504 @@
+"""
+Generates synthetic zotero.sqlite libraries for benchmarking and testing.
+
+The schema mirrors the subset of Zotero's userdata/system tables that
+papiermache reads, incl. the indices Zotero creates on them. Libraries
+contain creators, tags, collections, relations, attachments, notes and the
+syncCache of API responses.
+
+Usage:
+    python -m benchmarks.synthetic PATH [-n ITEMS] [--seed SEED]
+"""
+
+import os
+import json
+import random
+import string
+import sqlite3
+import argparse
+
+
+SCHEMA = """
+CREATE TABLE version (schema TEXT PRIMARY KEY, version INT NOT NULL);
+CREATE TABLE libraries (
+    libraryID INTEGER PRIMARY KEY,
+    type TEXT NOT NULL,
+    editable INT NOT NULL,
+    filesEditable INT NOT NULL,
+    version INT NOT NULL DEFAULT 0,
+    storageVersion INT NOT NULL DEFAULT 0,
+    lastSync INT NOT NULL DEFAULT 0,
+    archived INT NOT NULL DEFAULT 0
+);
+CREATE TABLE itemTypes (
+    itemTypeID INTEGER PRIMARY KEY,
+    typeName TEXT,
+    templateItemTypeID INT,
+    display INT DEFAULT 1
+);
+CREATE TABLE fields (
+    fieldID INTEGER PRIMARY KEY,
+    fieldName TEXT,
+    fieldFormatID INT
+);
+CREATE TABLE creatorTypes (creatorTypeID INTEGER PRIMARY KEY, creatorType TEXT);
+CREATE TABLE charsets (charsetID INTEGER PRIMARY KEY, charset TEXT UNIQUE);
+CREATE TABLE syncObjectTypes (syncObjectTypeID INTEGER PRIMARY KEY, name TEXT);
+CREATE INDEX syncObjectTypes_name ON syncObjectTypes(name);
+CREATE TABLE items (
+    itemID INTEGER PRIMARY KEY,
+    itemTypeID INT NOT NULL,
+    dateAdded TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    dateModified TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    clientDateModified TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    libraryID INT NOT NULL,
+    key TEXT NOT NULL,
+    version INT NOT NULL DEFAULT 0,
+    synced INT NOT NULL DEFAULT 0,
+    UNIQUE (libraryID, key)
+);
+CREATE INDEX items_synced ON items(synced);
+CREATE TABLE itemDataValues (valueID INTEGER PRIMARY KEY, value UNIQUE);
+CREATE TABLE itemData (
+    itemID INT,
+    fieldID INT,
+    valueID,
+    PRIMARY KEY (itemID, fieldID)
+);
+CREATE INDEX itemData_fieldID ON itemData(fieldID);
+CREATE TABLE itemNotes (
+    itemID INTEGER PRIMARY KEY,
+    parentItemID INT,
+    note TEXT,
+    title TEXT
+);
+CREATE INDEX itemNotes_parentItemID ON itemNotes(parentItemID);
+CREATE TABLE itemAttachments (
+    itemID INTEGER PRIMARY KEY,
+    parentItemID INT,
+    linkMode INT,
+    contentType TEXT,
+    charsetID INT,
+    path TEXT,
+    syncState INT DEFAULT 0,
+    storageModTime INT,
+    storageHash TEXT,
+    lastProcessedModificationTime INT
+);
+CREATE INDEX itemAttachments_parentItemID ON itemAttachments(parentItemID);
+CREATE INDEX itemAttachments_charsetID ON itemAttachments(charsetID);
+CREATE INDEX itemAttachments_contentType ON itemAttachments(contentType);
+CREATE TABLE tags (tagID INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);
+CREATE TABLE itemTags (
+    itemID INT NOT NULL,
+    tagID INT NOT NULL,
+    type INT NOT NULL,
+    PRIMARY KEY (itemID, tagID)
+);
+CREATE INDEX itemTags_tagID ON itemTags(tagID);
+CREATE TABLE creators (
+    creatorID INTEGER PRIMARY KEY,
+    firstName TEXT,
+    lastName TEXT,
+    fieldMode INT,
+    UNIQUE (lastName, firstName, fieldMode)
+);
+CREATE TABLE itemCreators (
+    itemID INT NOT NULL,
+    creatorID INT NOT NULL,
+    creatorTypeID INT NOT NULL DEFAULT 1,
+    orderIndex INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (itemID, orderIndex),
+    UNIQUE (itemID, creatorID, creatorTypeID, orderIndex)
+);
+CREATE INDEX itemCreators_creatorTypeID ON itemCreators(creatorTypeID);
+CREATE TABLE collections (
+    collectionID INTEGER PRIMARY KEY,
+    collectionName TEXT NOT NULL,
+    parentCollectionID INT DEFAULT NULL,
+    clientDateModified TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    libraryID INT NOT NULL,
+    key TEXT NOT NULL,
+    version INT NOT NULL DEFAULT 0,
+    synced INT NOT NULL DEFAULT 0,
+    UNIQUE (libraryID, key)
+);
+CREATE INDEX collections_synced ON collections(synced);
+CREATE TABLE collectionItems (
+    collectionID INT NOT NULL,
+    itemID INT NOT NULL,
+    orderIndex INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (collectionID, itemID)
+);
+CREATE INDEX collectionItems_itemID ON collectionItems(itemID);
+CREATE TABLE relationPredicates (predicateID INTEGER PRIMARY KEY, predicate TEXT UNIQUE);
+CREATE TABLE itemRelations (
+    itemID INT NOT NULL,
+    predicateID INT NOT NULL,
+    object TEXT NOT NULL,
+    PRIMARY KEY (itemID, predicateID, object)
+);
+CREATE INDEX itemRelations_predicateID ON itemRelations(predicateID);
+CREATE INDEX itemRelations_object ON itemRelations(object);
+CREATE TABLE deletedItems (
+    itemID INTEGER PRIMARY KEY,
+    dateDeleted DEFAULT CURRENT_TIMESTAMP NOT NULL
+);
+CREATE TABLE syncDeleteLog (
+    syncObjectTypeID INT NOT NULL,
+    libraryID INT NOT NULL,
+    key TEXT NOT NULL,
+    dateDeleted TEXT DEFAULT CURRENT_TIMESTAMP NOT NULL,
+    UNIQUE (syncObjectTypeID, libraryID, key)
+);
+CREATE TABLE syncCache (
+    libraryID INT NOT NULL,
+    key TEXT NOT NULL,
+    syncObjectTypeID INT NOT NULL,
+    version INT NOT NULL,
+    data TEXT,
+    PRIMARY KEY (libraryID, key, syncObjectTypeID, version)
+);
+"""
+
+ITEM_TYPES = ['note', 'book', 'bookSection', 'journalArticle', 'magazineArticle',
+              'newspaperArticle', 'thesis', 'letter', 'manuscript', 'interview',
+              'film', 'artwork', 'webpage', 'attachment', 'report', 'bill',
+              'case', 'hearing', 'patent', 'statute', 'email', 'map',
+              'blogPost', 'instantMessage', 'forumPost', 'audioRecording',
+              'presentation', 'videoRecording', 'tvBroadcast', 'radioBroadcast',
+              'podcast', 'computerProgram', 'conferencePaper', 'document',
+              'encyclopediaArticle', 'dictionaryEntry', 'preprint']
+
+FIELDS = ['url', 'rights', 'series', 'volume', 'issue', 'edition', 'place',
+          'publisher', 'pages', 'ISBN', 'publicationTitle', 'ISSN', 'date',
+          'section', 'callNumber', 'archiveLocation', 'distributor', 'extra',
+          'journalAbbreviation', 'DOI', 'accessDate', 'seriesTitle',
+          'seriesText', 'seriesNumber', 'institution', 'reportType', 'code',
+          'session', 'legislativeBody', 'history', 'reporter', 'court',
+          'numberOfVolumes', 'committee', 'assignee', 'patentNumber',
+          'priorityNumbers', 'issueDate', 'references', 'legalStatus',
+          'codeNumber', 'artworkMedium', 'number', 'artworkSize',
+          'libraryCatalog', 'videoRecordingFormat', 'interviewMedium',
+          'letterType', 'manuscriptType', 'mapType', 'scale', 'thesisType',
+          'websiteType', 'audioRecordingFormat', 'label', 'presentationType',
+          'meetingName', 'studio', 'runningTime', 'network', 'postType',
+          'audioFileType', 'version', 'system', 'company', 'conferenceName',
+          'encyclopediaTitle', 'dictionaryTitle', 'language', 'programmingLanguage',
+          'university', 'abstractNote', 'websiteTitle', 'reportNumber',
+          'billNumber', 'codeVolume', 'codePages', 'dateDecided',
+          'reporterVolume', 'firstPage', 'documentNumber', 'dateEnacted',
+          'publicLawNumber', 'country', 'applicationNumber', 'forumTitle',
+          'episodeNumber', 'blogTitle', 'medium', 'caseName', 'nameOfAct',
+          'subject', 'proceedingsTitle', 'bookTitle', 'shortTitle', 'docketNumber',
+          'numPages', 'programTitle', 'issuingAuthority', 'filingDate',
+          'genre', 'archive', 'title', 'repository', 'archiveID', 'citationKey']
+
+CREATOR_TYPES = ['author', 'contributor', 'editor', 'translator', 'seriesEditor',
+                 'interviewee', 'interviewer', 'director', 'scriptwriter',
+                 'producer', 'castMember', 'sponsor', 'counsel', 'inventor',
+                 'attorneyAgent', 'recipient', 'performer', 'composer',
+                 'wordsBy', 'cartographer', 'programmer', 'artist',
+                 'commenter', 'presenter', 'guest', 'podcaster', 'reviewedAuthor',
+                 'cosponsor', 'bookAuthor']
+
+SYNC_OBJECT_TYPES = ['collection', 'creator', 'item', 'search', 'tag',
+                     'relation', 'setting']
+
+REGULAR_TYPES = ['journalArticle', 'book', 'bookSection', 'conferencePaper',
+                 'report', 'thesis', 'preprint', 'webpage']
+
+FIELDS_BY_TYPE = {
+    'journalArticle': ['publicationTitle', 'volume', 'issue', 'pages', 'ISSN',
+                       'journalAbbreviation', 'DOI', 'language', 'libraryCatalog'],
+    'book': ['publisher', 'place', 'ISBN', 'numPages', 'edition', 'series'],
+    'bookSection': ['bookTitle', 'publisher', 'place', 'ISBN', 'pages'],
+    'conferencePaper': ['proceedingsTitle', 'conferenceName', 'pages', 'DOI'],
+    'report': ['institution', 'reportNumber', 'reportType', 'place'],
+    'thesis': ['university', 'thesisType', 'place', 'numPages'],
+    'preprint': ['repository', 'archiveID', 'DOI', 'citationKey'],
+    'webpage': ['websiteTitle', 'websiteType'],
+}
+
+LAST_NAMES = ['Smith', 'Müller', 'García', 'Nakamura', 'Okafor', 'Ivanova',
+              'Nguyen', 'Kowalski', 'Rossi', 'Dubois', 'Andersen', 'Silva',
+              'Cohen', 'Kim', 'Schmidt', 'Fischer', 'Weber', 'Meyer', 'Wagner',
+              'Becker', 'Hoffmann', 'Schulz', 'Koch', 'Richter', 'Klein',
+              'Creutzig', 'Wolf', 'Neumann', 'Schwarz', 'Zimmermann', 'Braun']
+
+FIRST_NAMES = ['Anna', 'Ben', 'Carla', 'David', 'Eva', 'Felix', 'Greta', 'Hiro',
+               'Ines', 'Jonas', 'Kira', 'Lars', 'Mia', 'Nils', 'Olga', 'Paul']
+
+WORDS = ['climate', 'energy', 'policy', 'urban', 'transport', 'carbon',
+         'emissions', 'model', 'analysis', 'review', 'behaviour', 'demand',
+         'supply', 'networks', 'citation', 'graph', 'learning', 'deep',
+         'inference', 'causal', 'markets', 'welfare', 'happiness', 'growth',
+         'technology', 'beyond', 'systems', 'dynamics', 'evidence', 'global']
+
+RELATION_PREDICATE = 'dc:relation'
+
+
+# rows are inserted in chunks of this many items
+CHUNK_SIZE = 5000
+
+
+def random_key(rng):
+    return ''.join(rng.choice(string.ascii_uppercase + string.digits) for _ in range(8))
+
+
+def random_title(rng):
+    n = rng.randint(3, 9)
+    return ' '.join(rng.choice(WORDS) for _ in range(n)).capitalize()
+
+
+class LibraryBuilder():
+    """
+    Fills an empty database created from SCHEMA. Items are generated in one
+    pass and written in chunks, so memory stays flat for large libraries.
+    """
+
+    def __init__(self, conn, seed=0):
+        self.conn = conn
+        self.rng = random.Random(seed)
+        self.value_ids = {}
+        self.keys = set()
+        self.item_id = 0
+        self.item_type_ids = {t: n + 1 for n, t in enumerate(ITEM_TYPES)}
+        self.field_ids = {f: n + 1 for n, f in enumerate(FIELDS)}
+        self.creator_type_ids = {c: n + 1 for n, c in enumerate(CREATOR_TYPES)}
+        self.rows = {}
+
+    def new_key(self):
+        key = random_key(self.rng)
+        while key in self.keys:
+            key = random_key(self.rng)
+        self.keys.add(key)
+        return key
+
+    def value_id(self, value):
+        if value not in self.value_ids:
+            self.value_ids[value] = len(self.value_ids) + 1
+        return self.value_ids[value]
+
+    def insert(self, sql, row):
+        self.rows.setdefault(sql, []).append(row)
+
+    def flush(self):
+        for sql, rows in self.rows.items():
+            self.conn.executemany(sql, rows)
+        self.rows = {}
+
+    def build_system_tables(self):
+        c = self.conn
+        c.executemany("INSERT INTO version VALUES (?, ?)",
+                      [('system', 32), ('userdata', 120), ('globalSchema', 30)])
+        c.execute("INSERT INTO libraries VALUES (1, 'user', 1, 1, 0, 0, 0, 0)")
+        c.executemany("INSERT INTO itemTypes VALUES (?, ?, NULL, 1)",
+                      [(i, t) for t, i in self.item_type_ids.items()])
+        c.executemany("INSERT INTO fields VALUES (?, ?, NULL)",
+                      [(i, f) for f, i in self.field_ids.items()])
+        c.executemany("INSERT INTO creatorTypes VALUES (?, ?)",
+                      [(i, t) for t, i in self.creator_type_ids.items()])
+        c.execute("INSERT INTO charsets VALUES (1, 'utf-8')")
+        c.executemany("INSERT INTO syncObjectTypes VALUES (?, ?)",
+                      [(n + 1, t) for n, t in enumerate(SYNC_OBJECT_TYPES)])
+        c.execute("INSERT INTO relationPredicates VALUES (1, ?)", (RELATION_PREDICATE,))
+
+    def build_creators(self, n_items):
+        rng = self.rng
+        creators = set()
+        n_creators = max(10, n_items // 2)
+        while len(creators) < n_creators:
+            last = rng.choice(LAST_NAMES) + ('' if rng.random() < 0.3 else str(rng.randint(1, n_creators)))
+            first = rng.choice(FIRST_NAMES)
+            if rng.random() < 0.3:
+                first = first[0] + '.'
+            elif rng.random() < 0.2:
+                first += ' ' + rng.choice(FIRST_NAMES)
+            creators.add((first, last))
+        self.creators = sorted(creators)
+        self.conn.executemany("INSERT INTO creators VALUES (?, ?, ?, 0)",
+                              [(n + 1, f, l) for n, (f, l) in enumerate(self.creators)])
+
+    def build_tags(self, n_items):
+        n_tags = max(5, n_items // 20)
+        self.tags = ['# important', '# to read'] + ['tag %d %s' % (n, self.rng.choice(WORDS))
+                                                 for n in range(n_tags)]
+        self.conn.executemany("INSERT INTO tags VALUES (?, ?)",
+                              [(n + 1, t) for n, t in enumerate(self.tags)])
+
+    def build_collections(self, n_items):
+        rng = self.rng
+        n_colls = max(3, int(n_items ** 0.5))
+        rows = []
+        for n in range(n_colls):
+            parent = rng.randint(1, n) if n > 0 and rng.random() < 0.7 else None
+            rows.append((n + 1, 'Collection %d %s' % (n, rng.choice(WORDS)), parent,
+                         1, self.new_key(), rng.randint(1, 100), 1))
+        self.conn.executemany("""INSERT INTO collections (collectionID,
+            collectionName, parentCollectionID, libraryID, key, version, synced)
+            VALUES (?, ?, ?, ?, ?, ?, ?)""", rows)
+        self.collections = rows
+
+    def add_item(self, item_type, date_added='2020-01-01 00:00:00'):
+        self.item_id += 1
+        key = self.new_key()
+        version = self.rng.randint(1, 10000)
+        self.insert("""INSERT INTO items (itemID, itemTypeID, dateAdded,
+            dateModified, clientDateModified, libraryID, key, version, synced)
+            VALUES (?, ?, ?, ?, ?, 1, ?, ?, 1)""",
+            (self.item_id, self.item_type_ids[item_type], date_added, date_added,
+             date_added, key, version))
+        return self.item_id, key, version
+
+    def add_fields(self, item_id, data):
+        for f, v in data.items():
+            self.insert("INSERT INTO itemData VALUES (?, ?, ?)",
+                        (item_id, self.field_ids[f], self.value_id(v)))
+
+    def add_sync_cache(self, key, version, api_data):
+        self.insert("INSERT INTO syncCache VALUES (1, ?, 3, ?, ?)",
+                    (key, version, json.dumps({'key': key, 'version': version, 'data': api_data})))
+
+    def item_data(self, n, key, item_type):
+        rng = self.rng
+        data = {'title': random_title(rng),
+                'date': '%d-%02d-%02d' % (rng.randint(1950, 2024), rng.randint(1, 12), rng.randint(1, 28))}
+        if rng.random() < 0.4:
+            data['shortTitle'] = ' '.join(data['title'].split()[:2])
+        if rng.random() < 0.5:
+            data['abstractNote'] = ' '.join(rng.choice(WORDS) for _ in range(40))
+        if rng.random() < 0.5:
+            data['url'] = 'https://example.org/' + key
+        for f in FIELDS_BY_TYPE[item_type]:
+            if rng.random() < 0.7:
+                data[f] = random_title(rng)
+        if 'DOI' in FIELDS_BY_TYPE[item_type] or rng.random() < 0.3:
+            data.pop('DOI', None)
+            if rng.random() < 0.8:
+                doi = '10.%d/%s.%d' % (rng.randint(1000, 9999), key.lower(), n)
+                if 'DOI' in FIELDS_BY_TYPE[item_type]:
+                    data['DOI'] = doi
+                else:
+                    data['extra'] = 'DOI: ' + doi
+        if 'ISBN' in data:
+            data['ISBN'] = '978%010d' % rng.randint(0, 10 ** 10 - 1)
+        return data
+
+    def build_item(self, n, regular_keys):
+        rng = self.rng
+        item_type = rng.choice(REGULAR_TYPES)
+        item_id, key, version = self.add_item(item_type)
+        regular_keys.append(key)
+        data = self.item_data(n, key, item_type)
+        self.add_fields(item_id, data)
+
+        creators = []
+        n_creators = rng.choice([0, 1, 1, 2, 2, 3, 4, 6])
+        for o, creator_id in enumerate(rng.sample(range(1, len(self.creators) + 1), n_creators)):
+            creator_type = 'author' if rng.random() < 0.9 else 'editor'
+            self.insert("INSERT INTO itemCreators VALUES (?, ?, ?, ?)",
+                        (item_id, creator_id, self.creator_type_ids[creator_type], o))
+            first, last = self.creators[creator_id - 1]
+            creators.append({'creatorType': creator_type, 'firstName': first, 'lastName': last})
+
+        tags = []
+        for t in rng.sample(range(1, len(self.tags) + 1), rng.choice([0, 0, 1, 2, 3])):
+            tag_type = 0 if rng.random() < 0.8 else 1
+            self.insert("INSERT INTO itemTags VALUES (?, ?, ?)", (item_id, t, tag_type))
+            tags.append({'tag': self.tags[t - 1], 'type': tag_type} if tag_type else {'tag': self.tags[t - 1]})
+
+        collections = []
+        for coll in rng.sample(range(1, len(self.collections) + 1), rng.choice([0, 1, 1, 2])):
+            self.insert("INSERT INTO collectionItems VALUES (?, ?, 0)", (coll, item_id))
+            collections.append(self.collections[coll - 1][4])
+
+        # relations point to earlier items, like citations of older papers
+        relations = []
+        for _ in range(rng.choice([0, 0, 1, 2, 4]) if len(regular_keys) > 1 else 0):
+            other = 'http://zotero.org/users/0/items/' + rng.choice(regular_keys[:-1])
+            if other not in relations:
+                relations.append(other)
+                self.insert("INSERT INTO itemRelations VALUES (?, 1, ?)", (item_id, other))
+
+        api_data = {'key': key, 'version': version, 'itemType': item_type}
+        api_data.update(data)
+        api_data.update({'creators': creators, 'tags': tags, 'collections': collections,
+                         'relations': {RELATION_PREDICATE: relations} if relations else {}})
+        self.add_sync_cache(key, version, api_data)
+
+        self.build_children(item_id, key)
+
+    def build_children(self, parent_id, parent_key):
+        rng = self.rng
+        if rng.random() < 0.5:
+            att_id, key, version = self.add_item('attachment')
+            file_name = parent_key + '.pdf'
+            self.insert("""INSERT INTO itemAttachments (itemID, parentItemID, linkMode,
+                contentType, charsetID, path) VALUES (?, ?, 2, 'application/pdf', 1, ?)""",
+                (att_id, parent_id, 'attachments:' + file_name))
+            self.add_fields(att_id, {'title': file_name})
+            self.add_sync_cache(key, version, {
+                'key': key, 'version': version, 'parentItem': parent_key,
+                'itemType': 'attachment', 'linkMode': 'linked_file', 'title': file_name,
+                'contentType': 'application/pdf', 'path': 'attachments:' + file_name,
+                'tags': [], 'relations': {}})
+        if rng.random() < 0.2:
+            note_id, key, version = self.add_item('note')
+            note = '<p>' + ' '.join(rng.choice(WORDS) for _ in range(30)) + '</p>'
+            self.insert("INSERT INTO itemNotes VALUES (?, ?, ?, ?)",
+                        (note_id, parent_id, note, note[3:30]))
+            self.add_sync_cache(key, version, {
+                'key': key, 'version': version, 'parentItem': parent_key,
+                'itemType': 'note', 'note': note, 'tags': [], 'collections': [],
+                'relations': {}})
+
+    def build(self, n_items):
+        self.build_system_tables()
+        self.build_creators(n_items)
+        self.build_tags(n_items)
+        self.build_collections(n_items)
+
+        regular_keys = []
+        for n in range(n_items):
+            self.build_item(n, regular_keys)
+            if (n + 1) % CHUNK_SIZE == 0:
+                self.flush()
+        self.flush()
+
+        self.conn.executemany("INSERT INTO itemDataValues VALUES (?, ?)",
+                              [(i, v) for v, i in self.value_ids.items()])
+        self.conn.execute("UPDATE libraries SET version = (SELECT MAX(version) FROM items)")
+
+
+def generate_library(path, n_items, seed=0):
+    """
+    Creates a synthetic zotero database.
+
+    Arguments:
+        path: file path of the sqlite database, overwritten if it exists
+        n_items: number of regular (non-note, non-attachment) items
+        seed: random seed, same seed and size yield the same library
+
+    Returns:
+        path
+    """
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    conn.execute("PRAGMA journal_mode = OFF;")
+    conn.execute("PRAGMA synchronous = OFF;")
+    LibraryBuilder(conn, seed).build(n_items)
+    conn.commit()
+    conn.close()
+    return path
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('path')
+    parser.add_argument('-n', '--items', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    generate_library(args.path, args.items, args.seed)
@@ -1,3 +1,6 @@
+import time
+started = time.perf_counter()
+
 from prompt_toolkit import PromptSession
 from src.dispatcher import Dispatcher
 import asyncio
@@ -6,15 +9,21 @@ import asyncio
 async def main(disp):
     exit_cmds = disp.get_exit_commands()
     input = ''
+    print('Time to first prompt: {:.2f}s'.format(time.perf_counter() - started))
     while input not in exit_cmds:
         input = await asyncio.wait_for(disp.session.prompt_async('>', completer=disp.get_completer()), timeout=120)
+        cmd = input.split()
+        if len(cmd) > 0 and cmd[0] not in exit_cmds:
+            # commands need the autocompletes, wait without blocking the loop
+            await asyncio.get_running_loop().run_in_executor(None, disp.wait_ready)
         disp.execute(input)
 
     disp.shutdown("Exiting...")
 
 
 if __name__ == '__main__':
-    disp = Dispatcher(session=PromptSession())
+    # autocompletes are built in the background, the prompt shows right away
+    disp = Dispatcher(session=PromptSession(), background=True)
     try:
         asyncio.run(main(disp))
     except (KeyboardInterrupt, EOFError):
@@ -0,0 +1,303 @@
+"""
+Sidecar cache of hydrated zotero items
+"""
+
+import os
+import json
+import sqlite3
+import threading
+import itertools
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    key TEXT PRIMARY KEY,
+    version INT NOT NULL,
+    clientDateModified TEXT,
+    itemType TEXT,
+    parentItem TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS items_itemType ON items(itemType);
+CREATE INDEX IF NOT EXISTS items_version ON items(version);
+CREATE INDEX IF NOT EXISTS items_parentItem ON items(parentItem);
+CREATE TABLE IF NOT EXISTS itemTags (
+    tag TEXT NOT NULL,
+    key TEXT NOT NULL,
+    PRIMARY KEY (tag, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS itemTags_key ON itemTags(key);
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value
+);
+"""
+
+# layout version of the cache, caches of other versions are rebuilt
+CACHE_FORMAT = 3
+
+# item types which are not cached, notes and attachments are children
+CHILD_TYPES = ('note', 'attachment')
+
+
+class ItemCache():
+    """
+    Keeps fully hydrated regular items (i.e. no notes or attachments) in a
+    separate SQLite database. On refresh, only items whose version or
+    modification date exceed the high-water marks of the last refresh are
+    hydrated again, and items deleted in zotero are purged.
+
+    As a mirror, the cache holds items of all types synced from the zotero
+    API instead, see RemoteSync.
+    """
+
+    def __init__(self, path, mirror=False):
+        """
+        Arguments:
+            path: path of the cache database, created if it does not exist
+            mirror: if True, the cache mirrors the zotero API instead of the
+            local database
+        """
+        self.path = path
+        self.mirror = mirror
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.RLock()
+        self.db_stat = None
+
+        if self.get_format() != CACHE_FORMAT or self.get_meta('mirror') != mirror:
+            self.clear()
+
+    def close(self):
+        self.conn.close()
+
+    def get_format(self):
+        """
+        Layout version of an existing cache, None for a new one.
+        """
+        try:
+            return self.get_meta('format')
+        except sqlite3.OperationalError:
+            return None
+
+    def clear(self):
+        """
+        Removes all items and marks from the cache, recreating its tables.
+        """
+        with self.lock, self.conn:
+            for table in ['items', 'itemTags', 'meta']:
+                self.conn.execute("DROP TABLE IF EXISTS {};".format(table))
+        self.conn.executescript(SCHEMA)
+        with self.lock, self.conn:
+            self.set_meta('format', CACHE_FORMAT)
+            self.set_meta('mirror', self.mirror)
+        self.db_stat = None
+
+    def get_meta(self, name, default=None):
+        row = self.conn.execute("SELECT value FROM meta WHERE name = ?;", [name]).fetchone()
+        return default if row is None else json.loads(row[0])
+
+    def set_meta(self, name, value):
+        self.conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?);", [name, json.dumps(value)])
+
+    def upsert(self, items, modified={}):
+        """
+        Inserts or replaces items.
+
+        Arguments:
+            items: list of zotero data items
+            modified: dict {key: modification date} used as high-water mark,
+            defaults to the dateModified of the item
+
+        Returns:
+            number of stored items
+        """
+        rows = [(i['key'], i['version'], modified.get(i['key'], i.get('dateModified')),
+                 i.get('itemType'), i.get('parentItem'), json.dumps(i))
+                for i in items]
+        # only manual tags, like the tags of items hydrated from the local database
+        tags = [(t['tag'], i['key']) for i in items for t in i.get('tags', [])
+                if t.get('type', 0) == 0]
+        with self.lock, self.conn:
+            self.conn.executemany("DELETE FROM itemTags WHERE key = ?;", [(r[0],) for r in rows])
+            self.conn.executemany("INSERT OR REPLACE INTO items VALUES (?, ?, ?, ?, ?, ?);", rows)
+            self.conn.executemany("INSERT OR IGNORE INTO itemTags VALUES (?, ?);", tags)
+        return len(rows)
+
+    def delete(self, keys):
+        """
+        Removes items by key.
+
+        Returns:
+            number of removed items
+        """
+        keys = [(k,) for k in keys]
+        with self.lock, self.conn:
+            cur = self.conn.executemany("DELETE FROM items WHERE key = ?;", keys)
+            self.conn.executemany("DELETE FROM itemTags WHERE key = ?;", keys)
+        return cur.rowcount
+
+    @staticmethod
+    def stat_db(db_path):
+        """
+        Modification times and sizes of the zotero database and its journals.
+        Used to skip refresh checks if the files have not changed at all.
+        """
+        stat = []
+        for path in [db_path, db_path + '-wal', db_path + '-journal']:
+            try:
+                s = os.stat(path)
+                stat.append((s.st_mtime_ns, s.st_size))
+            except FileNotFoundError:
+                stat.append(None)
+        return stat
+
+    def covers(self, item_type):
+        """
+        Whether all items matching the item_type filter are cached, see
+        ZoteroDatabase.build_sql for the syntax.
+        """
+        if self.mirror:
+            return True
+        if item_type.startswith('-'):
+            return set(CHILD_TYPES) <= set(item_type[1:].split(' || '))
+        return item_type != '' and not set(CHILD_TYPES) & set(item_type.split(' || '))
+
+    def refresh(self, db, force=False):
+        """
+        Brings the cache up to date with the local zotero database.
+
+        Arguments:
+            db: ZoteroDatabase instance with local connection
+            force: if True, discard the cache and hydrate all items
+
+        Returns:
+            number of updated items, number of purged items
+        """
+        with self.lock:
+            stat = self.stat_db(db.pool.db_path)
+            if stat == self.db_stat and not force:
+                return 0, 0
+
+            cursor = db.cursor.connection.cursor()
+            try:
+                updated, purged = self.refresh_items(db, cursor, force)
+            finally:
+                cursor.close()
+            self.db_stat = stat
+            return updated, purged
+
+    def refresh_items(self, db, cursor, force=False, batch_size=1000):
+        """
+        Upserts the items modified since the last refresh and purges deleted
+        ones. Modified items are hydrated and stored batch_size at a time.
+
+        Returns:
+            number of updated items, number of purged items
+        """
+        sql = """SELECT
+            MAX(i.version),
+            MAX(i.clientDateModified),
+            COUNT(*)
+        FROM items i
+        LEFT JOIN itemTypes it ON i.itemTypeID = it.itemTypeID
+        WHERE it.typeName NOT IN (?, ?);"""
+        cursor.execute(sql, CHILD_TYPES)
+        mark = list(cursor.fetchone())
+
+        if force:
+            self.clear()
+        elif mark == self.get_meta('mark'):
+            return 0, 0
+
+        # items changed since the last refresh, incl. unsynced local changes
+        hw_version, hw_modified = self.get_meta('mark', [-1, '', 0])[:2]
+        sql = """SELECT
+            i.key,
+            i.clientDateModified
+        FROM items i
+        LEFT JOIN itemTypes it ON i.itemTypeID = it.itemTypeID
+        WHERE it.typeName NOT IN (?, ?)
+        AND (i.version > ? OR i.clientDateModified > ?);"""
+        cursor.execute(sql, CHILD_TYPES + (hw_version or -1, hw_modified or ''))
+        modified = dict(cursor.fetchall())
+
+        updated = 0
+        if len(modified) > 0:
+            items = db.iter_items(keys=list(modified), local_cursor=cursor, batch_size=batch_size)
+            for batch in iter(lambda: list(itertools.islice(items, batch_size)), []):
+                updated += self.upsert(batch, modified)
+
+        # the cache holds every item of zotero now, additional ones were deleted
+        purged = 0
+        count = self.conn.execute("SELECT COUNT(*) FROM items;").fetchone()[0]
+        if count != mark[2]:
+            sql = """SELECT i.key FROM items i
+            LEFT JOIN itemTypes it ON i.itemTypeID = it.itemTypeID
+            WHERE it.typeName NOT IN (?, ?);"""
+            cursor.execute(sql, CHILD_TYPES)
+            keys = {k for k, in cursor.fetchall()}
+            purged = self.delete([k for k, in self.conn.execute("SELECT key FROM items;")
+                                  if k not in keys])
+
+        with self.conn:
+            self.set_meta('mark', mark)
+        return updated, purged
+
+    def iter_items(self, keys=[], item_type='', tags=[], limit=-1, since=None, batch_size=1000, parent_keys=[]):
+        """
+        Reads items from the cache.
+
+        Arguments:
+            keys, item_type, tags, limit, since, parent_keys: see
+            ZoteroDatabase.build_sql
+            batch_size: number of rows fetched from the cache at once
+
+        Returns:
+            generator of zotero data items conforming to the zotero API format
+        """
+        sql = "SELECT i.data FROM items i WHERE TRUE"
+        params = list()
+
+        for column, values in [('key', keys), ('parentItem', parent_keys)]:
+            if len(values) > 0:
+                sql += "\nAND i.{} IN (SELECT value FROM json_each(?))".format(column)
+                params.append(json.dumps(list(values)))
+
+        if len(item_type) > 0:
+            negate = item_type[0] == '-'
+            types = (item_type[1:] if negate else item_type).split(' || ')
+            sql += "\nAND i.itemType {}IN ({})".format('NOT ' if negate else '', ','.join('?' * len(types)))
+            params += types
+
+        for tag in tags:
+            # empty filters do not filter, see ZoteroDatabase.build_sql
+            if len(tag) == 0:
+                continue
+            negate = 'NOT ' if tag[0] == '-' else ''
+            names = (tag[1:] if negate else tag).split(' || ')
+            sql += "\nAND i.key {}IN (SELECT key FROM itemTags WHERE tag IN ({}))".format(negate, ','.join('?' * len(names)))
+            params += names
+
+        if since is not None:
+            sql += "\nAND i.version > ?"
+            params.append(since)
+
+        if limit > 0:
+            sql += "\nLIMIT ?"
+            params.append(limit)
+
+        # the lock is only held per batch, so pending generators do not block
+        # other threads
+        with self.lock:
+            rows = self.conn.execute(sql + ";", params)
+        while True:
+            with self.lock:
+                batch = rows.fetchmany(batch_size)
+            if not batch:
+                return
+            for row in batch:
+                yield json_loads(row[0])
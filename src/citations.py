@@ -0,0 +1,397 @@
+"""
+Cached lookups of citation relations from OpenCitations
+"""
+
+import re
+import json
+import time
+import sqlite3
+import threading
+import warnings
+from lisc.urls.open_citations import OpenCitations
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    endpoint TEXT NOT NULL,
+    doi TEXT NOT NULL,
+    status INT NOT NULL,
+    etag TEXT,
+    lastModified TEXT,
+    fetched REAL NOT NULL,
+    body TEXT,
+    PRIMARY KEY (endpoint, doi)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS edges (
+    endpoint TEXT NOT NULL,
+    doi TEXT NOT NULL,
+    citing TEXT NOT NULL,
+    cited TEXT NOT NULL,
+    PRIMARY KEY (endpoint, doi, citing, cited)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value
+);
+"""
+
+# layout version of the cache, caches of other versions are rebuilt
+CITATIONS_FORMAT = 2
+
+# endpoints of the OpenCitations index and the field holding the related DOI
+ENDPOINTS = {'references': 'cited', 'citations': 'citing'}
+
+# field holding the requested DOI, used to split responses of batches
+OWNERS = {'references': 'citing', 'citations': 'cited'}
+
+# separator of DOIs requested in one path segment
+BATCH_SEPARATOR = '__'
+
+# number of DOIs per batched request
+DEFAULT_BATCH_SIZE = 20
+
+# responses are reused without asking OpenCitations for 30 days
+DEFAULT_TTL = 30 * 24 * 3600
+
+# statuses cached as answers, other failures are retried on the next lookup
+CACHED_STATUSES = (200, 404)
+
+# DOIs without records in a batched response are reused for one day only, in
+# case the batch was truncated
+EMPTY_BATCH_TTL = 24 * 3600
+
+
+def normalize_doi(doi):
+    """
+    Returns:
+        DOI in lower case without resolver prefix or surrounding blanks, DOIs
+        are case-insensitive
+    """
+    doi = doi.strip()
+    doi = re.sub(r'^(https?://(dx\.)?doi\.org/|doi:)', '', doi, flags=re.IGNORECASE)
+    return doi.lower()
+
+
+def record_dois(value):
+    """
+    Returns:
+        set of normalized DOIs of a record field, which holds either a DOI or
+        blank-separated identifiers like 'omid:br/06101 doi:10.1000/abc'
+    """
+    return {normalize_doi(v) for v in value.split()}
+
+
+def record_edges(records):
+    """
+    Returns:
+        set of (citing DOI, cited DOI) pairs of OpenCitations records,
+        identifiers other than DOIs are skipped
+    """
+    edges = set()
+    for r in records:
+        citing = [d for d in record_dois(r.get('citing', '')) if d.startswith('10.')]
+        cited = [d for d in record_dois(r.get('cited', '')) if d.startswith('10.')]
+        edges.update((a, b) for a in citing for b in cited)
+    return edges
+
+
+class CitationCache():
+    """
+    Keeps responses of the OpenCitations index per (endpoint, DOI) in a
+    separate SQLite database. Responses younger than ttl are answered from the
+    cache. Older ones are revalidated with their ETag or Last-Modified date,
+    so unchanged responses cost a request, but no download.
+
+    Requests are sent concurrently and in batches of batch_size DOIs by
+    RelationFetcher, which stores the responses with store and store_batch.
+
+    In offline mode, lookups are answered from the cache only, regardless of
+    their age. DOIs never fetched have no relations then.
+    """
+
+    def __init__(self, path, ttl=DEFAULT_TTL, offline=False, batch_size=DEFAULT_BATCH_SIZE):
+        """
+        Arguments:
+            path: path of the cache database, created if it does not exist
+            ttl: seconds a response is used without revalidation
+            offline: if True, never send requests
+            batch_size: maximum number of DOIs per batched request
+        """
+        self.path = path
+        self.ttl = ttl
+        self.offline = offline
+        self.batch_size = batch_size
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.RLock()
+        self.oc = OpenCitations()
+        for endpoint in ENDPOINTS:
+            self.oc.build_url(util=endpoint)
+        self.stats = {'hits': 0, 'revalidated': 0, 'fetched': 0, 'missing': 0, 'failed': 0, 'requests': 0}
+
+        if self.get_format() != CITATIONS_FORMAT:
+            self.clear()
+
+    def close(self):
+        self.conn.close()
+
+    def get_format(self):
+        """
+        Layout version of an existing cache, None for a new one.
+        """
+        try:
+            return self.get_meta('format')
+        except sqlite3.OperationalError:
+            return None
+
+    def clear(self):
+        """
+        Removes all responses from the cache, recreating its tables.
+        """
+        with self.lock, self.conn:
+            for table in ['responses', 'edges', 'meta']:
+                self.conn.execute("DROP TABLE IF EXISTS {};".format(table))
+        self.conn.executescript(SCHEMA)
+        with self.lock, self.conn:
+            self.set_meta('format', CITATIONS_FORMAT)
+
+    def get_meta(self, name, default=None):
+        row = self.conn.execute("SELECT value FROM meta WHERE name = ?;", [name]).fetchone()
+        return default if row is None else json.loads(row[0])
+
+    def set_meta(self, name, value):
+        self.conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?);", [name, json.dumps(value)])
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM responses;").fetchone()[0]
+
+    def get(self, endpoint, doi):
+        """
+        Returns:
+            cached response as dict with keys ['status', 'etag',
+            'lastModified', 'fetched', 'body'], None if not cached
+        """
+        sql = """SELECT status, etag, lastModified, fetched, body FROM responses
+            WHERE endpoint = ? AND doi = ?;"""
+        with self.lock:
+            row = self.conn.execute(sql, [endpoint, normalize_doi(doi)]).fetchone()
+        if row is None:
+            return None
+        return dict(zip(['status', 'etag', 'lastModified', 'fetched', 'body'], row))
+
+    def put(self, endpoint, doi, status, body=None, etag=None, last_modified=None, fetched=None):
+        """
+        Stores a response, replacing an earlier one, and the citations of its
+        records as edges, see get_edges.
+        """
+        doi = normalize_doi(doi)
+        row = [endpoint, doi, status, etag, last_modified,
+               time.time() if fetched is None else fetched, body]
+        edges = [(endpoint, doi, a, b) for a, b in record_edges(self.records(body))]
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?);", row)
+            self.conn.execute("DELETE FROM edges WHERE endpoint = ? AND doi = ?;", [endpoint, doi])
+            self.conn.executemany("INSERT OR IGNORE INTO edges VALUES (?, ?, ?, ?);", edges)
+            # marks graphs compacted from earlier edges as outdated
+            self.set_meta('edges_version', self.get_meta('edges_version', 0) + 1)
+
+    def get_edges(self):
+        """
+        Returns:
+            iterator of distinct (citing DOI, cited DOI) pairs of all cached
+            responses, incl. DOIs which are not in the library
+        """
+        with self.lock:
+            return iter(self.conn.execute("SELECT DISTINCT citing, cited FROM edges;").fetchall())
+
+    def edges_version(self):
+        """
+        Returns:
+            counter of changes to the edges, see put
+        """
+        with self.lock:
+            return self.get_meta('edges_version', 0)
+
+    def stale(self, dois):
+        """
+        Returns:
+            normalized DOIs of which a response of any endpoint is missing or
+            expired
+        """
+        stale = []
+        for d in dict.fromkeys(normalize_doi(d) for d in dois):
+            for endpoint in ENDPOINTS:
+                cached = self.get(endpoint, d)
+                if cached is None or not self.is_fresh(cached):
+                    stale.append(d)
+                    break
+        return stale
+
+    def touch(self, endpoint, doi):
+        """
+        Marks a cached response as fresh, e.g. after a successful revalidation.
+        """
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE responses SET fetched = ? WHERE endpoint = ? AND doi = ?;",
+                              [time.time(), endpoint, normalize_doi(doi)])
+
+    def count(self, outcome):
+        with self.lock:
+            self.stats[outcome] += 1
+
+    def is_fresh(self, response):
+        return time.time() - response['fetched'] < self.ttl
+
+    def url(self, endpoint, doi):
+        """
+        Arguments:
+            endpoint: 'references' or 'citations'
+            doi: DOI str, or several DOIs joined by BATCH_SEPARATOR
+
+        Returns:
+            URL of the JSON response of OpenCitations
+        """
+        return self.oc.get_url(util=endpoint, segments=[normalize_doi(doi)], settings={'format': 'json'})
+
+    def conditional_headers(self, cached):
+        """
+        Returns:
+            headers of a request revalidating a cached response
+        """
+        headers = dict()
+        if cached is not None and cached['status'] == 200:
+            if cached['etag']:
+                headers['If-None-Match'] = cached['etag']
+            if cached['lastModified']:
+                headers['If-Modified-Since'] = cached['lastModified']
+        return headers
+
+    def lookup(self, endpoint, doi):
+        """
+        Looks up a DOI in the cache.
+
+        Returns:
+            records if the cache answers the lookup, i.e. the response is
+            fresh or the cache is offline, otherwise None, and the cached
+            response, see get
+        """
+        cached = self.get(endpoint, doi)
+        if cached is not None and (self.offline or self.is_fresh(cached)):
+            self.count('hits')
+            return self.records(cached['body']), cached
+        if self.offline:
+            self.count('missing')
+            return [], cached
+        return None, cached
+
+    def store(self, endpoint, doi, cached, status, text=None, headers={}):
+        """
+        Caches the response of a request for a single DOI.
+
+        Arguments:
+            cached: cached response the request revalidated, see get
+            status: HTTP status, None if the request failed
+            text: body of the response
+            headers: headers of the response
+
+        Returns:
+            list of records, the expired ones if the request failed
+        """
+        if status is None:
+            self.count('failed')
+            # an expired response beats none at all
+            return [] if cached is None else self.records(cached['body'])
+
+        if status == 304 and cached is not None:
+            self.count('revalidated')
+            self.touch(endpoint, doi)
+            return self.records(cached['body'])
+
+        if status not in CACHED_STATUSES:
+            self.count('failed')
+            warnings.warn('OpenCitations returned status {} for {}'.format(status, doi))
+            return [] if cached is None else self.records(cached['body'])
+
+        self.count('fetched')
+        body = text if status == 200 else None
+        self.put(endpoint, doi, status, body, headers.get('ETag'), headers.get('Last-Modified'))
+        return self.records(body)
+
+    def store_batch(self, endpoint, dois, status, text=None):
+        """
+        Splits the response of a request for several DOIs and caches the
+        records per DOI, assigned to the DOI in their citing (references) or
+        cited (citations) field.
+
+        A response without records of any of the DOIs may have ignored the
+        batch, so it counts as failed. DOIs without records in other responses
+        may have been cut off and are cached for EMPTY_BATCH_TTL only.
+
+        Arguments:
+            dois: list of normalized DOI strs joined in the request
+            status: HTTP status, None if the request failed
+
+        Returns:
+            dict {DOI: list of records}, None if the batch failed
+        """
+        if status != 200:
+            return None
+        try:
+            records = json.loads(text)
+        except ValueError:
+            return None
+        if not isinstance(records, list):
+            return None
+
+        batch = {d: [] for d in dois}
+        owner = OWNERS[endpoint]
+        for r in records:
+            for d in record_dois(r.get(owner, '')):
+                if d in batch:
+                    batch[d].append(r)
+        if not any(batch.values()):
+            return None
+        fetched = time.time()
+        # backdated so is_fresh expires empty answers after EMPTY_BATCH_TTL
+        empty_fetched = fetched - max(self.ttl - EMPTY_BATCH_TTL, 0)
+        for d, rs in batch.items():
+            self.count('fetched')
+            self.put(endpoint, d, 200, json.dumps(rs),
+                     fetched=fetched if len(rs) > 0 else empty_fetched)
+        return batch
+
+    def records(self, body):
+        """
+        Returns:
+            list of records of a cached response body
+        """
+        if not body:
+            return []
+        try:
+            records = json.loads(body)
+        except ValueError:
+            return []
+        return records if isinstance(records, list) else []
+
+    def relations(self, records):
+        """
+        Arguments:
+            records: dict {endpoint: list of records} of a DOI
+
+        Returns:
+            dict
+                'citing': normalized DOIs which are cited in this publication
+                'cited_by': normalized DOIs of articles which cited this
+                publication
+        """
+        citing, cited_by = [[d for r in records[endpoint] for d in sorted(record_dois(r.get(field, '')))
+                             if d.startswith('10.')]
+                            for endpoint, field in ENDPOINTS.items()]
+        return {'citing': citing, 'cited_by': cited_by}
+
+    def report(self):
+        """
+        Returns:
+            summary of the lookups since the cache was opened
+        """
+        return ('{hits} cached, {revalidated} revalidated, {fetched} fetched in {requests} requests, '
+                '{missing} not cached (offline), {failed} failed').format(**self.stats)
@@ -0,0 +1,129 @@
+"""
+Index of zotero collections and their items
+"""
+
+from collections import defaultdict
+
+
+class CollectionIndex():
+    """
+    Maps collections to the keys of their items. The closure of the
+    collection tree, i.e. each collection with all of its descendants, is
+    precomputed once, so selecting a collection incl. its subcollections is a
+    single lookup regardless of the depth of the tree.
+
+    Collections are addressed by key or by name. Names are not unique in
+    zotero, a name resolves to all collections carrying it.
+    """
+
+    def __init__(self, collections, memberships):
+        """
+        Arguments:
+            collections: list of (key, name, parent key or None) per collection
+            memberships: list of (collection key, item key) pairs
+        """
+        self.names = defaultdict(list)
+        self.parents = dict()
+        children = defaultdict(list)
+        for key, name, parent in collections:
+            self.names[name].append(key)
+            self.parents[key] = parent
+            if parent is not None:
+                children[parent].append(key)
+        self.names = dict(self.names)
+
+        self.items = defaultdict(list)
+        for collection, item in memberships:
+            self.items[collection].append(item)
+        self.items = {k: sorted(set(v)) for k, v in self.items.items()}
+
+        # post-order over the tree: a collection is closed after its children
+        self.descendants = dict()
+        self.items_recursive = dict()
+        roots = [k for k, p in self.parents.items() if p not in self.parents]
+        for root in roots:
+            self.close(root, children)
+        # cycles are invalid in zotero, but do not lose their collections
+        for key in self.parents:
+            if key not in self.descendants:
+                self.close(key, children)
+
+    @classmethod
+    def from_state(cls, state):
+        """
+        Restores an index without computing the closure again, see state.
+        """
+        index = cls.__new__(cls)
+        index.__dict__.update(state)
+        return index
+
+    def state(self):
+        """
+        Returns:
+            dict of built-in types the index can be restored from, e.g. to
+            persist it in a Snapshot
+        """
+        return {'names': self.names, 'parents': self.parents, 'items': self.items,
+                'descendants': self.descendants, 'items_recursive': self.items_recursive}
+
+    def close(self, root, children):
+        """
+        Computes descendants and recursive items of root and its subtree
+        iteratively, as trees may be deeper than the recursion limit.
+        """
+        stack = [(root, False)]
+        while stack:
+            key, expanded = stack.pop()
+            if not expanded:
+                if key in self.descendants:
+                    continue
+                # marked before visiting the children, breaks cycles
+                self.descendants[key] = None
+                stack.append((key, True))
+                stack += [(c, False) for c in children[key] if c not in self.descendants]
+                continue
+            descendants = {key}
+            items = set(self.items.get(key, []))
+            for c in children[key]:
+                if self.descendants.get(c) is not None:
+                    descendants |= self.descendants[c]
+                    items.update(self.items_recursive[c])
+            self.descendants[key] = frozenset(descendants)
+            self.items_recursive[key] = sorted(items)
+
+    def __len__(self):
+        return len(self.parents)
+
+    def __contains__(self, name):
+        return name in self.names or name in self.parents
+
+    def resolve(self, name):
+        """
+        Returns:
+            list of collection keys with the name, or the key itself
+        """
+        if name in self.parents:
+            return [name]
+        return list(self.names.get(name, []))
+
+    def get_keys(self, name, recursive=False):
+        """
+        Arguments:
+            name: name or key of the collection
+            recursive: if True, include items of all subcollections
+
+        Returns:
+            sorted list of item keys, empty for unknown collections
+        """
+        collections = self.resolve(name)
+        index = self.items_recursive if recursive else self.items
+        if len(collections) == 1:
+            return list(index.get(collections[0], []))
+        return sorted({k for c in collections for k in index.get(c, [])})
+
+    def get_names(self):
+        """
+        Returns:
+            sorted list of collection names, e.g. for autocompletes
+        """
+        return sorted(self.names)
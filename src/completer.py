@@ -0,0 +1,111 @@
+"""
+Indexed autocompletion of papers, tags and collections
+"""
+
+import re
+from bisect import bisect_left
+from prompt_toolkit.completion import Completer, Completion
+
+
+class PaperCompleter(Completer):
+    """
+    Completes the whole input against a large list of entries, e.g. the
+    autocompletes of all papers. Entries starting with the input are found by
+    bisecting a sorted array. Entries with words starting with the input
+    words are found through a sorted array of words, so matches inside
+    titles work as well.
+
+    Completions are generated lazily, and at most max_results per keystroke.
+    Replaces prompt_toolkit's WordCompleter, which scans all entries.
+    """
+
+    def __init__(self, entries, max_results=50):
+        """
+        Arguments:
+            entries: iterable of completion strings
+            max_results: maximum number of completions per keystroke
+        """
+        self.max_results = max_results
+        self.entries = sorted(set(entries), key=lambda e: (e.lower(), e))
+        self.keys = [e.lower() for e in self.entries]
+
+        tokens = sorted((t, n) for n, k in enumerate(self.keys) for t in set(self.tokenize(k)))
+        self.tokens = [t for t, _ in tokens]
+        self.token_entries = [n for _, n in tokens]
+
+    @classmethod
+    def from_state(cls, state):
+        """
+        Restores a completer without sorting its entries again, see state.
+        """
+        completer = cls.__new__(cls)
+        completer.__dict__.update(state)
+        return completer
+
+    def state(self):
+        """
+        Returns:
+            dict of built-in types the completer can be restored from, e.g.
+            to persist it in a Snapshot
+        """
+        return dict(self.__dict__)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def tokenize(self, text):
+        return re.findall(r'\w+', text)
+
+    def prefix_matches(self, text):
+        """
+        Yields indices of entries starting with text, in sorted order.
+        """
+        n = bisect_left(self.keys, text)
+        while n < len(self.keys) and self.keys[n].startswith(text):
+            yield n
+            n += 1
+
+    def token_matches(self, text):
+        """
+        Yields indices of entries with words starting with each word of text.
+        Only the words of the entries are scanned which start with the rarest
+        word of text, the other words are checked per entry.
+        """
+        words = self.tokenize(text)
+        if len(words) == 0:
+            return
+        ranges = [(bisect_left(self.tokens, w), bisect_left(self.tokens, w + '\uffff'), w) for w in words]
+        start, stop, pivot = min(ranges, key=lambda r: r[1] - r[0])
+        others = [w for w in words if w != pivot]
+        seen = set()
+        for n in range(start, stop):
+            entry = self.token_entries[n]
+            if entry in seen:
+                continue
+            seen.add(entry)
+            tokens = self.tokenize(self.keys[entry])
+            if all(any(t.startswith(w) for t in tokens) for w in others):
+                yield entry
+
+    def matches(self, text):
+        """
+        Yields indices of matching entries, prefix matches first, without
+        duplicates and at most max_results.
+        """
+        text = text.lower()
+        count = 0
+        yielded = set()
+        for matches in (self.prefix_matches(text), self.token_matches(text)):
+            for n in matches:
+                if n in yielded:
+                    continue
+                yielded.add(n)
+                yield n
+                count += 1
+                if count >= self.max_results:
+                    return
+
+    def get_completions(self, document, complete_event):
+        text = document.text_before_cursor.lstrip()
+        for n in self.matches(text):
+            yield Completion(self.entries[n], start_position=-len(text))
@@ -1,44 +1,324 @@
 import os
+import re
+import copy
 import warnings
-from sqlite3 import connect
+from sqlite3 import connect, Connection, OperationalError
 from pyzotero.zotero import Zotero
-import json
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
 from collections import defaultdict
-
+from src.pool import ConnectionPool
+from src.cache import ItemCache
+from src.sync import RemoteSync
+from src.writer import WriteQueue
+from src.profiler import QueryProfiler
+from src.collection import CollectionIndex
+
+
+# item columns which are read from the items table and must not be overwritten
+# by equally named fields in itemData
+ITEM_BASE_FIELDS = ('key', 'version', 'itemType', 'dateAdded', 'dateModified')
+
+# key filters longer than this are joined from a temporary table instead of
+# being bound as parameters
+MAX_BOUND_KEYS = 256
+
+# tag filters of build_sql, one clause per tag group. Only manual tags (type 0)
+# are matched, like the tags of hydrated items
+TAG_FILTER = """i.itemID {negate}IN (SELECT ftg.itemID FROM itemTags ftg
+                JOIN tags ft ON ftg.tagID = ft.tagID
+                WHERE ftg.type = 0 AND ft.name IN ({names}))"""
+
+# same for the JSON of the API responses in syncCache, type 0 is omitted there
+CACHE_TAG_FILTER = """{negate}EXISTS (SELECT 1 FROM json_each(i.data, '$.data.tags') ft
+                WHERE IFNULL(json_extract(ft.value, '$.type'), 0) = 0
+                AND json_extract(ft.value, '$.tag') IN ({names}))"""
+
+# item selections of the hydrate queries: sql stub selecting itemID followed by
+# the columns of the item dict, the columns and the kinds of child rows to join
+ITEM_HYDRATION = ("""SELECT
+        i.itemID,
+        i.key,
+        i.version,
+        it.typeName AS itemType,
+        i.dateAdded,
+        i.dateModified
+    FROM items i
+    LEFT JOIN itemTypes it ON i.itemTypeID = it.itemTypeID
+    WHERE TRUE""",
+    ('key', 'version', 'itemType', 'dateAdded', 'dateModified'),
+    ('fields', 'creators', 'tags', 'relations', 'collections'))
+
+NOTE_HYDRATION = ("""SELECT
+        i.itemID,
+        i.key,
+        i.version,
+        pi.key AS parentItem,
+        it.typeName AS itemType,
+        "in".note
+    FROM items i
+    LEFT JOIN itemTypes it ON i.itemTypeID = it.itemTypeID
+    LEFT JOIN itemNotes "in" ON i.itemID = "in".itemID
+    LEFT JOIN items pi ON "in".parentItemID = pi.itemID
+    WHERE TRUE""",
+    ('key', 'version', 'parentItem', 'itemType', 'note'),
+    ('tags', 'relations', 'collections'))
+
+ATTACHMENT_HYDRATION = ("""SELECT
+        i.itemID,
+        i.key,
+        i.version,
+        pi.key AS parentItem,
+        it.typeName AS itemType,
+        CASE ia.linkMode
+            WHEN 0 THEN 'imported_file'
+            WHEN 1 THEN 'imported_url'
+            WHEN 2 THEN 'linked_file'
+            WHEN 3 THEN 'linked_url'
+        END AS linkMode,
+        ia.contentType,
+        ia.path,
+        c.charset,
+        "in".note,
+        i.dateAdded,
+        i.dateModified
+    FROM items i
+    LEFT JOIN itemTypes it ON i.itemTypeID = it.itemTypeID
+    LEFT JOIN itemAttachments ia ON i.itemID = ia.itemID
+    LEFT JOIN items pi ON ia.parentItemID = pi.itemID
+    LEFT JOIN charsets c ON ia.charsetID = c.charsetID
+    LEFT JOIN itemNotes "in" ON i.itemID = "in".itemID
+    WHERE TRUE""",
+    ('key', 'version', 'parentItem', 'itemType', 'linkMode', 'contentType',
+     'path', 'charset', 'note', 'dateAdded', 'dateModified'),
+    ('fields', 'tags', 'relations'))
+
+# child rows of the hydrate queries: itemID, kind, orderIndex, a, b, c, padding
+HYDRATION_CHILDREN = {
+    'fields': """SELECT s.itemID, 1, id.fieldID, NULL, idv.value, NULL{pad}
+    FROM sel s
+    JOIN itemData id ON s.itemID = id.itemID
+    JOIN itemDataValues idv ON id.valueID = idv.valueID""",
+    'creators': """SELECT s.itemID, 2, ic.orderIndex, ct.creatorType, c.firstName, c.lastName{pad}
+    FROM sel s
+    JOIN itemCreators ic ON s.itemID = ic.itemID
+    JOIN creators c ON ic.creatorID = c.creatorID
+    JOIN creatorTypes ct ON ic.creatorTypeID = ct.creatorTypeID""",
+    'tags': """SELECT s.itemID, 3, 0, t.name, itg.type, NULL{pad}
+    FROM sel s
+    JOIN itemTags itg ON s.itemID = itg.itemID
+    JOIN tags t ON itg.tagID = t.tagID
+    WHERE itg.type = 0""",
+    'relations': """SELECT s.itemID, 4, 0, rp.predicate, ir.object, NULL{pad}
+    FROM sel s
+    JOIN itemRelations ir ON s.itemID = ir.itemID
+    JOIN relationPredicates rp ON ir.predicateID = rp.predicateID""",
+    'collections': """SELECT s.itemID, 5, 0, c.key, NULL, NULL{pad}
+    FROM sel s
+    JOIN collectionItems ci ON s.itemID = ci.itemID
+    JOIN collections c ON ci.collectionID = c.collectionID""",
+}
 
 
 class ZoteroDatabase():
 
-    def __init__(self, local=True):
+    # fieldID -> fieldName maps of the local database, per zotero schema version
+    field_cache = {}
+
+    def __init__(self, local=True, pool_size=4, snapshot=False, cache_path=None, profile=False):
+        """
+        Arguments:
+            local: if True, read from the local database, otherwise use the
+            zotero API
+            pool_size: number of read-only connections worker threads can
+            check out, see ConnectionPool
+            snapshot: if True, read from a private point-in-time copy of the
+            local database
+            cache_path: if set, keep hydrated items in a sidecar cache at this
+            path, see ItemCache. Without local database, the cache mirrors the
+            zotero API, see RemoteSync
+            profile: if True, record statistics of all statements run against
+            the local database, see QueryProfiler
+        """
+        self.fields = None
         self.user_id = os.environ['ZOTERO_USER_ID']
         self.paper_dir = os.environ['PAPER_PATH']
-        self.zot = Zotero(self.user_id, 'user',
-                          os.environ['ZOTERO_API_KEY'], preserve_json_order=True)
+        self.zot = self.connect_api()
+        self.pool = None
+        self.item_cache = None
+        self.remote_sync = None
+        self.profiler = QueryProfiler() if profile else None
         if local == True:
+            self.pool = ConnectionPool(os.environ['ZOTERO_DB_PATH'], pool_size, snapshot,
+                                       factory=self.connection_factory())
             self.cursor = self.connect()
+            if cache_path is not None:
+                self.item_cache = ItemCache(cache_path)
         else:
             self.cursor = None
+            if cache_path is not None:
+                self.item_cache = ItemCache(cache_path, mirror=True)
+                self.remote_sync = RemoteSync(self.item_cache, self.connect_api)
+
+    def library_state(self, local_cursor=None):
+        """
+        Identifies the current state of the library, e.g. to validate indices
+        persisted between sessions, see Snapshot. Consists of the library
+        version and the modification times and sizes of the database files,
+        which also change with local edits not synced yet. Without local
+        database, the mirror is synced first, see RemoteSync.sync.
+
+        Arguments:
+            local_cursor: Cursor instance to local database, if None use the
+            cursor of the instance or the mirror of the zotero API
+
+        Returns:
+            list of built-in values, None without local database or mirror
+        """
+        if local_cursor is None and self.cursor is None:
+            if self.remote_sync is None:
+                return None
+            # the mirror only changes through syncs, which set the version.
+            # Synced first, so changes made since the last session are not
+            # missed
+            self.remote_sync.sync()
+            return [self.remote_sync.library_version]
+
+        cursor = local_cursor or self.cursor
+        cursor.execute("SELECT MAX(version) FROM libraries;")
+        version = cursor.fetchone()[0]
+        return [version, ItemCache.stat_db(self.pool.db_path)]
+
+    def connection_factory(self):
+        """
+        Returns:
+            connection class for the local database, profiled if enabled
+        """
+        if self.profiler is None:
+            return Connection
+        return self.profiler.connection_factory()
+
+    def connect_api(self):
+        """
+        Returns:
+            new Zotero instance for the zotero API of the user
+        """
+        return Zotero(self.user_id, 'user',
+                      os.environ['ZOTERO_API_KEY'], preserve_json_order=True)
 
     def connect(self):
         """
-        Connect to local zotero database.
+        Connect to local zotero database. The connection is read-only and does
+        not block the zotero client.
 
         Returns:
             cursor instance
         """
-        conn = connect(os.environ['ZOTERO_DB_PATH'])
-        return conn.cursor()
+        if self.pool is None:
+            self.pool = ConnectionPool(os.environ['ZOTERO_DB_PATH'],
+                                       factory=self.connection_factory())
+        conn = self.pool.open()
+        cursor = conn.cursor()
+        self.fields = self.get_fields(cursor)
+        return cursor
+
+    def pooled(self, func, *args, **kwargs):
+        """
+        Calls a getter of this instance with a cursor checked out from the
+        connection pool. Allows running queries from worker threads, e.g.
+        pool.submit(db.pooled, db.get_items, keys=keys)
+
+        Arguments:
+            func: method accepting a local_cursor argument
+            args, kwargs: passed on to func
+
+        Returns:
+            return value of func
+        """
+        with self.pool.cursor() as cursor:
+            return func(*args, local_cursor=cursor, **kwargs)
+
+    def backup(self, backup_path):
+        """
+        Writes a consistent copy of the local database using SQLite's online
+        backup, without closing connections or blocking the zotero client.
+
+        Arguments:
+            backup_path: path of the copy
+        """
+        src = connect(self.pool.uri(self.pool.db_path), uri=True)
+        dst = connect(backup_path)
+        try:
+            src.backup(dst)
+        finally:
+            dst.close()
+            src.close()
+
+    def get_schema_version(self, cursor=None):
+        """
+        Reads the schema version of the local database.
+
+        Arguments:
+            cursor: Cursor instance to local database
+
+        Returns:
+            tuple of (schema, version) pairs, None if not available
+        """
+        cursor = cursor or self.cursor
+        try:
+            cursor.execute("""SELECT schema, version FROM version
+            WHERE schema IN ('system', 'userdata', 'globalSchema')
+            ORDER BY schema;""")
+            return tuple(cursor.fetchall()) or None
+        except OperationalError:
+            return None
+
+    def get_fields(self, cursor=None):
+        """
+        Reads all item fields defined in the schema of the local database,
+        including custom fields if present. Cached per schema version.
+
+        Arguments:
+            cursor: Cursor instance to local database
+
+        Returns:
+            dict {fieldID: fieldName}
+        """
+        cursor = cursor or self.cursor
+        version = self.get_schema_version(cursor)
+        if version in self.field_cache:
+            return self.field_cache[version]
+
+        try:
+            cursor.execute("SELECT fieldID, fieldName FROM fieldsCombined;")
+        except OperationalError:
+            cursor.execute("SELECT fieldID, fieldName FROM fields;")
+        fields = dict(cursor.fetchall())
+
+        if version is not None:
+            self.field_cache[version] = fields
+        return fields
 
     def close_connection(self):
         """
         Properly close connection to local database.
         """
+        if self.item_cache is not None:
+            self.item_cache.close()
+        if self.pool is not None:
+            self.pool.close()
         if self.cursor is not None:
             return self.cursor.close()
 
-    def build_sql(self, sql, keys=[], parent_keys=[], item_type='', tags=[], limit=-1, groupby=[], orderby=[]):
+    def build_sql(self, sql, keys=[], parent_keys=[], item_type='', tags=[], limit=-1, groupby=[], orderby=[], cursor=None, since=None, tag_filter=TAG_FILTER):
         """
         Build complete SQL statement from sql stub to query the zotero database.
+        Filter values are bound as parameters. Key lists are padded to a
+        power of two, so statements repeat and are reused from the statement
+        cache of the connection. Key lists longer than MAX_BOUND_KEYS are
+        loaded into a temporary table instead, see load_filter_keys.
 
         Arguments:
             sql: sql stub to use
@@ -46,23 +326,39 @@ class ZoteroDatabase():
             parent_keys: list of parent keys to filter for, if applicable
             item_type: filter for e.g. 'journalArticle' etc. for syntax see:
             https://www.zotero.org/support/dev/web_api/v3/basics#search_syntax
-            tags: filter for tags, currently not implemented.
+            tags: list of tag filters, items must match all of them. Same
+            syntax as item_type, i.e. 'a || b' matches items tagged a or b,
+            '-a || b' items tagged neither a nor b
             limit: number of items to retrieve. If -1, return all items
             groupby: list of keys to group by
+            orderby: list of keys to order by
+            cursor: Cursor instance to local database the statement will be
+            executed with. Required for long key lists.
+            since: only select items with a version greater than since
+            tag_filter: sql template of a tag filter, see TAG_FILTER
+
+        Returns:
+            sql statement, list of parameters
         """
         keys = list(keys)
         parent_keys = list(parent_keys)
         tags = list(tags)
         groupby = list(groupby)
         orderby = list(orderby)
-
-        if len(keys) > 0:
-            keys_str = ','.join(map(lambda s: "'{}'".format(s), keys))
-            sql += "\nAND i.key IN ({})".format(keys_str)
-
-        if len(parent_keys) > 0:
-            parent_keys_str = ','.join(map(lambda s: "'{}'".format(s), parent_keys))
-            sql += "\nAND pi.key IN ({})".format(parent_keys_str)
+        params = list()
+
+        # keys are only indexed together with the libraryID, see items table
+        for alias, slot, values in [('i', 'keys', keys), ('pi', 'parent_keys', parent_keys)]:
+            if len(values) > 0:
+                sql += "\nAND {}.libraryID IN (SELECT libraryID FROM libraries)".format(alias)
+            if len(values) > MAX_BOUND_KEYS:
+                self.load_filter_keys(cursor, slot, values)
+                sql += "\nAND {}.key IN (SELECT key FROM temp.filter_keys WHERE slot = ?)".format(alias)
+                params.append(slot)
+            elif len(values) > 0:
+                size = 1 << (len(values) - 1).bit_length()
+                sql += "\nAND {}.key IN ({})".format(alias, ','.join('?' * size))
+                params += values + values[-1:] * (size - len(values))
 
         if len(item_type) > 0:
             if item_type[0] == '-':
@@ -70,13 +366,26 @@ class ZoteroDatabase():
                 item_type = item_type[1:]
             else:
                 negate = ''
-            types = map(lambda s: "'{}'".format(s), item_type.split(' || '))
-            sql += '\nAND it.typeName ' + negate + 'IN (' + ','.join(types) + ')'
-
-        if tags != []:
-            pass
-            # warnings.warn("tag filter not implemented")
-            # '\nAND GROUP_CONCAT(t.name) NOT LIKE "%{}%"''.format()
+            types = item_type.split(' || ')
+            sql += '\nAND it.typeName ' + negate + 'IN (' + ','.join('?' * len(types)) + ')'
+            params += types
+
+        if since is not None:
+            sql += "\nAND i.version > ?"
+            params.append(since)
+
+        for tag in tags:
+            # empty filters, e.g. of a trailing ' && ', do not filter
+            if len(tag) == 0:
+                continue
+            if tag[0] == '-':
+                negate = 'NOT '
+                tag = tag[1:]
+            else:
+                negate = ''
+            names = tag.split(' || ')
+            sql += '\nAND ' + tag_filter.format(negate=negate, names=','.join('?' * len(names)))
+            params += names
 
         if len(groupby) > 0:
             sql += "\nGROUP BY {}".format(','.join(groupby))
@@ -85,12 +394,50 @@ class ZoteroDatabase():
             sql += "\nORDER BY {}".format(','.join(orderby))
 
         if limit > 0:
-            sql += "\nLIMIT " + str(limit)
+            sql += "\nLIMIT ?"
+            params.append(limit)
 
         sql += ";"
-        return sql
+        return sql, params
+
+    def load_filter_keys(self, cursor=None, slot='keys', keys=[]):
+        """
+        Loads keys into the indexed temporary table temp.filter_keys of the
+        connection, replacing previously loaded keys of the same slot. Avoids
+        SQLite's limits on the number of bound parameters and expression depth
+        for large selections.
+
+        Arguments:
+            cursor: Cursor instance to local database
+            slot: name of the key list, e.g. 'keys' or 'parent_keys'
+            keys: list of keys
+        """
+        cursor = cursor or self.cursor
 
-    def get_items(self, keys=[], item_type='-note || attachment', tags=[], limit=-1, local_cursor=None, use_cache=False):
+        if cursor is None:
+            warnings.warn("sqlite cursor required")
+        else:
+            # read-only connections refuse writes to temporary tables, too
+            cursor.execute("PRAGMA query_only;")
+            query_only = cursor.fetchone()[0]
+            if query_only:
+                cursor.execute("PRAGMA query_only = 0;")
+            try:
+                cursor.execute("""CREATE TEMP TABLE IF NOT EXISTS filter_keys (
+                    slot TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    PRIMARY KEY (slot, key)
+                ) WITHOUT ROWID;""")
+                cursor.execute("DELETE FROM temp.filter_keys WHERE slot = ?;", [slot])
+                cursor.executemany("INSERT OR IGNORE INTO temp.filter_keys VALUES (?, ?);",
+                                   ((slot, k) for k in keys))
+                # do not keep a transaction, and with it a shared lock, open
+                cursor.connection.commit()
+            finally:
+                if query_only:
+                    cursor.execute("PRAGMA query_only = 1;")
+
+    def get_items(self, keys=[], item_type='-note || attachment', tags=[], limit=-1, local_cursor=None, use_cache=False, since=None):
         """
         Gets list of zotero data items from either the local database or through
         the zotero API.
@@ -101,64 +448,131 @@ class ZoteroDatabase():
             tags: filter for tags, see build_sql
             limit: limit returned items, see build_sql
             local_cursor: if None, get items over API. There is a limit to
-            retrieved items. If local cursor specified, use the local database
-            use_cache: if True, use syched cache to from the zotero API to
-            return items from local database. Possibly faster, but filtering not
-            implemented.
+            retrieved items, unless the API is mirrored, see RemoteSync. If
+            local cursor specified, use the local database
+            use_cache: if True, return items from the cache of the zotero API
+            responses zotero keeps in the local database. Only matching items
+            are decoded, fast for small selections.
+            since: only return items with a version greater than since
+
+        If a sidecar cache is configured (see ItemCache), items are read from
+        there unless a local cursor is given. The cache is refreshed first,
+        which only hydrates items modified since the last call.
 
         Returns:
             list of zotero data items conforming to the zotero API format
         """
-        if isinstance(keys, str):
-            keys = [keys]
+        return list(self.iter_items(keys, item_type, tags, limit, local_cursor, use_cache, since=since))
 
-        if isinstance(tags, str):
-            tags = [tags]
+    def get_keys(self, item_type='-note || attachment', tags=[], local_cursor=None):
+        """
+        Lists the keys of all items matching the filters, without hydrating
+        the items.
 
-        cursor = local_cursor or self.cursor
+        Arguments:
+            item_type: filter for item types, see build_sql
+            tags: filter for tags, see build_sql
+            local_cursor: Cursor instance to local database, if None use the
+            cursor of the instance or the zotero API
 
-        if cursor is None:
-            keys_str = ','.join(keys)
-            items = self.zot.items(itemKey=keys_str, itemType=item_type, tag=tags, limit=limit)
-            items = [i['data'] for i in items]
-        else:
-            if use_cache == False:
-                items = self.get_items_data_local(local_cursor, keys, item_type, tags, limit)
-                creators_data = self.get_items_creators_local(local_cursor, keys, item_type, tags, limit)
-                tags_data = self.get_items_tags_local(local_cursor, keys, item_type, tags, limit)
-                relations_data = self.get_items_relations_local(local_cursor, keys, item_type, tags, limit)
-                collections_data = self.get_items_collections_local(local_cursor, keys, item_type, tags, limit)
-                for i in items:
-                    if i['key'] in creators_data:
-                        i['creators'] = creators_data[i['key']]
-                    if i['key'] in tags_data:
-                        i['tags'] = tags_data[i['key']]
-                    if i['key'] in relations_data:
-                        i['relations'] = relations_data[i['key']]
-                    if i['key'] in collections_data:
-                        i['collections'] = collections_data[i['key']]
-            else:
-                warnings.warn("Filters not fully implemented")
-                sql = """SELECT s.data FROM syncCache s;"""
+        Returns:
+            list of keys
+        """
+        if local_cursor is None and self.cursor is None:
+            return [i['key'] for i in self.iter_items(item_type=item_type, tags=tags)]
+
+        sql = """SELECT i.key
+        FROM items i
+        LEFT JOIN itemTypes it ON i.itemTypeID = it.itemTypeID
+        WHERE TRUE"""
+        cursor = self.stream_cursor(local_cursor)
+        try:
+            sql, params = self.build_sql(sql, item_type=item_type, tags=tags, cursor=cursor)
+            cursor.execute(sql, params)
+            return [k for k, in cursor.fetchall()]
+        finally:
+            if cursor is not local_cursor:
+                cursor.close()
+
+    def get_modified(self, item_type='-note || attachment', since=None, local_cursor=None):
+        """
+        Lists items changed since a high-water mark, without hydrating them.
+        Unlike the version, the clientDateModified of an item also changes
+        with local edits which are not synced yet.
+
+        Arguments:
+            item_type: filter for item types, see build_sql
+            since: [version, clientDateModified] mark, None for all items
+            local_cursor: Cursor instance to local database, if None use the
+            cursor of the instance or the zotero API
 
-                cursor.execute(sql)
-                columns = [c[0] for c in cursor.description]
-                data = cursor.fetchall()
+        Returns:
+            dict {key: [version, clientDateModified]}
+        """
+        if local_cursor is None and self.cursor is None:
+            # the mirror only holds synced items, the version suffices
+            version = None if since is None else since[0]
+            if item_type == 'note':
+                items = self.iter_notes(since=version)
+            else:
+                items = self.iter_items(item_type=item_type, since=version)
+            return {i['key']: [i['version'], i.get('dateModified', '')] for i in items}
 
-                items = [json.loads(i[0])['data'] for i in data]
-                if len(keys) > 0:
-                    items = [i for i in items if i['key'] in keys]
-                if len(item_type) > 0:
-                    pass
-                if limit >= 0:
-                    items = items[0:limit]
+        sql = """SELECT
+            i.key,
+            i.version,
+            i.clientDateModified
+        FROM items i
+        LEFT JOIN itemTypes it ON i.itemTypeID = it.itemTypeID
+        WHERE TRUE"""
+        cursor = self.stream_cursor(local_cursor)
+        try:
+            sql, params = self.build_sql(sql, item_type=item_type, cursor=cursor)
+            if since is not None:
+                sql = sql[:-1] + "\nAND (i.version > ? OR i.clientDateModified > ?);"
+                params += [since[0], since[1] or '']
+            cursor.execute(sql, params)
+            return {k: [v, m] for k, v, m in cursor.fetchall()}
+        finally:
+            if cursor is not local_cursor:
+                cursor.close()
+
+    def get_deleted(self, since=None, local_cursor=None):
+        """
+        Lists items erased from the library after a high-water mark, as
+        recorded in the delete log zotero keeps for syncing. Items in the
+        trash are not erased yet.
 
-            if len(tags) > 0:
-                items = [i for i in items if all(t in [t.get('tag') for t in i.get('tags', {})] for t in tags)]
+        Arguments:
+            since: dateDeleted mark, None for all erased items
+            local_cursor: Cursor instance to local database, if None use the
+            cursor of the instance
 
-        return items
+        Returns:
+            dict {key: dateDeleted}, None if deletions are not logged, e.g.
+            without local database
+        """
+        if local_cursor is None and self.cursor is None:
+            return None
 
-    def get_notes(self, keys=[], parent_keys=[], tags=[], limit=-1, local_cursor=None):
+        cursor = self.stream_cursor(local_cursor)
+        try:
+            cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE name = 'syncDeleteLog';")
+            if cursor.fetchone()[0] == 0:
+                return None
+            cursor.execute("""SELECT
+                l.key,
+                l.dateDeleted
+            FROM syncDeleteLog l
+            JOIN syncObjectTypes t ON l.syncObjectTypeID = t.syncObjectTypeID
+            WHERE t.name = 'item'
+            AND l.dateDeleted > ?;""", [since or ''])
+            return dict(cursor.fetchall())
+        finally:
+            if cursor is not local_cursor:
+                cursor.close()
+
+    def get_notes(self, keys=[], parent_keys=[], tags=[], limit=-1, local_cursor=None, since=None):
         """
         Retrieves note items from local database of zotero API.
 
@@ -170,6 +584,79 @@ class ZoteroDatabase():
             limit: limit returned items, see build_sql
             local_cursor: if None, get items over API. There is a limit to
             retrieved items. If local cursor specified, use the local database
+            since: only return notes with a version greater than since
+        """
+        return list(self.iter_notes(keys, parent_keys, tags, limit, local_cursor, since=since))
+
+    def get_attachments(self, keys=[], parent_keys=[], tags=[], limit=-1, local_cursor=None):
+        """
+        Retrieves attachment items from local database of zotero API.
+
+        Arguments:
+            keys: filter for keys of the note item(!), see build_sql
+            parent_keys: filter for keys of parent items (i.e. publications)
+            item_type: filter for item types, see build_sql
+            tags: filter for tags, see build_sql
+            limit: limit returned items, see build_sql
+            local_cursor: if None, get items over API. There is a limit to
+            retrieved items. If local cursor specified, use the local database
+        """
+        return list(self.iter_attachments(keys, parent_keys, tags, limit, local_cursor))
+
+    def iter_items(self, keys=[], item_type='-note || attachment', tags=[], limit=-1, local_cursor=None, use_cache=False, batch_size=1000, since=None):
+        """
+        Generator version of get_items. Rows are fetched from the local database
+        in batches and items are yielded as soon as they are complete, so
+        memory does not grow with the size of the library.
+
+        Arguments:
+            see get_items
+            batch_size: number of rows fetched from the database at once
+
+        Returns:
+            generator of zotero data items conforming to the zotero API format
+        """
+        if isinstance(keys, str):
+            keys = [keys]
+
+        if isinstance(tags, str):
+            tags = [tags]
+
+        if local_cursor is None and self.remote_sync is not None:
+            self.remote_sync.sync()
+            yield from self.item_cache.iter_items(keys, item_type, tags, limit, since, batch_size)
+            return
+
+        if local_cursor is None and self.cursor is None:
+            keys_str = ','.join(keys)
+            params = {} if since is None else {'since': since}
+            items = self.zot.items(itemKey=keys_str, itemType=item_type, tag=tags, limit=limit, **params)
+            yield from (i['data'] for i in items)
+            return
+
+        sidecar = (local_cursor is None and use_cache == False and self.item_cache is not None
+                   and self.item_cache.covers(item_type))
+        cursor = None if sidecar else self.stream_cursor(local_cursor)
+        try:
+            if sidecar:
+                self.item_cache.refresh(self)
+                items = self.item_cache.iter_items(keys, item_type, tags, limit, since, batch_size)
+            elif use_cache == False:
+                items = self.iter_hydrated_local(cursor, ITEM_HYDRATION, keys, [],
+                                                 item_type, tags, limit, batch_size,
+                                                 since=since)
+            else:
+                items = self.iter_cache_local(cursor, keys, item_type, tags, limit,
+                                              batch_size, since=since)
+
+            yield from items
+        finally:
+            if cursor is not None and cursor is not local_cursor:
+                cursor.close()
+
+    def iter_notes(self, keys=[], parent_keys=[], tags=[], limit=-1, local_cursor=None, batch_size=1000, since=None):
+        """
+        Generator version of get_notes, see iter_items.
         """
         if isinstance(keys, str):
             keys = [keys]
@@ -177,45 +664,38 @@ class ZoteroDatabase():
         if isinstance(parent_keys, str):
             parent_keys = [parent_keys]
 
-        cursor = local_cursor or self.cursor
+        if isinstance(tags, str):
+            tags = [tags]
 
         item_type = 'note'
 
-        if cursor is None:
+        if local_cursor is None and self.remote_sync is not None:
+            self.remote_sync.sync()
+            yield from self.item_cache.iter_items(keys, item_type, tags, limit, since,
+                                                  batch_size=batch_size, parent_keys=parent_keys)
+            return
+
+        if local_cursor is None and self.cursor is None:
             if parent_keys == []:
                 keys_str = ','.join(keys)
-                items = self.zot.items(itemKey=keys_str, itemType=item_type, tag=tags, limit=limit)
-                items = [i['data'] for i in items]
+                params = {} if since is None else {'since': since}
+                items = self.zot.items(itemKey=keys_str, itemType=item_type, tag=tags, limit=limit, **params)
+                yield from (i['data'] for i in items)
             else:
                 warnings.warn("parent_keys not supported for remote database.")
-                items = []
-        else:
-            items = self.get_notes_data_local(local_cursor, keys, parent_keys, tags, limit)
-            tags_data = self.get_items_tags_local(local_cursor, keys, item_type, tags, limit)
-            relations_data = self.get_items_relations_local(local_cursor, keys, item_type, tags, limit)
-            collections_data = self.get_items_collections_local(local_cursor, keys, item_type, tags, limit)
-            for i in items:
-                if i['key'] in tags_data:
-                    i['tags'] = tags_data[i['key']]
-                if i['key'] in relations_data:
-                    i['relations'] = relations_data[i['key']]
-                if i['key'] in collections_data:
-                    i['collections'] = collections_data[i['key']]
+            return
 
-        return items
+        cursor = self.stream_cursor(local_cursor)
+        try:
+            yield from self.iter_hydrated_local(cursor, NOTE_HYDRATION, keys, parent_keys,
+                                                item_type, tags, limit, batch_size, since=since)
+        finally:
+            if cursor is not local_cursor:
+                cursor.close()
 
-    def get_attachments(self, keys=[], parent_keys=[], tags=[], limit=-1, local_cursor=None):
+    def iter_attachments(self, keys=[], parent_keys=[], tags=[], limit=-1, local_cursor=None, batch_size=1000):
         """
-        Retrieves attachment items from local database of zotero API.
-
-        Arguments:
-            keys: filter for keys of the note item(!), see build_sql
-            parent_keys: filter for keys of parent items (i.e. publications)
-            item_type: filter for item types, see build_sql
-            tags: filter for tags, see build_sql
-            limit: limit returned items, see build_sql
-            local_cursor: if None, get items over API. There is a limit to
-            retrieved items. If local cursor specified, use the local database
+        Generator version of get_attachments, see iter_items.
         """
         if isinstance(keys, str):
             keys = [keys]
@@ -223,30 +703,185 @@ class ZoteroDatabase():
         if isinstance(parent_keys, str):
             parent_keys = [parent_keys]
 
-        cursor = local_cursor or self.cursor
+        if isinstance(tags, str):
+            tags = [tags]
 
         item_type = 'attachment'
 
-        if cursor is None:
+        if local_cursor is None and self.remote_sync is not None:
+            self.remote_sync.sync()
+            yield from self.item_cache.iter_items(keys, item_type, tags, limit, batch_size=batch_size,
+                                                  parent_keys=parent_keys)
+            return
+
+        if local_cursor is None and self.cursor is None:
             if parent_keys == []:
                 keys_str = ','.join(keys)
                 items = self.zot.items(itemKey=keys_str, itemType=item_type, tag=tags, limit=limit)
-                items = [i['data'] for i in items]
+                yield from (i['data'] for i in items)
             else:
                 warnings.warn("parent_keys not supported for remote database.")
-                items = []
+            return
+
+        cursor = self.stream_cursor(local_cursor)
+        try:
+            yield from self.iter_hydrated_local(cursor, ATTACHMENT_HYDRATION, keys, parent_keys,
+                                                item_type, tags, limit, batch_size)
+        finally:
+            if cursor is not local_cursor:
+                cursor.close()
+
+    def stream_cursor(self, local_cursor=None):
+        """
+        Returns the cursor generators should stream rows from. Unless a cursor
+        is given, this is a new cursor on the connection of self.cursor, so the
+        caller can keep using self.cursor while consuming the generator.
+        """
+        return local_cursor or self.cursor.connection.cursor()
+
+    def iter_rows(self, cursor, batch_size=1000):
+        """
+        Yields the result rows of the last statement of a cursor, fetched in
+        batches.
+        """
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            yield from rows
+
+    def hydrate_items_local(self, cursor=None, keys=[], item_type='', tags=[], limit=-1):
+        """
+        Retrieves complete zotero items from the local database in a single
+        query, see iter_hydrated_local.
+
+        Arguments:
+            cursor: Cursor instance to local database
+            keys: filter for keys, see build_sql
+            item_type: filter for item types, see build_sql
+            tags: filter for tags, see build_sql
+            limit: limit returned items, see build_sql
+
+        Returns:
+            list of zotero data items conforming to the zotero API format
+        """
+        if isinstance(keys, str):
+            keys = [keys]
+
+        cursor = cursor or self.cursor
+
+        if cursor is None:
+            warnings.warn("sqlite cursor required")
         else:
-            items = self.get_attachments_data_local(local_cursor, keys, parent_keys, tags, limit)
-            tags_data = self.get_items_tags_local(local_cursor, keys, item_type, tags, limit)
-            relations_data = self.get_items_relations_local(local_cursor, keys, item_type, tags, limit)
-            for i in items:
-                if i['key'] in tags_data:
-                    i['tags'] = tags_data[i['key']]
-                if i['key'] in relations_data:
-                    i['relations'] = relations_data[i['key']]
+            return list(self.iter_hydrated_local(cursor, ITEM_HYDRATION, keys, [],
+                                                 item_type, tags, limit))
+
+    def iter_hydrated_local(self, cursor, hydration, keys=[], parent_keys=[], item_type='', tags=[], limit=-1, batch_size=1000, since=None):
+        """
+        Streams complete zotero items from the local database. Item data,
+        creators, tags, relations and collections are read as one stream of
+        rows ordered by itemID and folded into item dicts, instead of running
+        one query per table and stitching the results by key.
 
-        return items
+        Arguments:
+            cursor: Cursor instance to local database
+            hydration: one of ITEM_HYDRATION, NOTE_HYDRATION,
+            ATTACHMENT_HYDRATION
+            keys, parent_keys, item_type, tags, limit, since: see build_sql
+            batch_size: number of rows fetched from the database at once
+
+        Returns:
+            generator of zotero data items conforming to the zotero API format
+        """
+        sel_sql, columns, children = hydration
 
+        sel_sql, params = self.build_sql(sel_sql, keys, parent_keys, item_type, tags, limit,
+                                         cursor=cursor, since=since)
+        sel_sql = sel_sql.rstrip(';')
+
+        # rows: itemID, kind, orderIndex, payload padded to the base columns
+        pad = ', NULL' * (len(columns) - 3)
+        branches = ["SELECT s.itemID, 0, 0, " + ', '.join('s.' + c for c in columns) + " FROM sel s"]
+        branches += [HYDRATION_CHILDREN[child].format(pad=pad) for child in children]
+        sql = "WITH sel AS ({})\n".format(sel_sql)
+        sql += "\nUNION ALL\n".join(branches)
+        sql += "\nORDER BY 1, 2, 3, 4, 5;"
+
+        fields = self.fields or self.get_fields(cursor)
+        cursor.execute(sql, params)
+        yield from self.fold_item_rows(self.iter_rows(cursor, batch_size), fields, columns)
+
+    def iter_cache_local(self, cursor, keys=[], item_type='', tags=[], limit=-1, batch_size=1000, since=None):
+        """
+        Streams items from syncCache, the zotero API responses cached in the
+        local database. Key, item type, tag and version filters are evaluated by
+        SQLite on the cached JSON, so only matching items are decoded. Only the
+        latest cached version of an item is returned.
+
+        Arguments:
+            cursor: Cursor instance to local database
+            keys, item_type, tags, limit, since: see build_sql
+            batch_size: number of rows fetched from the database at once
+
+        Returns:
+            generator of zotero data items conforming to the zotero API format
+        """
+        sql = """SELECT
+            json_extract(i.data, '$.data')
+        FROM syncCache i
+        JOIN syncObjectTypes sot ON i.syncObjectTypeID = sot.syncObjectTypeID
+        LEFT JOIN itemTypes it ON json_extract(i.data, '$.data.itemType') = it.typeName
+        WHERE sot.name = 'item'
+        AND i.version = (SELECT MAX(s.version) FROM syncCache s
+                         WHERE s.libraryID = i.libraryID
+                         AND s.key = i.key
+                         AND s.syncObjectTypeID = i.syncObjectTypeID)"""
+
+        sql, params = self.build_sql(sql, keys, [], item_type, tags, limit,
+                                     cursor=cursor, since=since,
+                                     tag_filter=CACHE_TAG_FILTER)
+
+        cursor.execute(sql, params)
+        for row in self.iter_rows(cursor, batch_size):
+            yield json_loads(row[0])
+
+    def fold_item_rows(self, rows, fields, columns=ITEM_HYDRATION[1]):
+        """
+        Folds the row stream of iter_hydrated_local into item dicts. Rows must
+        be ordered by itemID with the item row (kind 0) first.
+
+        Arguments:
+            rows: iterable of (itemID, kind, orderIndex, payload...) tuples
+            fields: dict {fieldID: fieldName}, see get_fields
+            columns: names of the payload columns of item rows
+
+        Returns:
+            generator of zotero data items
+        """
+        item = None
+        current_id = None
+        for row in rows:
+            item_id, kind, order, a, b = row[:5]
+            if item_id != current_id:
+                if item is not None:
+                    yield item
+                current_id = item_id
+                item = {k: v for k, v in zip(columns, row[3:]) if v is not None}
+            elif kind == 1:
+                name = fields.get(order)
+                if b is not None and name is not None and name not in columns:
+                    item[name] = b
+            elif kind == 2:
+                item.setdefault('creators', []).append(
+                    {'creatorType': a, 'firstName': b, 'lastName': row[5]})
+            elif kind == 3:
+                item.setdefault('tags', []).append({'tag': a, 'type': b})
+            elif kind == 4:
+                item.setdefault('relations', {}).setdefault(a, []).append(b)
+            elif kind == 5:
+                item.setdefault('collections', []).append(a)
+        if item is not None:
+            yield item
 
     def get_items_data_local(self, cursor=None, keys=[], item_type='', tags=[], limit=-1):
         """
@@ -269,72 +904,48 @@ class ZoteroDatabase():
             warnings.warn("sqlite cursor required")
         else:
             sql = """SELECT
+                i.itemID,
                 i.key,
                 i.version,
-                MAX(it.typeName) AS itemType,
-                MAX(CASE WHEN fieldName = 'title' THEN value END) AS title,
-                MAX(CASE WHEN fieldName = 'url' THEN value END) AS url,
-                MAX(CASE WHEN fieldName = 'volume' THEN value END) AS volume,
-                MAX(CASE WHEN fieldName = 'issue' THEN value END) AS issue,
-                MAX(CASE WHEN fieldName = 'pages' THEN value END) AS pages,
-                MAX(CASE WHEN fieldName = 'publicationTitle' THEN value END) AS publicationTitle,
-                MAX(CASE WHEN fieldName = 'ISSN' THEN value END) AS ISSN,
-                MAX(CASE WHEN fieldName = 'date' THEN value END) AS date,
-                MAX(CASE WHEN fieldName = 'DOI' THEN value END) AS DOI,
-                MAX(CASE WHEN fieldName = 'accessDate' THEN value END) AS accessDate,
-                MAX(CASE WHEN fieldName = 'libraryCatalog' THEN value END) AS libraryCatalog,
-                MAX(CASE WHEN fieldName = 'language' THEN value END) AS language,
-                MAX(CASE WHEN fieldName = 'abstractNote' THEN value END) AS abstractNote,
-                MAX(CASE WHEN fieldName = 'shortTitle' THEN value END) AS shortTitle,
-                MAX(CASE WHEN fieldName = 'place' THEN value END) AS place,
-                MAX(CASE WHEN fieldName = 'publisher' THEN value END) AS publisher,
-                MAX(CASE WHEN fieldName = 'ISBN' THEN value END) AS ISBN,
-                MAX(CASE WHEN fieldName = 'callNumber' THEN value END) AS callNumber,
-                MAX(CASE WHEN fieldName = 'numPages' THEN value END) AS numPages,
-                MAX(CASE WHEN fieldName = 'extra' THEN value END) AS extra,
-                MAX(CASE WHEN fieldName = 'bookTitle' THEN value END) AS bookTitle,
-                MAX(CASE WHEN fieldName = 'journalAbbreviation' THEN value END) AS journalAbbreviation,
-                MAX(CASE WHEN fieldName = 'edition' THEN value END) AS edition,
-                MAX(CASE WHEN fieldName = 'series' THEN value END) AS series,
-                MAX(CASE WHEN fieldName = 'seriesNumber' THEN value END) AS seriesNumber,
-                MAX(CASE WHEN fieldName = 'institution' THEN value END) AS institution,
-                MAX(CASE WHEN fieldName = 'reportNumber' THEN value END) AS reportNumber,
-                MAX(CASE WHEN fieldName = 'conferenceName' THEN value END) AS conferenceName,
-                MAX(CASE WHEN fieldName = 'proceedingsTitle' THEN value END) AS proceedingsTitle,
-                MAX(CASE WHEN fieldName = 'reportType' THEN value END) AS reportType,
-                MAX(CASE WHEN fieldName = 'seriesTitle' THEN value END) AS seriesTitle,
-                MAX(CASE WHEN fieldName = 'thesisType' THEN value END) AS thesisType,
-                MAX(CASE WHEN fieldName = 'university' THEN value END) AS university,
-                MAX(CASE WHEN fieldName = 'archive' THEN value END) AS archive,
-                MAX(CASE WHEN fieldName = 'rights' THEN value END) AS rights,
-                MAX(CASE WHEN fieldName = 'websiteTitle' THEN value END) AS websiteTitle,
-                MAX(CASE WHEN fieldName = 'encyclopediaTitle' THEN value END) AS encyclopediaTitle,
-                MAX(CASE WHEN fieldName = 'websiteType' THEN value END) AS websiteType,
-                MAX(CASE WHEN fieldName = 'archiveLocation' THEN value END) AS archiveLocation,
-                MAX(CASE WHEN fieldName = 'blogTitle' THEN value END) AS blogTitle,
-                MAX(CASE WHEN fieldName = 'manuscriptType' THEN value END) AS manuscriptType,
-                MAX(dateAdded) AS dateAdded,
-                MAX(dateModified) AS dateModified
-            FROM items i
+                i.itemType,
+                i.dateAdded,
+                i.dateModified,
+                id.fieldID,
+                idv.value
+            FROM ({sel}) i
             LEFT JOIN itemData id ON i.itemID = id.itemID
-            LEFT JOIN itemTypes it ON i.itemTypeID = it.itemTypeID
-            LEFT JOIN itemTags itg ON i.itemID = itg.itemID
-            LEFT JOIN tags t ON itg.tagID = t.tagID
-
-            LEFT JOIN fields f ON id.fieldID = f.fieldID
             LEFT JOIN itemDataValues idv ON id.valueID = idv.valueID
-            WHERE TRUE"""
-
-            sql = self.build_sql(sql, keys, [], item_type, tags, limit,
-                                 groupby=['i.key'])
-
-            cursor.execute(sql)
-            columns = [c[0] for c in cursor.description]
-            data = cursor.fetchall()
-
-            full_item_dict = [dict(zip(columns, item)) for item in data]
+            ORDER BY i.itemID, id.fieldID;"""
 
-            items_list = list(map(lambda i: {k:v for k, v in i.items() if v is not None}, full_item_dict))
+            sel_sql = """SELECT
+                i.itemID,
+                i.key,
+                i.version,
+                it.typeName AS itemType,
+                i.dateAdded,
+                i.dateModified
+            FROM items i
+            LEFT JOIN itemTypes it ON i.itemTypeID = it.itemTypeID
+            WHERE TRUE"""
+            sel_sql, params = self.build_sql(sel_sql, keys, [], item_type, tags, limit,
+                                             cursor=cursor)
+            sel_sql = sel_sql.rstrip(';')
+
+            fields = self.fields or self.get_fields(cursor)
+            cursor.execute(sql.format(sel=sel_sql), params)
+
+            # fold (itemID, fieldID, value) rows into one dict per item
+            items_list = list()
+            current_id = None
+            for item_id, key, version, item_type, added, modified, field_id, value in cursor:
+                if item_id != current_id:
+                    current_id = item_id
+                    item = {'key': key, 'version': version, 'itemType': item_type,
+                            'dateAdded': added, 'dateModified': modified}
+                    items_list.append({k: v for k, v in item.items() if v is not None})
+                name = fields.get(field_id)
+                if value is not None and name is not None and name not in ITEM_BASE_FIELDS:
+                    items_list[-1][name] = value
             return items_list
 
     def get_notes_data_local(self, cursor=None, keys=[], parent_keys=[], tags=[], limit=-1):
@@ -368,9 +979,10 @@ class ZoteroDatabase():
             LEFT JOIN items pi ON "in".parentItemID = pi.itemID
             WHERE TRUE
             """
-            sql = self.build_sql(sql, keys, parent_keys, 'note', tags, limit)
+            sql, params = self.build_sql(sql, keys, parent_keys, 'note', tags, limit,
+                                         cursor=cursor)
 
-            cursor.execute(sql)
+            cursor.execute(sql, params)
             columns = [c[0] for c in cursor.description]
             data = cursor.fetchall()
 
@@ -429,10 +1041,11 @@ class ZoteroDatabase():
             LEFT JOIN itemNotes "in" ON i.itemID = "in".ItemID
             WHERE TRUE
             """
-            sql = self.build_sql(sql, keys, parent_keys, 'attachment',
-                                 tags, limit, groupby=['i.key'])
+            sql, params = self.build_sql(sql, keys, parent_keys, 'attachment',
+                                         tags, limit, groupby=['i.key'],
+                                         cursor=cursor)
 
-            cursor.execute(sql)
+            cursor.execute(sql, params)
             columns = [c[0] for c in cursor.description]
             data = cursor.fetchall()
 
@@ -476,11 +1089,12 @@ class ZoteroDatabase():
             WHERE ct.creatorType IS NOT NULL
             """
 
-            sql = self.build_sql(sql, keys, [], item_type, tags, limit,
-                                 groupby=['i.key', 'c.firstName', 'c.lastName'],
-                                 orderby=['i.key', 'ic.orderIndex'])
+            sql, params = self.build_sql(sql, keys, [], item_type, tags, limit,
+                                         groupby=['i.key', 'c.firstName', 'c.lastName'],
+                                         orderby=['i.key', 'ic.orderIndex'],
+                                         cursor=cursor)
 
-            cursor.execute(sql)
+            cursor.execute(sql, params)
             columns = [c[0] for c in cursor.description]
             data = cursor.fetchall()
 
@@ -520,10 +1134,11 @@ class ZoteroDatabase():
             WHERE it.type = 0 -- IS NOT NULL
             """
 
-            sql = self.build_sql(sql, keys, [], item_type, tags, limit,
-                                 groupby=['i.key', 't.name'])
+            sql, params = self.build_sql(sql, keys, [], item_type, tags, limit,
+                                         groupby=['i.key', 't.name'],
+                                         cursor=cursor)
 
-            cursor.execute(sql)
+            cursor.execute(sql, params)
             columns = [c[0] for c in cursor.description]
             data = cursor.fetchall()
 
@@ -566,10 +1181,11 @@ class ZoteroDatabase():
             WHERE ir.object IS NOT NULL
             """
 
-            sql = self.build_sql(sql, keys, [], item_type, tags, limit,
-                                 groupby=['i.key', 'ir.object'])
+            sql, params = self.build_sql(sql, keys, [], item_type, tags, limit,
+                                         groupby=['i.key', 'ir.object'],
+                                         cursor=cursor)
 
-            cursor.execute(sql)
+            cursor.execute(sql, params)
             columns = [c[0] for c in cursor.description]
             data = cursor.fetchall()
 
@@ -610,10 +1226,11 @@ class ZoteroDatabase():
             WHERE c.key IS NOT NULL
             """
 
-            sql = self.build_sql(sql, keys, [], item_type, tags, limit,
-                                 groupby=['i.key', 'c.key'])
+            sql, params = self.build_sql(sql, keys, [], item_type, tags, limit,
+                                         groupby=['i.key', 'c.key'],
+                                         cursor=cursor)
 
-            cursor.execute(sql)
+            cursor.execute(sql, params)
             columns = [c[0] for c in cursor.description]
             data = cursor.fetchall()
 
@@ -626,7 +1243,8 @@ class ZoteroDatabase():
     def get_autocompletes(self, local_cursor=None):
         """
         Provides a convenience dictionary for building the autocomplete engine.
-        Data is retrieved from the local database only, not the zotero API!
+        Data is retrieved from the local database, or from the mirror of the
+        zotero API if there is no local database.
 
         Arguments:
             local_cursor: cursor for local database. If None, attempt using the
@@ -636,6 +1254,19 @@ class ZoteroDatabase():
             dict with database key and corresponding name for the autocomplete
             engine: authornameYear - title.
         """
+        if local_cursor is None and self.cursor is None:
+            # zotero API, only available with a mirror of the library
+            names = []
+            for i in self.iter_items():
+                creators = i.get('creators', [])
+                authors = [c for c in creators if c.get('creatorType') == 'author'] or creators
+                last_name = authors[0].get('lastName', authors[0].get('name', '')) if authors else ''
+                year = re.search(r'\d{4}', i.get('date', ''))
+                year = year.group() if year else ''
+                names.append((last_name, i.get('date', ''), i['key'],
+                              ''.join(last_name.split()).lower() + year + ' - '
+                              + (i.get('shortTitle') or i.get('title') or 'Unknown Title')))
+            return {key: name for _, _, key, name in sorted(names)}
 
         sql = """SELECT
             i.key,
@@ -680,18 +1311,194 @@ class ZoteroDatabase():
              + (i['shortTitle'] or i['title'] or 'Unknown Title') for i in items_list}
         return autocomplete_dict
 
-    def get_autocomplete_tags(self, cursor=None):
-        items = self.get_items(local_cursor=cursor)
+    def get_autocomplete_tags(self, local_cursor=None):
+        """
+        Maps manual tags of regular items to the keys of the tagged items.
+        Items without tags are listed under 'none'.
+
+        Arguments:
+            local_cursor: Cursor instance to local database, if None use the
+            zotero API
+
+        Returns:
+            dict {tag: [key, ...]}
+        """
+        if local_cursor is None and self.cursor is None:
+            items = self.iter_items()
+            tags_dict = defaultdict(list)
+            for i in items:
+                for t in i.get('tags', ['none']):
+                    if t == 'none':
+                        tags_dict['none'].append(i['key'])
+                    elif t.get('type', 0) == 0:
+                        tags_dict[t['tag']].append(i['key'])
+            return dict(tags_dict)
 
-        tags_dict = defaultdict(list)
-        for i in items:
-            for t in i.get('tags', ['none']):
-                if t == 'none':
-                    tags_dict['none'].append(i['key'])
-                elif t['type'] == 0:
-                    tags_dict[t['tag']].append(i['key'])
+        sql = """SELECT
+            IFNULL(t.name, 'none'),
+            i.key
+        FROM items i
+        LEFT JOIN itemTypes it ON i.itemTypeID = it.itemTypeID
+        LEFT JOIN itemTags itg ON i.itemID = itg.itemID AND itg.type = 0
+        LEFT JOIN tags t ON itg.tagID = t.tagID
+        WHERE it.typeName NOT IN ('note', 'attachment')
+        ORDER BY i.itemID;"""
+
+        cursor = self.stream_cursor(local_cursor)
+        try:
+            cursor.execute(sql)
+            tags_dict = defaultdict(list)
+            for tag, key in cursor:
+                tags_dict[tag].append(key)
+        finally:
+            if cursor is not local_cursor:
+                cursor.close()
         return dict(tags_dict)
 
+    def get_identifiers(self, local_cursor=None):
+        """
+        Reads the fields identifying regular items outside of zotero, i.e. DOI,
+        ISBN and extra, which may contain a DOI, see utils.get_doi.
+
+        Arguments:
+            local_cursor: Cursor instance to local database, if None use the
+            zotero API
+
+        Returns:
+            dict {key: {field: value}} of items with any of the fields
+        """
+        fields = ('DOI', 'ISBN', 'extra')
+        if local_cursor is None and self.cursor is None:
+            identifiers = dict()
+            for i in self.iter_items():
+                values = {f: i[f] for f in fields if i.get(f)}
+                if len(values) > 0:
+                    identifiers[i['key']] = values
+            return identifiers
+
+        sql = """SELECT
+            i.key,
+            f.fieldName,
+            idv.value
+        FROM items i
+        JOIN itemData id ON i.itemID = id.itemID
+        JOIN fields f ON id.fieldID = f.fieldID
+        JOIN itemDataValues idv ON id.valueID = idv.valueID
+        LEFT JOIN itemTypes it ON i.itemTypeID = it.itemTypeID
+        WHERE it.typeName NOT IN ('note', 'attachment')
+        AND f.fieldName IN (?, ?, ?);"""
+
+        cursor = self.stream_cursor(local_cursor)
+        try:
+            cursor.execute(sql, fields)
+            identifiers = defaultdict(dict)
+            for key, field, value in self.iter_rows(cursor):
+                identifiers[key][field] = value
+        finally:
+            if cursor is not local_cursor:
+                cursor.close()
+        return dict(identifiers)
+
+    def get_children(self, parent_keys=[], local_cursor=None):
+        """
+        Maps regular items to their notes and attachments.
+
+        Arguments:
+            parent_keys: keys of the regular items, all if empty
+            local_cursor: Cursor instance to local database, if None use the
+            zotero API
+
+        Returns:
+            dict {parent key: [(child key, content type), ...]}, the content
+            type of notes is 'note'
+        """
+        if local_cursor is None and self.cursor is None:
+            children = defaultdict(list)
+            for c in self.iter_notes(parent_keys=parent_keys):
+                children[c.get('parentItem')].append((c['key'], 'note'))
+            for c in self.iter_attachments(parent_keys=parent_keys):
+                children[c.get('parentItem')].append((c['key'], c.get('contentType', '')))
+            children.pop(None, None)
+            return dict(children)
+
+        sql = """SELECT
+            p.key,
+            i.key,
+            'note'
+        FROM itemNotes n
+        JOIN items i ON n.itemID = i.itemID
+        JOIN items p ON n.parentItemID = p.itemID
+        UNION ALL
+        SELECT
+            p.key,
+            i.key,
+            IFNULL(a.contentType, '')
+        FROM itemAttachments a
+        JOIN items i ON a.itemID = i.itemID
+        JOIN items p ON a.parentItemID = p.itemID;"""
+        parent_filter = "\n        WHERE p.key IN (SELECT key FROM temp.filter_keys WHERE slot = 'parent_keys')"
+        if len(parent_keys) > 0:
+            sql = sql.replace("p.itemID\n", "p.itemID" + parent_filter + "\n")
+            sql = sql[:-1] + parent_filter + ";"
+
+        cursor = self.stream_cursor(local_cursor)
+        try:
+            if len(parent_keys) > 0:
+                self.load_filter_keys(cursor, 'parent_keys', list(parent_keys))
+            cursor.execute(sql)
+            children = defaultdict(list)
+            for parent, key, content_type in self.iter_rows(cursor):
+                children[parent].append((key, content_type))
+        finally:
+            if cursor is not local_cursor:
+                cursor.close()
+        return dict(children)
+
+    def get_collection_index(self, local_cursor=None):
+        """
+        Builds the index of collections and their regular items, see
+        CollectionIndex.
+
+        Arguments:
+            local_cursor: Cursor instance to local database, if None use the
+            zotero API
+
+        Returns:
+            CollectionIndex instance
+        """
+        if local_cursor is None and self.cursor is None:
+            collections = [(c['data']['key'], c['data']['name'], c['data'].get('parentCollection') or None)
+                           for c in self.zot.everything(self.zot.collections())]
+            memberships = [(c, i['key']) for i in self.iter_items() for c in i.get('collections', [])]
+            return CollectionIndex(collections, memberships)
+
+        sql_collections = """SELECT
+            c.key,
+            c.collectionName,
+            p.key
+        FROM collections c
+        LEFT JOIN collections p ON c.parentCollectionID = p.collectionID;"""
+
+        sql_items = """SELECT
+            c.key,
+            i.key
+        FROM collectionItems ci
+        JOIN collections c ON ci.collectionID = c.collectionID
+        JOIN items i ON ci.itemID = i.itemID
+        LEFT JOIN itemTypes it ON i.itemTypeID = it.itemTypeID
+        WHERE it.typeName NOT IN ('note', 'attachment');"""
+
+        cursor = self.stream_cursor(local_cursor)
+        try:
+            cursor.execute(sql_collections)
+            collections = cursor.fetchall()
+            cursor.execute(sql_items)
+            memberships = list(self.iter_rows(cursor))
+        finally:
+            if cursor is not local_cursor:
+                cursor.close()
+        return CollectionIndex(collections, memberships)
+
     def create_attachment(self, file_name, parent_key=None, local_cursor=None):
         """
         Creates an attachment item for a corresponding parent key in the zotero
@@ -711,19 +1518,54 @@ class ZoteroDatabase():
         if local_cursor is not None:
             warnings.warn("Not implemented. Modifying local db is dangerous")
         else:
-            attachment = self.zot.item_template('attachment', 'linked_file')
+            created = self.create_attachments([(file_name, parent_key)])[parent_key]
+            if len(created['success']) > 0:
+                return created['success'][0]
+            else:
+                warnings.warn("Attachment creation failed: {}".format(created['failed']))
+                return None
+
+    def create_attachments(self, files, batch_size=50):
+        """
+        Creates linked pdf attachments in bulk. The item template is fetched
+        once and attachments are validated against it locally, then created
+        with one request per batch_size attachments.
+
+        Arguments:
+            files: list of (file name incl. pdf extension, parent key) pairs,
+            parent key may be None
+            batch_size: attachments per request, the zotero API allows 50
+
+        Returns:
+            dict {parent_key: {'success': [created keys], 'failed': [messages]}}
+        """
+        files = list(files)
+        template = self.zot.item_template('attachment', 'linked_file')
+        allowed = set(template) | {'parentItem'}
+
+        attachments = list()
+        for file_name, parent_key in files:
+            attachment = copy.deepcopy(template)
             attachment['title'] = file_name
             attachment['path'] = 'attachments:' + file_name
             attachment['contentType'] = 'application/pdf'
-            self.zot.check_items([attachment])
-            response = self.zot.create_items([attachment], parentid=parent_key)
-            if '0' in response['success']:
-                created_key = response['success']['0']
-                return created_key
-            else:
-                warnings.warn("Attachment creation failed.")
-                print(response['failed'])
-                return None
+            if parent_key is not None:
+                attachment['parentItem'] = parent_key
+            invalid = set(attachment) - allowed
+            if invalid:
+                raise ValueError("Invalid attachment fields: {}".format(invalid))
+            attachments.append(attachment)
+
+        created = {parent_key: {'success': [], 'failed': []} for _, parent_key in files}
+        for n in range(0, len(attachments), batch_size):
+            batch = attachments[n:n + batch_size]
+            parents = [parent_key for _, parent_key in files[n:n + batch_size]]
+            response = self.zot.create_items(batch)
+            for i, key in response.get('success', {}).items():
+                created[parents[int(i)]]['success'].append(key)
+            for i, failure in response.get('failed', {}).items():
+                created[parents[int(i)]]['failed'].append(failure.get('message', failure))
+        return created
 
     def update_items(self, items):
         """
@@ -741,21 +1583,36 @@ class ZoteroDatabase():
         self.zot.check_items(items)
         return self.zot.update_items(items)
 
-    def batch_update_items(self, items, batch_size=50):
+    def batch_update_items(self, items, batch_size=50, max_pending=4, journal=None, bases=None):
         """
-        Update item data in the zotero cloud in batches.
+        Update item data in the zotero cloud in concurrent batches, see
+        WriteQueue.
 
         Arguments:
             items: list of item data dictionaries. dictionaries must have form
             of zotero API. each dictionary must have a 'version' key with the
-            latest version of the item in the zotero cloud, otherwise item will
-            not be updated.
+            latest version of the item in the zotero cloud. items modified in
+            the meantime are updated again with their latest version.
             batch_size: default=50
+            max_pending: maximum number of requests in flight
+            journal: Journal instance to record the updates in, optional
+            bases: dict {key: item data the update was computed from}, to
+            drop updates of fields changed meanwhile, see WriteQueue.put
 
         Returns:
-            True if successful
+            WriteQueue with the written, failed and rejected updates, see
+            WriteQueue.report
+        """
+        bases = bases or {}
+        with self.write_queue(batch_size=batch_size, max_pending=max_pending,
+                              journal=journal) as queue:
+            for i in items:
+                queue.put(i, base=bases.get(i['key']))
+        return queue
+
+    def write_queue(self, **kwargs):
+        """
+        Returns:
+            new WriteQueue for item updates, see WriteQueue for arguments
         """
-        batches, rem = divmod(len(items), batch_size)
-        for n in range(batches+1):
-            # accessing lists beyond last index seems to be ok
-            self.update_items(items[n*batch_size:(n+1)*batch_size])
+        return WriteQueue(self.connect_api, **kwargs)
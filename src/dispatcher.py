@@ -5,13 +5,20 @@ Dispatches incoming commands
 import os
 import sys
 import warnings
-import shutil
 import datetime
-import requests
-from prompt_toolkit.completion import NestedCompleter, WordCompleter, merge_completers
-from lisc.requester import Requester
-from lisc.urls.open_citations import OpenCitations
+import time
+import threading
+from prompt_toolkit.completion import NestedCompleter, DynamicCompleter, merge_completers
 from src.db import ZoteroDatabase
+from src.collection import CollectionIndex
+from src.journal import Journal
+from src.search import SearchIndex
+from src.citations import CitationCache, normalize_doi, DEFAULT_TTL, DEFAULT_BATCH_SIZE
+from src.fetcher import RelationFetcher, DEFAULT_RATE, DEFAULT_CONCURRENCY
+from src.graph import CitationGraph
+from src.trigram import TrigramIndex
+from src.completer import PaperCompleter
+from src.snapshot import Snapshot
 from src.scihub import SciHub
 import src.utils as utils
 import unicodedata
@@ -19,35 +26,229 @@ import concurrent.futures as cf
 import copy
 import json
 
+
+# indices the prompt does not need, restored from a snapshot on first use
+DEFERRED_SECTIONS = ('papers_reverse', 'identifiers', 'dois', 'children')
+
+
+def deferred(name):
+    """
+    Returns:
+        property of a Dispatcher index restored from the snapshot on first
+        access, see Dispatcher.load_section
+    """
+    return property(lambda self: self.load_section(name),
+                    lambda self, value: self.sections.__setitem__(name, value))
+
+
 class Dispatcher():
 
-    def __init__(self, session, local=True):
+    papers_reverse = deferred('papers_reverse')
+    identifiers = deferred('identifiers')
+    dois = deferred('dois')
+    children = deferred('children')
+
+    def __init__(self, session, local=True, background=False):
+        """
+        Arguments:
+            session: PromptSession instance of the CLI
+            local: if True, read from the local zotero database, otherwise
+            use the zotero API
+            background: if True, build autocompletes and indices in a worker
+            thread instead of before returning, see warm_up. Indices of an
+            unchanged library are loaded from a snapshot instead
+        """
         self.exit_cmds = ['exit', 'q', 'quit']
         self.paper_dir = os.environ['PAPER_PATH']
+        self.sections = dict()
+        self.snapshot = None
+        self.snapshot_lock = threading.RLock()
 
         self.session = session
-        self.db = ZoteroDatabase(local=local)
+        cache_path = os.environ.get('PAPIERMACHE_CACHE_PATH',
+                                    './data/cache.sqlite' if local else './data/mirror.sqlite')
+        self.db = ZoteroDatabase(local=local, cache_path=cache_path,
+                                 profile=bool(os.environ.get('PAPIERMACHE_PROFILE')))
+        self.journal = Journal(os.environ.get('PAPIERMACHE_JOURNAL_PATH', './data/journal.jsonl'))
+        pending = len(self.journal.pending())
+        if pending > 0:
+            print('{} updates of an interrupted run are pending, submit them with `resume`'.format(pending))
         self.scihub = None
+        self.search_index = None
+        self.citation_cache = None
+        self.citation_graph = None
+        self.paper_index = None
+        self.papers_indexed = None
+        self.identifiers = dict()
+        self.selected_keys = None
 
+        # commands only, until the autocompletes are built
         self.completions = None
-        self.papers = self.db.get_autocompletes()
-        self.papers_reverse = {v: k for k, v in self.papers.items()}
-        self.tags = self.db.get_autocomplete_tags()
-        self.completer = self.build_completer()
-        self.selected_keys = None
+        self.papers = dict()
+        self.papers_reverse = dict()
+        self.tags = dict()
+        self.collections = CollectionIndex([], [])
+        self.index_completer = self.build_completer()
+        self.completer = DynamicCompleter(lambda: self.index_completer)
+
+        self.dois = dict()
+        self.children = dict()
+
+        self.ready = threading.Event()
+        self.warm_up_time = None
+        self.warm_up_future = None
+        # indices of an unchanged library are restored from the last session
+        self.snapshot_path = os.environ.get('PAPIERMACHE_SNAPSHOT_PATH', './data/snapshot.bin')
+        state = self.db.library_state()
+        snapshot = Snapshot.load(self.snapshot_path, state)
+        if snapshot is not None:
+            task, arg = self.load_snapshot, snapshot
+        else:
+            task, arg = self.warm_up, state
+        if background:
+            self.warm_up_pool = cf.ThreadPoolExecutor(max_workers=1)
+            self.warm_up_future = self.warm_up_pool.submit(task, arg)
+            self.warm_up_pool.shutdown(wait=False)
+        else:
+            task(arg)
 
-    def build_completer(self):
+    def warm_up(self, state=None):
         """
-        Generates autocompletes for publications for various commands.
+        Builds autocompletes of papers and tags, the collection index, and the
+        DOI and children maps, then swaps the completer of the prompt for one
+        completing papers, tags and collections. Sets ready when done.
+
+        Arguments:
+            state: state of the library before the build, if given, the
+            indices are persisted for the next session, see Snapshot
+        """
+        start = time.perf_counter()
+        getters = [self.db.get_autocompletes, self.db.get_autocomplete_tags,
+                   self.db.get_collection_index, self.db.get_identifiers,
+                   self.db.get_children]
+        if self.db.pool is not None:
+            # independent read-only connections, build all concurrently
+            with cf.ThreadPoolExecutor(max_workers=len(getters)) as pool:
+                futures = [pool.submit(self.db.pooled, getter) for getter in getters]
+                papers, tags, collections, identifiers, children = [f.result() for f in futures]
+        else:
+            papers, tags, collections, identifiers, children = [getter() for getter in getters]
+
+        self.identifiers = {k: (utils.get_doi(identifiers.get(k, {})), identifiers.get(k, {}).get('ISBN'))
+                            for k in papers}
+        self.dois = {doi: k for k, (doi, _) in self.identifiers.items() if doi}
+        self.children = children
+        self.papers_reverse = {v: k for k, v in papers.items()}
+        self.papers, self.tags, self.collections = papers, tags, collections
+        self.paper_completer = PaperCompleter(papers.values())
+        self.index_completer = self.build_completer(self.paper_completer)
+        self.warm_up_time = time.perf_counter() - start
+        self.ready.set()
+
+        if state is not None:
+            if self.db.cursor is None:
+                # the build synced the mirror, see RemoteSync
+                state = self.db.library_state()
+            self.save_snapshot(state)
+
+    def save_snapshot(self, state):
+        """
+        Persists the indices built by warm_up, see Snapshot.
+        """
+        sections = {
+            'papers': self.papers,
+            'papers_reverse': self.papers_reverse,
+            'tags': self.tags,
+            'collections': self.collections.state(),
+            'identifiers': self.identifiers,
+            'dois': self.dois,
+            'children': self.children,
+            'completer': self.paper_completer.state(),
+            }
+        try:
+            Snapshot.write(self.snapshot_path, state, sections)
+        except (OSError, ValueError) as e:
+            warnings.warn('snapshot not saved: {}'.format(e))
+
+    def load_snapshot(self, snapshot):
+        """
+        Restores the indices of warm_up from a snapshot of an unchanged
+        library. Only the indices of the autocompletes are read now, the
+        others on first use, see DEFERRED_SECTIONS. Corrupt snapshots are
+        deleted and the indices built again.
+        """
+        start = time.perf_counter()
+        try:
+            papers = snapshot['papers']
+            tags = snapshot['tags']
+            collections = CollectionIndex.from_state(snapshot['collections'])
+            paper_completer = PaperCompleter.from_state(snapshot['completer'])
+        except (KeyError, TypeError, ValueError) as e:
+            return self.rebuild(snapshot, e)
+        with self.snapshot_lock:
+            self.snapshot = snapshot
+            for name in DEFERRED_SECTIONS:
+                self.sections.pop(name, None)
+        self.papers, self.tags, self.collections = papers, tags, collections
+        self.paper_completer = paper_completer
+        self.index_completer = self.build_completer(self.paper_completer)
+        self.warm_up_time = time.perf_counter() - start
+        self.ready.set()
+
+    def load_section(self, name):
+        """
+        Returns an index of DEFERRED_SECTIONS, read from the snapshot on first
+        access, see load_snapshot. The snapshot is closed once all are read.
+        """
+        with self.snapshot_lock:
+            if name not in self.sections:
+                try:
+                    self.sections[name] = self.snapshot[name]
+                except (KeyError, TypeError, ValueError) as e:
+                    self.rebuild(self.snapshot, e)
+                    return self.sections[name]
+                if self.snapshot is not None and all(n in self.sections for n in DEFERRED_SECTIONS):
+                    self.snapshot.close()
+                    self.snapshot = None
+            return self.sections[name]
+
+    def rebuild(self, snapshot, error):
+        """
+        Deletes a corrupt snapshot and builds the indices again, see warm_up.
+        """
+        warnings.warn('snapshot discarded, rebuilding: {}'.format(error))
+        with self.snapshot_lock:
+            snapshot.discard()
+            self.snapshot = None
+            self.warm_up(snapshot.state)
+
+    def wait_ready(self):
+        """
+        Blocks until the autocompletes are built, see warm_up. Errors of a
+        warm-up in the background are raised here.
+        """
+        if self.warm_up_future is not None:
+            if not self.ready.is_set():
+                print('Loading library...')
+            self.warm_up_future.result()
+
+    def build_completer(self, paper_completions=None):
         """
+        Generates autocompletes for publications for various commands.
 
-        paper_completions = WordCompleter(self.papers.values())
-        tag_completions = WordCompleter(self.tags.keys())
+        Arguments:
+            paper_completions: completer of papers, built from self.papers if
+            not given
+        """
+        if paper_completions is None:
+            paper_completions = PaperCompleter(self.papers.values())
+        tag_completions = PaperCompleter(self.tags.keys())
+        collection_completions = PaperCompleter(self.collections.get_names())
 
         selections = {
             'all': None,
             'none': None,
-            'collection': None,
+            'collection': collection_completions,
             'tags': tag_completions,
             }
 
@@ -55,12 +256,16 @@ class Dispatcher():
                                                         paper_completions])
 
         self.completions = {
-            'find': None,
+            'find': {'--select': None},
             'select': paper_selection_completions,
+            'suggest': paper_selection_completions,
             'backup': None,
+            'resume': None,
+            'stats': {'db': None},
             'add': {
                 'pdf': paper_selection_completions,
-                'relations': paper_selection_completions,
+                'relations': merge_completers([NestedCompleter.from_nested_dict({'--offline': None}),
+                                               paper_selection_completions]),
                 'link': paper_completions,
                 },
             'fix': {
@@ -88,7 +293,17 @@ class Dispatcher():
         """
         Cleanup for proper shutdown of program
         """
+        if self.warm_up_future is not None:
+            # the warm-up reads through the connections about to be closed
+            cf.wait([self.warm_up_future])
+        if self.snapshot is not None:
+            self.snapshot.close()
         self.db.close_connection()
+        self.journal.close()
+        if self.search_index is not None:
+            self.search_index.close()
+        if self.citation_cache is not None:
+            self.citation_cache.close()
         print(msg)
         return sys.exit(0)
 
@@ -126,6 +341,8 @@ class Dispatcher():
         """
         cmd = input.split()
         if len(cmd) > 0:
+            if cmd[0] not in self.exit_cmds:
+                self.wait_ready()
             self.dispatch(cmd)
         # if self.verify_command(cmd) is True:
         #     self.dispatch(cmd)
@@ -153,17 +370,63 @@ class Dispatcher():
             execute_cmd = cmd_list.pop(0)
             if execute_cmd == 'names':
                 self.execute_fix_names(cmd_list)
+        elif execute_cmd == 'suggest':
+            self.execute_suggest(cmd_list)
         elif execute_cmd == 'backup':
             self.execute_backup(cmd_list)
+        elif execute_cmd == 'resume':
+            self.execute_resume(cmd_list)
+        elif execute_cmd == 'stats':
+            execute_cmd = cmd_list.pop(0)
+            if execute_cmd == 'db':
+                self.execute_stats_db(cmd_list)
 
     def execute_find(self, cmd_list):
         """
-        Find free-form input in database metadata. Return corresponding entries.
-        Only key search implemented yet.
+        Find free-form input in titles, abstracts, publication titles, creators,
+        tags and notes, see SearchIndex. Prints the best matches, which are
+        selected for further operations with --select.
+        """
+        select = '--select' in cmd_list
+        query = ' '.join(c for c in cmd_list if c != '--select')
+        if query in self.papers:
+            keys = [query]
+        else:
+            keys = [key for key, _ in self.search(query)]
+
+        if len(keys) == 0:
+            print('No matches.')
+        for key in keys:
+            print(key, self.papers.get(key))
+        if select:
+            self.selected_keys = keys or None
+            print('Selected:', self.selected_keys)
+
+    def search(self, query, limit=20):
+        """
+        Searches the full-text index, which is built on first use and updated
+        with items modified or erased since then, if the library changed.
+
+        Arguments:
+            query: words or FTS5 query, see SearchIndex.build_query
+            limit: maximum number of results
+
+        Returns:
+            list of (key, score) tuples, best match first. Queries of invalid
+            FTS5 syntax are searched for as plain words
         """
-        warnings.warn("Only key search implemented!")
-        key = cmd_list.pop(0)
-        print(self.papers.get(key))
+        if self.search_index is None:
+            self.search_index = SearchIndex(os.environ.get('PAPIERMACHE_SEARCH_PATH', './data/search.sqlite'))
+        self.search_index.refresh(self.db)
+        try:
+            return self.search_index.search(query, limit)
+        except ValueError as e:
+            print('{}, searching for the words instead.'.format(str(e).capitalize()))
+        try:
+            return self.search_index.search(query, limit, literal=True)
+        except ValueError as e:
+            print('Search failed: {}'.format(e))
+            return []
 
     def execute_select(self, cmd_list):
         """
@@ -177,12 +440,87 @@ class Dispatcher():
         Search the DOI API to retrieve citation relations between publications.
         Update relations between existing publications in the database.
         If no arguments given, use publications selected by execute_select.
+
+        Only DOIs whose citations are not cached or expired are requested.
+        Links are derived from the citation graph of all cached citations, see
+        CitationGraph, plus the citations fetched now. Updates of a batch are
+        queued as soon as it is fetched, while later batches are still being
+        fetched. With --offline, no requests are sent.
         """
+        offline = '--offline' in cmd_list
+        cmd_list = [c for c in cmd_list if c != '--offline']
 
-        def submit_items(items_update):
-            print('Submitting', [i['key'] for i in items_update])
-            if self.db.update_items(items_update):
-                print('Update successful')
+        if len(cmd_list) == 0:
+            selected_keys = self.selected_keys
+        else:
+            selected_keys = self.select_keys(cmd_list)
+
+        if selected_keys is None:
+            print("No keys selected.")
+            return None
+
+        dois_reversed = {normalize_doi(doi): k for doi, k in self.dois.items()}
+        keys = set(self.dois.values())
+
+        citations = self.get_citation_cache()
+        stale = []
+        if not (offline or citations.offline):
+            stale = citations.stale(self.identifiers[k][0] for k in selected_keys if k in keys)
+
+        graph = self.get_citation_graph()
+        items = (i for i in self.db.iter_items(keys=selected_keys) if i['key'] in keys)
+
+        def batches():
+            batch = []
+            for i in items:
+                batch.append(i)
+                if len(batch) == citations.batch_size:
+                    yield batch
+                    batch = []
+            if len(batch) > 0:
+                yield batch
+
+        # updates are written by the queue's workers, fetching relations
+        # continues meanwhile
+        with self.db.write_queue(journal=self.journal) as queue:
+            def put(batch, relations={}):
+                for i in batch:
+                    doi = normalize_doi(utils.get_doi(i))
+                    known = graph.relations(doi)
+                    fetched = relations.get(doi, {'citing': [], 'cited_by': []})
+                    merged = {k: list(dict.fromkeys(known[k] + fetched[k])) for k in known}
+                    update = self.get_item_relations(i, dois_reversed, merged)
+                    if update is not None:
+                        queue.put(update)
+
+            if len(stale) > 0:
+                print('Fetching citations of {} DOIs...'.format(len(stale)))
+                # fresh DOIs of a batch are answered by the cache
+                self.get_relation_fetcher().run(batches(), put, doi=utils.get_doi)
+            else:
+                for batch in batches():
+                    put(batch)
+        if not (offline or citations.offline):
+            print(citations.report())
+        print(queue.report())
+
+    def execute_suggest(self, cmd_list):
+        """
+        Suggests papers missing in the library which the selected papers cite
+        or are cited by most often, from the cached citations only, see
+        CitationGraph.suggest. The number of suggestions is set with -n,
+        default 20. If no papers given, use publications selected by
+        execute_select.
+        """
+        limit = 20
+        if '-n' in cmd_list:
+            n = cmd_list.index('-n')
+            try:
+                limit = int(cmd_list[n + 1])
+            except (IndexError, ValueError):
+                print('-n requires a number.')
+                return None
+            cmd_list = cmd_list[:n] + cmd_list[n + 2:]
 
         if len(cmd_list) == 0:
             selected_keys = self.selected_keys
@@ -193,26 +531,18 @@ class Dispatcher():
             print("No keys selected.")
             return None
 
-        all_items = self.db.get_items()
-        dois = {i['key']: utils.get_doi(i) for i in all_items if utils.get_doi(i)}
-        dois_reversed = {v: k for k, v in dois.items()}
-
-        items = [i for i in all_items if i['key'] in selected_keys
-                                      and i['key'] in dois]
-
-        items_update = list()
-        with cf.ThreadPoolExecutor() as pool:
-            futures = [pool.submit(self.get_item_relations,
-                                   copy.deepcopy(i), dois_reversed) for i in items]
-            for f in cf.as_completed(futures):
-                fres = f.result()
-                if fres is not None:
-                    items_update.append(fres)
-                if len(items_update) >= 50: # zotero api can only handle 50 item updates
-                    submit_items(items_update)
-                    items_update = list()
-            if len(items_update) > 0:
-                submit_items(items_update)
+        dois = [normalize_doi(self.identifiers[k][0]) for k in selected_keys
+                if k in self.identifiers and self.identifiers[k][0]]
+        library = [normalize_doi(doi) for doi in self.dois]
+        suggestions = self.get_citation_graph().suggest(dois, exclude=library, limit=limit)
+
+        if len(suggestions) == 0:
+            print('No suggestions, fetch citations of the selection with `add relations` first.')
+            return None
+        print('{:>8} {:>8} {:>8}  DOI'.format('cited by', 'cites', 'coupling'))
+        for s in suggestions:
+            print('{cited_by:>8} {citing:>8} {coupling:>8}  https://doi.org/{doi}'.format(**s))
+        return suggestions
 
     def execute_add_pdf(self, cmd_list):
         """
@@ -231,24 +561,25 @@ class Dispatcher():
 
         file_types = ['pdf', 'epub', 'djvu', 'mobi', 'okular']
 
-        items = self.db.get_items(keys=selected_keys)
-        attachments = self.db.get_attachments(parent_keys=selected_keys)
+        items = self.db.iter_items(keys=selected_keys)
+        attachments = self.db.iter_attachments(parent_keys=selected_keys)
 
-        attachment_keys = [a['parentItem'] for a in attachments
-                           if 'parentItem' in a and (a.get('path', '').split('.')[-1]).lower() in file_types]
+        attachment_keys = {a['parentItem'] for a in attachments
+                           if 'parentItem' in a and (a.get('path', '').split('.')[-1]).lower() in file_types}
 
         # no_attachments_dict = {i['key']: {'url': i.get('url'), 'DOI': utils.get_doi(i), 'ISBN': i.get('ISBN')}
         #                        for i in items if i['key'] not in attachment_keys}
 
         # no_att_items = [i for i in items if i['key'] not in attachment_keys]
 
+        downloaded = list()
         for item in items:
             key = item['key']
             if key not in attachment_keys:
                 file_name = self.build_file_name(item)
                 file_path = self.paper_dir + file_name
 
-                url = utils.get_doi(item) or item['url']
+                url = utils.get_doi(item) or item.get('url')
                 if url:
                     success = self.download_file(url, file_path)
                 else:
@@ -256,9 +587,16 @@ class Dispatcher():
                     warnings.warn("Download not successful")
 
                 if success:
-                    created_key = self.db.create_attachment(file_name, key)
-                    print('Created key', created_key)
-                    return created_key
+                    downloaded.append((file_name, key))
+
+        # attachments of all downloads are created together, 50 per request
+        created = self.db.create_attachments(downloaded) if downloaded else {}
+        for key, result in created.items():
+            if result['success']:
+                print('Created key', ', '.join(result['success']))
+            if result['failed']:
+                warnings.warn("Attachment creation failed for {}: {}".format(key, result['failed']))
+        return created
 
     def execute_add_link(self, cmd_list):
         """
@@ -282,7 +620,8 @@ class Dispatcher():
             print("No valid page number provided. Abort.")
             return
 
-        ref_key = self.select_keys(cmd_list, verbose=False)[0]
+        # two papers would be resolved to one of them by similarity
+        ref_key = self.select_keys(cmd_list, verbose=False, fuzzy=False)[0]
         if ref_key is not None:
             # if only one key given, other key must have been provided by select command
             if self.selected_keys is None or len(self.selected_keys) != 1:
@@ -302,16 +641,18 @@ class Dispatcher():
                 print("Cannot find key, abort.")
                 return
 
-        # use zotero API to retrieve children; TODO: use local db
-        children = self.db.zot.children(ref_key)
-        pdf_key = None
-        for c in children:
-            if c['data'].get('contentType', None) == 'application/pdf':
-                if pdf_key is None:
-                    pdf_key = c['key']
-                else:
-                    print("Multiple pdfs found. Abort.")
-                    return
+        # current children, not those known at startup. Attachments added
+        # through the zotero API, e.g. by `add pdf`, are missing in the local
+        # database until zotero synced them
+        pdf_keys = {k for k, content_type in self.db.get_children(parent_keys=[ref_key]).get(ref_key, [])
+                    if content_type == 'application/pdf'}
+        pdf_keys.update(c['key'] for c in self.db.zot.children(ref_key)
+                        if c['data'].get('contentType', None) == 'application/pdf')
+        pdf_keys = sorted(pdf_keys)
+        if len(pdf_keys) > 1:
+            print("Multiple pdfs found. Abort.")
+            return
+        pdf_key = pdf_keys[0] if len(pdf_keys) > 0 else None
         if pdf_key is None:
             print("No pdf found")
             return
@@ -341,10 +682,49 @@ class Dispatcher():
             print("No keys selected.")
             return None
 
+        bases = dict()
         items_update = self.fix_names(selected_keys, safe_mode=True,
-                                      blacklist_path='./data/blacklist.json')
+                                      blacklist_path='./data/blacklist.json', bases=bases)
 
-        self.db.batch_update_items(items_update)
+        queue = self.db.batch_update_items(items_update, journal=self.journal, bases=bases)
+        print(queue.report())
+
+    def execute_resume(self, cmd_list):
+        """
+        Submits item updates of interrupted runs (e.g. `fix names`, `add
+        relations`), which were recorded in the journal but not confirmed by
+        zotero.
+        """
+        pending = self.journal.pending()
+        if len(pending) == 0:
+            print("Nothing to resume.")
+            return
+
+        print('Resuming {} pending updates'.format(len(pending)))
+        bases = self.journal.bases()
+        with self.db.write_queue(journal=self.journal) as queue:
+            for seq, update in pending.items():
+                queue.put(update, seqs=[seq], base=bases.get(seq))
+        print(queue.report())
+        self.journal.compact()
+
+    def execute_stats_db(self, cmd_list):
+        """
+        Shows statistics of the statements run against the local database,
+        slowest first. Requires PAPIERMACHE_PROFILE=1.
+        Accepts arguments:
+            no argument: print report
+            file.json: write full report incl. query plans as JSON
+        """
+        if self.db.profiler is None:
+            print("Profiling disabled, restart with PAPIERMACHE_PROFILE=1")
+            return
+
+        if len(cmd_list) > 0:
+            self.db.profiler.dump(cmd_list[0])
+            print("Report written to", cmd_list[0])
+        else:
+            print(self.db.profiler.format())
 
     def execute_backup(self, cmd_list):
         """
@@ -359,8 +739,6 @@ class Dispatcher():
         """
         cmd = ' '.join(cmd_list)
 
-        self.db.close_connection()
-
         db_path = os.environ['ZOTERO_DB_PATH']
         db_dir = os.path.dirname(db_path)
 
@@ -386,8 +764,7 @@ class Dispatcher():
         if backup_path == db_path:
             raise NameError("File and backup path identical.")
 
-        shutil.copy2(db_path, backup_path)
-        self.db.cursor = self.db.connect()
+        self.db.backup(backup_path)
 
         return True
 
@@ -411,9 +788,11 @@ class Dispatcher():
             else:
                 return False
 
-    def select_keys(self, cmd_list, verbose=True):
+    def select_keys(self, cmd_list, verbose=True, fuzzy=True):
         """
         Select one or multiple keys of database entries for further operations.
+        Papers not matching an autocomplete exactly are looked up by
+        similarity, unless fuzzy is False, see lookup_paper.
         """
         # selected = ' '.join(cmd_list)
         selected = cmd_list[0]
@@ -423,16 +802,69 @@ class Dispatcher():
             selected_keys = self.papers.keys()
         elif selected == 'tags':
             selected = ' '.join(cmd_list[1:])
-            selected_keys = self.tags.get(selected)
-        elif selected == 'collections':
-            pass
+            if selected in self.tags:
+                selected_keys = self.tags.get(selected)
+            else:
+                # tag expression, e.g. 'a || b && -c', evaluated by the database
+                tags = [t for t in selected.split(' && ') if len(t) > 0]
+                selected_keys = (self.db.get_keys(tags=tags) or None) if len(tags) > 0 else None
+        elif selected == 'collection':
+            recursive = '--recursive' in cmd_list
+            selected = ' '.join(c for c in cmd_list[1:] if c != '--recursive')
+            if selected in self.collections:
+                selected_keys = self.collections.get_keys(selected, recursive=recursive) or None
+            else:
+                warnings.warn('unknown collection: {}'.format(selected))
+                selected_keys = None
         else:
             selected = ' '.join(cmd_list)
-            selected_keys = [self.papers_reverse.get(selected)]
+            key = self.papers_reverse.get(selected)
+            if key is None and fuzzy:
+                key = self.lookup_paper(selected)
+                if key is not None and verbose:
+                    print('Matched:', self.papers[key])
+            selected_keys = [key]
         if verbose:
             print('Selected:', selected_keys)
         return selected_keys
 
+    def lookup_paper(self, name, threshold=0.5):
+        """
+        Resolves a misspelled or partial paper name, DOI or ISBN to a key, see
+        TrigramIndex. The index is built on first use and updated
+        incrementally whenever self.papers is replaced.
+
+        Arguments:
+            name: text to look up
+            threshold: minimum share of trigrams of name found in the paper
+
+        Returns:
+            key of the most similar paper, None if there is none
+        """
+        if self.papers is not self.papers_indexed:
+            self.update_paper_index()
+        matches = self.paper_index.search(name, limit=1, threshold=threshold)
+        return matches[0][0] if len(matches) > 0 else None
+
+    def update_paper_index(self):
+        """
+        Indexes autocompletes, DOIs and ISBNs of papers added or changed since
+        the last update and removes papers no longer present.
+        """
+        papers = self.papers
+        if self.paper_index is None:
+            self.paper_index = TrigramIndex()
+        # identifiers of all papers are read by warm_up, only renamed or new
+        # papers are read again
+        changed = [k for k, name in papers.items()
+                   if k not in self.identifiers or self.paper_index.texts.get(k, (name,))[0] != name]
+        if len(changed) > 0:
+            for i in self.db.iter_items(changed):
+                self.identifiers[i['key']] = (utils.get_doi(i), i.get('ISBN'))
+        self.paper_index.update({k: (name,) + self.identifiers.get(k, ())
+                                 for k, name in papers.items()})
+        self.papers_indexed = papers
+
     def build_file_name(self, item_dict, file_type='pdf'):
         """
         Emulate file naming scheme of the zotfile extension for saved pdfs:
@@ -468,10 +900,45 @@ class Dispatcher():
         file_name = unicodedata.normalize('NFD', file_name).encode('ascii', 'ignore').decode('utf-8')
         return file_name
 
+    def get_citation_cache(self):
+        """
+        Returns:
+            CitationCache of OpenCitations responses, opened on first use
+        """
+        if self.citation_cache is None:
+            self.citation_cache = CitationCache(
+                os.environ.get('PAPIERMACHE_CITATIONS_PATH', './data/citations.sqlite'),
+                ttl=float(os.environ.get('PAPIERMACHE_CITATIONS_TTL', DEFAULT_TTL / 86400)) * 86400,
+                offline=bool(os.environ.get('PAPIERMACHE_OFFLINE')),
+                batch_size=int(os.environ.get('PAPIERMACHE_CITATIONS_BATCH', DEFAULT_BATCH_SIZE)))
+        return self.citation_cache
+
+    def get_citation_graph(self):
+        """
+        Returns:
+            CitationGraph of all cached citations, compacted again if the
+            cache changed since the last call
+        """
+        citations = self.get_citation_cache()
+        if self.citation_graph is None or self.citation_graph.version != citations.edges_version():
+            self.citation_graph = CitationGraph.build(
+                citations, os.environ.get('PAPIERMACHE_GRAPH_PATH', './data/graph.npz'))
+        return self.citation_graph
+
+    def get_relation_fetcher(self):
+        """
+        Returns:
+            RelationFetcher storing responses in the CitationCache
+        """
+        return RelationFetcher(
+            self.get_citation_cache(),
+            rate=float(os.environ.get('PAPIERMACHE_CITATIONS_RATE', DEFAULT_RATE)),
+            concurrency=int(os.environ.get('PAPIERMACHE_CITATIONS_CONCURRENCY', DEFAULT_CONCURRENCY)))
+
     def get_relations_by_doi(self, doi):
         """
         Obtains DOIs of citing articles and cited articles for a given DOI from
-        the DOI database API.
+        the DOI database API. Responses are cached, see CitationCache.
 
         Arguments
             doi: DOI str
@@ -481,26 +948,7 @@ class Dispatcher():
                 'citing': DOIs which are cited in this publication
                 'cited_by': DOIs of articles which cited this publication
         """
-        oc = OpenCitations()
-        req = Requester(wait_time=0.1, logging=None)
-        relations_dict = {}
-        for util in ['references', 'citations']:
-            oc.build_url(util=util)
-            url = oc.get_url(util=util, segments=[doi], settings={'format': 'json'})
-            response = req.request_url(url)
-            if response.status_code == 200:
-                try:
-                    result = response.json()
-                except requests.exceptions.JSONDecodeError:
-                    result = {}
-
-            if util == 'references':
-                relations_dict['citing'] = [r['cited'] for r in result]
-            else:
-                relations_dict['cited_by'] = [r['citing'] for r in result]
-        req.close()
-
-        return relations_dict
+        return self.get_relation_fetcher().relations([doi])[normalize_doi(doi)]
 
     def merge_item_relations(self, item, keys, verbose=True):
         """
@@ -534,13 +982,15 @@ class Dispatcher():
             if verbose:
                 print('No Relations found:\n', key, self.papers[key])
 
-    def get_item_relations(self, item, dois):
+    def get_item_relations(self, item, dois, doi_relations_dict=None):
         """
         Creates item dict for updating relations suited for parallelization.
 
         Arguments:
             item: item['data'] dict from zotero API
             dois: {doi: key} dict for all DOIs in library
+            doi_relations_dict: relations of the item's DOI if fetched
+            already, see get_relations_by_doi
 
         Returns:
             dict with keys ['key', 'version', 'relations']
@@ -548,7 +998,8 @@ class Dispatcher():
         key = item['key']
         doi = utils.get_doi(item)
         if doi:
-            doi_relations_dict = self.get_relations_by_doi(doi)
+            if doi_relations_dict is None:
+                doi_relations_dict = self.get_relations_by_doi(doi)
             relations = doi_relations_dict['citing'] + doi_relations_dict['cited_by']
             keys = [dois[doi] for doi in relations if doi in dois]
             # relations = ['http://zotero.org/users/' + self.db.user_id + '/items/'
@@ -662,7 +1113,7 @@ class Dispatcher():
             else:
                 return -1, None
 
-    def fix_names(self, keys=[], safe_mode=True, blacklist_path=None):
+    def fix_names(self, keys=[], safe_mode=True, blacklist_path=None, bases=None):
         """
         Fix names for selected keys
 
@@ -670,6 +1121,8 @@ class Dispatcher():
             keys: list of keys
             safe_mode: if True, skip ambivalent renamings. If blacklist_path not None, create blacklist
             blacklist_path: path to blacklist json
+            bases: dict the unmodified data of each modified item is stored in
+            by key, see WriteQueue.put
 
         """
         def create_abbr(name):
@@ -677,6 +1130,7 @@ class Dispatcher():
             if sum(c.isalpha() for c in name) > len(name_lst):
                 return tuple( n[0] + '.'  for n in name_lst )
 
+        blacklist = None
         if blacklist_path is not None:
             try:
                 with open(blacklist_path, 'r') as f:
@@ -684,11 +1138,10 @@ class Dispatcher():
             except (FileNotFoundError, json.JSONDecodeError):
                 blacklist = None
 
-        all_items = self.db.get_items()
         names = { ( c.get('firstName', ''), c.get('lastName', ''),
-                create_abbr(c.get('firstName', '')) ) for i in all_items for c in i.get('creators', []) }
+                create_abbr(c.get('firstName', '')) ) for i in self.db.iter_items() for c in i.get('creators', []) }
 
-        items = self.db.get_items(keys)
+        items = self.db.iter_items(keys)
 
         items_mod = list()
         names_skipped = list()
@@ -705,6 +1158,8 @@ class Dispatcher():
             if mod > 0:
                 item_mod = {'key': i['key'], 'version': i['version'], 'creators': creators_mod}
                 items_mod.append(item_mod)
+                if bases is not None:
+                    bases[i['key']] = i
 
         if blacklist_path is not None and safe_mode:
             skipped = [dict(t) for t in {tuple(sorted(d.items())) for d in names_skipped}]
@@ -0,0 +1,263 @@
+"""
+Concurrent fetching of citation relations with asyncio
+"""
+
+import time
+import random
+import asyncio
+import warnings
+import concurrent.futures as cf
+import aiohttp
+from src.citations import ENDPOINTS, BATCH_SEPARATOR, normalize_doi
+
+
+# requests per second OpenCitations is asked at most
+DEFAULT_RATE = 10
+
+# requests in flight at most
+DEFAULT_CONCURRENCY = 8
+
+# retries of a request answered with a status in RETRY_STATUSES or failing
+DEFAULT_RETRIES = 4
+
+# statuses of overloaded or failing servers, worth retrying
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# base and maximum of the exponential backoff between retries, in seconds
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30
+
+
+class TokenBucket():
+    """
+    Rate limiter shared by all requests of an event loop. Tokens are added
+    at rate per second up to capacity, each request takes one, waiting for it
+    if the bucket is empty.
+    """
+
+    def __init__(self, rate, capacity=1):
+        """
+        Arguments:
+            rate: tokens added per second
+            capacity: maximum number of tokens, i.e. of requests in a burst
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        """
+        Takes a token, waiting until one is available.
+        """
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class RelationFetcher():
+    """
+    Fetches citation relations of many DOIs from OpenCitations through one
+    aiohttp session, reusing its keep-alive connections. All requests share a
+    TokenBucket, so the request rate stays below rate however many batches
+    are processed, and at most concurrency requests are in flight.
+
+    DOIs not answered by the CitationCache are requested in batches, see
+    CitationCache.store_batch. A failed batch falls back to one request per
+    DOI. Requests answered with 429 or 5xx are retried with exponential
+    backoff and full jitter, honouring Retry-After.
+
+    Blocking calls, i.e. reading the batches and the CitationCache, run on
+    worker threads, so they do not stall requests in flight.
+    """
+
+    def __init__(self, cache, rate=DEFAULT_RATE, concurrency=DEFAULT_CONCURRENCY, retries=DEFAULT_RETRIES):
+        """
+        Arguments:
+            cache: CitationCache the responses are stored in
+            rate: maximum requests per second
+            concurrency: maximum requests in flight
+            retries: retries per request
+        """
+        self.cache = cache
+        self.rate = rate
+        self.concurrency = concurrency
+        self.retries = retries
+        self.bucket = None
+        self.semaphore = None
+
+    def backoff(self, attempt, retry_after=None):
+        """
+        Returns:
+            seconds to wait before retry number attempt + 1
+        """
+        delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+        try:
+            return max(delay, float(retry_after))
+        except (TypeError, ValueError):
+            return delay
+
+    async def request(self, session, endpoint, doi, headers={}):
+        """
+        Requests a response from OpenCitations, retrying on failure.
+
+        Arguments:
+            session: aiohttp.ClientSession
+            endpoint: 'references' or 'citations'
+            doi: DOI str, or several DOIs joined by BATCH_SEPARATOR
+            headers: request headers
+
+        Returns:
+            status, body and headers of the response, status None if all
+            attempts failed
+        """
+        url = self.cache.url(endpoint, doi)
+        for attempt in range(self.retries + 1):
+            retry_after = None
+            await self.bucket.acquire()
+            self.cache.count('requests')
+            try:
+                async with self.semaphore, session.get(url, headers=headers) as response:
+                    if response.status not in RETRY_STATUSES or attempt == self.retries:
+                        return response.status, await response.text(), response.headers
+                    retry_after = response.headers.get('Retry-After')
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt == self.retries:
+                    warnings.warn('OpenCitations request failed for {}: {}'.format(doi, e))
+                    return None, None, {}
+            await asyncio.sleep(self.backoff(attempt, retry_after))
+
+    async def call(self, func, *args):
+        """
+        Runs a blocking function, e.g. of the CitationCache, on a worker
+        thread.
+        """
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    async def fetch(self, session, endpoint, doi):
+        """
+        Looks up the records of a single DOI, from the cache if fresh,
+        otherwise with a conditional request.
+
+        Returns:
+            list of records
+        """
+        records, cached = await self.call(self.cache.lookup, endpoint, doi)
+        if records is not None:
+            return records
+        status, text, headers = await self.request(session, endpoint, doi, self.cache.conditional_headers(cached))
+        return await self.call(self.cache.store, endpoint, doi, cached, status, text, headers)
+
+    def lookup_batch(self, endpoint, dois):
+        """
+        Returns:
+            dict {normalized DOI: list of records} of the DOIs answered by the
+            cache, list of the other normalized DOIs
+        """
+        batch = dict()
+        missing = []
+        for d in dict.fromkeys(normalize_doi(d) for d in dois):
+            records, _ = self.cache.lookup(endpoint, d)
+            if records is None:
+                missing.append(d)
+            else:
+                batch[d] = records
+        return batch, missing
+
+    async def fetch_batch(self, session, endpoint, dois):
+        """
+        Looks up the records of several DOIs, requesting those not answered
+        by the cache in one request.
+
+        Returns:
+            dict {normalized DOI: list of records}
+        """
+        batch, missing = await self.call(self.lookup_batch, endpoint, dois)
+        if len(missing) == 1:
+            batch[missing[0]] = await self.fetch(session, endpoint, missing[0])
+        elif len(missing) > 1:
+            status, text, _ = await self.request(session, endpoint, BATCH_SEPARATOR.join(missing))
+            fetched = await self.call(self.cache.store_batch, endpoint, missing, status, text)
+            if fetched is None:
+                records = await asyncio.gather(*[self.fetch(session, endpoint, d) for d in missing])
+                fetched = dict(zip(missing, records))
+            batch.update(fetched)
+        return batch
+
+    async def get_relations(self, session, dois):
+        """
+        Returns:
+            dict {normalized DOI: relations}, see CitationCache.relations
+        """
+        dois = list(dict.fromkeys(normalize_doi(d) for d in dois))
+        batches = await asyncio.gather(*[self.fetch_batch(session, endpoint, dois) for endpoint in ENDPOINTS])
+        records = dict(zip(ENDPOINTS, batches))
+        return {d: self.cache.relations({e: records[e][d] for e in ENDPOINTS}) for d in dois}
+
+    async def process(self, batches, callback, doi=normalize_doi):
+        """
+        Fetches the relations of batches of DOIs concurrently and passes each
+        batch with its relations to callback, which runs in a worker thread,
+        so it may block, e.g. on a WriteQueue.
+
+        Arguments:
+            batches: iterable of lists of DOI strs or objects with a DOI, e.g.
+            items, consumed lazily on a worker thread, so it may block, e.g.
+            on reading a database
+            callback: function called with a batch and its relations, see
+            get_relations
+            doi: function returning the DOI of an element of a batch
+        """
+        # created here, they belong to the running event loop
+        self.bucket = TokenBucket(self.rate)
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        loop = asyncio.get_running_loop()
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        timeout = aiohttp.ClientTimeout(total=30)
+
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout, raise_for_status=False) as session:
+            async def handle(batch):
+                relations = await self.get_relations(session, [doi(b) for b in batch])
+                await loop.run_in_executor(None, callback, batch, relations)
+
+            # a bounded number of batches in flight instead of all at once
+            tasks = set()
+            batches = iter(batches)
+            while True:
+                batch = await loop.run_in_executor(None, next, batches, None)
+                if batch is None:
+                    break
+                tasks.add(asyncio.ensure_future(handle(batch)))
+                if len(tasks) >= 2 * self.concurrency:
+                    done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                    for t in done:
+                        t.result()
+            for t in asyncio.as_completed(tasks):
+                await t
+
+    def run(self, batches, callback, doi=normalize_doi):
+        """
+        Runs process in a new event loop on a worker thread and waits for it,
+        see process. Works from within a running event loop as well, e.g. the
+        prompt loop of cli.py, which asyncio.run refuses.
+        """
+        with cf.ThreadPoolExecutor(max_workers=1) as pool:
+            pool.submit(asyncio.run, self.process(batches, callback, doi)).result()
+
+    def relations(self, dois):
+        """
+        Fetches the relations of a few DOIs in one batch, see run.
+
+        Returns:
+            dict {normalized DOI: relations}, see CitationCache.relations
+        """
+        relations = dict()
+        self.run([list(dois)], lambda batch, fetched: relations.update(fetched))
+        return relations
@@ -0,0 +1,263 @@
+"""
+Citation graph of all fetched citation relations
+"""
+
+import os
+import numpy as np
+
+
+class CitationGraph():
+    """
+    Directed graph of citations between DOIs, incl. DOIs which are not in the
+    library, compacted from the edges of the CitationCache. DOIs are numbered
+    in sorted order. References and citations of each node are kept as
+    compressed sparse rows (CSR): the neighbors of node n are
+    indices[indptr[n]:indptr[n + 1]], sorted.
+
+    Besides neighbors, the graph answers co-citation (papers cited together
+    with a paper) and bibliographic coupling (papers sharing references with
+    a paper) queries.
+
+    Compacted graphs are saved with the edges version of the cache they were
+    built from, see build.
+    """
+
+    def __init__(self, dois, citing, cited, version=None):
+        """
+        Arguments:
+            dois: sorted list of the DOIs of all nodes
+            citing: array of the citing node of each edge
+            cited: array of the cited node of each edge
+            version: edges version of the cache, see CitationCache.put
+        """
+        self.dois = list(dois)
+        self.index = {d: n for n, d in enumerate(self.dois)}
+        self.version = version
+        citing = np.asarray(citing, dtype=np.int32)
+        cited = np.asarray(cited, dtype=np.int32)
+        self.references_indptr, self.references_indices = self.compact(citing, cited, len(self.dois))
+        self.citations_indptr, self.citations_indices = self.compact(cited, citing, len(self.dois))
+
+    @staticmethod
+    def compact(rows, cols, n):
+        """
+        Returns:
+            indptr and indices arrays of the CSR adjacency of edges rows ->
+            cols between n nodes
+        """
+        order = np.lexsort((cols, rows))
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=n), out=indptr[1:])
+        return indptr, cols[order]
+
+    @classmethod
+    def from_edges(cls, edges, version=None):
+        """
+        Arguments:
+            edges: iterable of (citing DOI, cited DOI) pairs
+
+        Returns:
+            CitationGraph instance
+        """
+        edges = list(edges)
+        dois = sorted({d for edge in edges for d in edge})
+        index = {d: n for n, d in enumerate(dois)}
+        citing = np.fromiter((index[a] for a, _ in edges), dtype=np.int32, count=len(edges))
+        cited = np.fromiter((index[b] for _, b in edges), dtype=np.int32, count=len(edges))
+        return cls(dois, citing, cited, version)
+
+    @classmethod
+    def load(cls, path, version=None):
+        """
+        Loads a graph saved with save.
+
+        Returns:
+            CitationGraph instance, None if the file is missing, unreadable or
+            of another version
+        """
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as f:
+                if version is not None and int(f['version']) != version:
+                    return None
+                graph = cls.__new__(cls)
+                graph.dois = f['dois'].tolist()
+                graph.version = int(f['version'])
+                for name in ['references_indptr', 'references_indices', 'citations_indptr', 'citations_indices']:
+                    setattr(graph, name, f[name])
+        except (OSError, ValueError, KeyError):
+            return None
+        graph.index = {d: n for n, d in enumerate(graph.dois)}
+        return graph
+
+    def save(self, path):
+        """
+        Writes the compacted graph, replacing an existing file atomically.
+        """
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path, dois=np.array(self.dois, dtype=str),
+                 version=np.int64(-1 if self.version is None else self.version),
+                 references_indptr=self.references_indptr, references_indices=self.references_indices,
+                 citations_indptr=self.citations_indptr, citations_indices=self.citations_indices)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def build(cls, cache, path=None):
+        """
+        Compacts the edges of a CitationCache, or loads the graph compacted
+        from the same edges before.
+
+        Arguments:
+            cache: CitationCache instance
+            path: path the compacted graph is saved to, if given
+
+        Returns:
+            CitationGraph instance
+        """
+        version = cache.edges_version()
+        graph = None if path is None else cls.load(path, version)
+        if graph is None:
+            graph = cls.from_edges(cache.get_edges(), version)
+            if path is not None:
+                graph.save(path)
+        return graph
+
+    def __len__(self):
+        return len(self.dois)
+
+    def __contains__(self, doi):
+        return doi in self.index
+
+    def count_edges(self):
+        return len(self.references_indices)
+
+    def gather(self, indptr, indices, nodes):
+        """
+        Returns:
+            array of the neighbors of all nodes, concatenated
+        """
+        nodes = np.asarray(nodes, dtype=np.int64)
+        starts = indptr[nodes]
+        lengths = indptr[nodes + 1] - starts
+        if lengths.sum() == 0:
+            return indices[:0]
+        # position of each neighbor relative to the start of its row
+        offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        return indices[np.repeat(starts, lengths) + offsets]
+
+    def neighbors(self, indptr, indices, doi):
+        n = self.index.get(doi)
+        if n is None:
+            return []
+        return [self.dois[m] for m in indices[indptr[n]:indptr[n + 1]]]
+
+    def references(self, doi):
+        """
+        Returns:
+            DOIs cited by doi
+        """
+        return self.neighbors(self.references_indptr, self.references_indices, doi)
+
+    def citations(self, doi):
+        """
+        Returns:
+            DOIs citing doi
+        """
+        return self.neighbors(self.citations_indptr, self.citations_indices, doi)
+
+    def relations(self, doi):
+        """
+        Returns:
+            dict like CitationCache.relations
+                'citing': DOIs which are cited in this publication
+                'cited_by': DOIs of articles which cited this publication
+        """
+        return {'citing': self.references(doi), 'cited_by': self.citations(doi)}
+
+    def rank(self, nodes, exclude, limit):
+        """
+        Returns:
+            list of (DOI, count) tuples of the most frequent nodes, ties in
+            order of the DOIs
+        """
+        values, counts = np.unique(nodes, return_counts=True)
+        keep = values != exclude
+        values, counts = values[keep], counts[keep]
+        # stable sort keeps ties in order of the DOIs
+        order = np.argsort(-counts, kind='stable')[:limit]
+        return [(self.dois[values[n]], int(counts[n])) for n in order]
+
+    def co_citations(self, doi, limit=10):
+        """
+        Finds papers cited together with doi.
+
+        Returns:
+            list of (DOI, number of papers citing both) tuples, most first
+        """
+        n = self.index.get(doi)
+        if n is None:
+            return []
+        citing = self.citations_indices[self.citations_indptr[n]:self.citations_indptr[n + 1]]
+        return self.rank(self.gather(self.references_indptr, self.references_indices, citing), n, limit)
+
+    def coupling(self, doi, limit=10):
+        """
+        Finds papers sharing references with doi, i.e. bibliographic coupling.
+
+        Returns:
+            list of (DOI, number of shared references) tuples, most first
+        """
+        n = self.index.get(doi)
+        if n is None:
+            return []
+        cited = self.references_indices[self.references_indptr[n]:self.references_indptr[n + 1]]
+        return self.rank(self.gather(self.citations_indptr, self.citations_indices, cited), n, limit)
+
+    def suggest(self, dois, exclude=(), limit=20):
+        """
+        Ranks papers related to a selection of papers, e.g. works a collection
+        keeps citing which are not in the library. Candidates are ranked by
+        frequency, i.e. the number of selected papers they cite or are cited
+        by, then by coupling strength, i.e. the number of references of the
+        selection they cite as well.
+
+        Arguments:
+            dois: DOIs of the selected papers
+            exclude: DOIs never suggested, e.g. all DOIs of the library
+            limit: maximum number of suggestions
+
+        Returns:
+            list of dicts with keys ['doi', 'cited_by', 'citing', 'coupling'],
+            i.e. the number of selected papers citing the DOI, the number of
+            selected papers cited by the DOI and the coupling strength
+        """
+        selected = np.array(sorted({self.index[d] for d in dois if d in self.index}), dtype=np.int64)
+        if len(selected) == 0:
+            return []
+        n = len(self.dois)
+        references = self.gather(self.references_indptr, self.references_indices, selected)
+        citations = self.gather(self.citations_indptr, self.citations_indices, selected)
+        cited_by = np.bincount(references, minlength=n)
+        citing = np.bincount(citations, minlength=n)
+
+        candidates = np.flatnonzero(cited_by + citing)
+        excluded = np.array(sorted({self.index[d] for d in exclude if d in self.index}), dtype=np.int64)
+        candidates = np.setdiff1d(candidates, np.concatenate([selected, excluded]), assume_unique=True)
+        if len(candidates) == 0:
+            return []
+
+        # coupling only decides ties of frequency, computed for the tied
+        # candidates of the top ranks only
+        frequency = cited_by[candidates] + citing[candidates]
+        order = np.argsort(-frequency, kind='stable')
+        cutoff = frequency[order[min(limit, len(order)) - 1]]
+        top = candidates[order[frequency[order] >= cutoff]]
+
+        lengths = self.references_indptr[top + 1] - self.references_indptr[top]
+        shared = np.isin(self.gather(self.references_indptr, self.references_indices, top), np.unique(references))
+        coupling = np.bincount(np.repeat(np.arange(len(top)), lengths), weights=shared, minlength=len(top))
+
+        ranked = np.lexsort((-coupling, -(cited_by[top] + citing[top])))[:limit]
+        return [{'doi': self.dois[top[r]], 'cited_by': int(cited_by[top[r]]),
+                 'citing': int(citing[top[r]]), 'coupling': int(coupling[r])} for r in ranked]
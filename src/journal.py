@@ -0,0 +1,175 @@
+"""
+Append-only journal of item updates pending in the zotero cloud
+"""
+
+import os
+import json
+import threading
+
+
+class Journal():
+    """
+    Records item updates before they are sent to the zotero API, and
+    acknowledges them once zotero confirmed them. Updates of a run that died
+    partway through stay unacknowledged and can be replayed, see pending.
+    Updates zotero rejected for good, e.g. with 400 or 403, are tombstoned
+    with the error instead, so they are not replayed, see rejected.
+
+    Each line is a JSON object, either an update {"seq": n, "update": {...}}
+    with the base it was computed from {"base": {...}} if given,
+    an acknowledgement {"ack": [n, ...]} or a tombstone {"reject": [n, ...],
+    "error": "..."}. Compacted tombstones are updates with an "error" key.
+    """
+
+    def __init__(self, path):
+        """
+        Arguments:
+            path: path of the journal file, created if it does not exist
+        """
+        self.path = path
+        self.lock = threading.Lock()
+        self.file = None
+        self.compact()
+
+    def close(self):
+        self.file.close()
+
+    def read(self):
+        """
+        Replays the journal.
+
+        Returns:
+            dict {seq: update} of unacknowledged updates, dict {seq: base} of
+            their bases, dict {seq: (update, error)} of rejected updates, last
+            seq
+        """
+        updates = dict()
+        bases = dict()
+        rejected = dict()
+        seq = 0
+        if not os.path.exists(self.path):
+            return updates, bases, rejected, seq
+
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # torn write of the last line when the process died
+                    continue
+                if 'seq' in entry and 'error' in entry:
+                    rejected[entry['seq']] = (entry['update'], entry['error'])
+                    seq = max(seq, entry['seq'])
+                elif 'seq' in entry:
+                    updates[entry['seq']] = entry['update']
+                    if 'base' in entry:
+                        bases[entry['seq']] = entry['base']
+                    seq = max(seq, entry['seq'])
+                elif 'reject' in entry:
+                    for n in entry['reject']:
+                        if n in updates:
+                            rejected[n] = (updates.pop(n), entry.get('error'))
+                            bases.pop(n, None)
+                else:
+                    for n in entry.get('ack', []):
+                        updates.pop(n, None)
+                        bases.pop(n, None)
+        return updates, bases, rejected, seq
+
+    def compact(self):
+        """
+        Rewrites the journal with unacknowledged and rejected updates only.
+        """
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+            updates, bases, rejected, self.seq = self.read()
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for n, (update, error) in rejected.items():
+                    f.write(json.dumps({'seq': n, 'update': update, 'error': error}) + '\n')
+                for n, update in updates.items():
+                    entry = {'seq': n, 'update': update}
+                    if n in bases:
+                        entry['base'] = bases[n]
+                    f.write(json.dumps(entry) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            # appends go to the compacted file, not the replaced one
+            self.file = open(self.path, 'a', encoding='utf-8')
+
+    def pending(self):
+        """
+        Returns:
+            dict {seq: update} of unacknowledged updates, in journal order
+        """
+        with self.lock:
+            self.file.flush()
+            return self.read()[0]
+
+    def bases(self):
+        """
+        Returns:
+            dict {seq: base} of unacknowledged updates recorded with a base
+        """
+        with self.lock:
+            self.file.flush()
+            return self.read()[1]
+
+    def rejected(self):
+        """
+        Returns:
+            dict {seq: (update, error)} of updates zotero rejected for good
+        """
+        with self.lock:
+            self.file.flush()
+            return self.read()[2]
+
+    def append(self, update, base=None):
+        """
+        Records an update before it is submitted.
+
+        Arguments:
+            update: item update
+            base: values the update was computed from, see WriteQueue.put
+
+        Returns:
+            seq of the entry
+        """
+        with self.lock:
+            self.seq += 1
+            entry = {'seq': self.seq, 'update': update}
+            if base is not None:
+                entry['base'] = base
+            self.file.write(json.dumps(entry) + '\n')
+            self.file.flush()
+            return self.seq
+
+    def sync(self):
+        """
+        Forces recorded entries to disk.
+        """
+        with self.lock:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def ack(self, seqs):
+        """
+        Marks updates as confirmed by zotero.
+        """
+        if len(seqs) == 0:
+            return
+        with self.lock:
+            self.file.write(json.dumps({'ack': list(seqs)}) + '\n')
+            self.file.flush()
+
+    def reject(self, seqs, error):
+        """
+        Marks updates as rejected by zotero for good, they are not replayed.
+        """
+        if len(seqs) == 0:
+            return
+        with self.lock:
+            self.file.write(json.dumps({'reject': list(seqs), 'error': error}) + '\n')
+            self.file.flush()
@@ -0,0 +1,156 @@
+"""
+Pool of read-only connections to the local zotero database
+"""
+
+import os
+import queue
+import sqlite3
+import tempfile
+import threading
+from contextlib import contextmanager
+from urllib.parse import quote
+
+
+class ConnectionPool():
+    """
+    Hands out read-only connections to the local zotero database to worker
+    threads. Connections are opened lazily, up to size connections.
+
+    Connections never take write locks on the database, so reads do not block
+    the running zotero client. In snapshot mode, all connections read from a
+    private point-in-time copy of the database instead.
+    """
+
+    def __init__(self, db_path, size=4, snapshot=False, cache_size=-64000,
+                 mmap_size=256 * 1024**2, factory=sqlite3.Connection):
+        """
+        Arguments:
+            db_path: path to zotero.sqlite
+            size: maximum number of pooled connections
+            snapshot: if True, read from a private copy of the database
+            cache_size: page cache per connection, see PRAGMA cache_size
+            (negative values in KiB)
+            mmap_size: bytes of the database file to memory-map
+            factory: connection class, see QueryProfiler.connection_factory
+        """
+        self.db_path = db_path
+        self.size = size
+        self.snapshot = snapshot
+        self.cache_size = cache_size
+        self.mmap_size = mmap_size
+        self.factory = factory
+        self.snapshot_path = None
+
+        self.idle = queue.LifoQueue()
+        self.opened = []
+        self.lock = threading.RLock()
+
+    def uri(self, path, immutable=False):
+        """
+        Builds the read-only URI for a database file.
+        """
+        uri = 'file:{}?mode=ro'.format(quote(os.path.abspath(path)))
+        if immutable:
+            uri += '&immutable=1'
+        return uri
+
+    def create_snapshot(self):
+        """
+        Copies the database into a private temporary file using SQLite's
+        online backup, which yields a consistent copy even while zotero is
+        writing.
+
+        Returns:
+            path of the snapshot
+        """
+        fd, path = tempfile.mkstemp(prefix='papiermache_', suffix='.sqlite')
+        os.close(fd)
+        src = sqlite3.connect(self.uri(self.db_path), uri=True)
+        dst = sqlite3.connect(path)
+        try:
+            src.backup(dst)
+        finally:
+            dst.close()
+            src.close()
+        return path
+
+    def open(self):
+        """
+        Opens a new read-only connection, which is not managed by the pool.
+
+        Returns:
+            connection instance
+        """
+        if self.snapshot:
+            with self.lock:
+                if self.snapshot_path is None:
+                    self.snapshot_path = self.create_snapshot()
+            uri = self.uri(self.snapshot_path, immutable=True)
+        else:
+            uri = self.uri(self.db_path)
+
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False,
+                               cached_statements=256, factory=self.factory)
+        conn.execute("PRAGMA query_only = 1;")
+        conn.execute("PRAGMA cache_size = {:d};".format(self.cache_size))
+        conn.execute("PRAGMA mmap_size = {:d};".format(self.mmap_size))
+        return conn
+
+    def acquire(self):
+        """
+        Checks out a connection. Blocks if all connections are in use.
+
+        Returns:
+            connection instance
+        """
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self.lock:
+            if len(self.opened) < self.size:
+                conn = self.open()
+                self.opened.append(conn)
+                return conn
+
+        return self.idle.get()
+
+    def release(self, conn):
+        """
+        Returns a checked out connection to the pool.
+        """
+        self.idle.put(conn)
+
+    @contextmanager
+    def cursor(self):
+        """
+        Context manager checking out a cursor of a pooled connection.
+
+        Example:
+            with pool.cursor() as cursor:
+                db.get_items(local_cursor=cursor)
+        """
+        conn = self.acquire()
+        try:
+            cursor = conn.cursor()
+            try:
+                yield cursor
+            finally:
+                cursor.close()
+        finally:
+            self.release(conn)
+
+    def close(self):
+        """
+        Closes all pooled connections and removes the snapshot, if any. The
+        pool can be used again afterwards, a new snapshot is taken on demand.
+        """
+        with self.lock:
+            for conn in self.opened:
+                conn.close()
+            self.opened = []
+            self.idle = queue.LifoQueue()
+            if self.snapshot_path is not None:
+                os.remove(self.snapshot_path)
+                self.snapshot_path = None
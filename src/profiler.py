@@ -0,0 +1,223 @@
+"""
+Opt-in profiling of the SQL statements run against the local zotero database
+"""
+
+import re
+import json
+import time
+import sqlite3
+import threading
+
+
+class QueryProfiler():
+    """
+    Collects statistics per statement fingerprint: number of executions,
+    bound parameters, rows returned, wall time incl. fetching, and the query
+    plan of the first execution.
+
+    Connections opened with connection_factory record all statements, incl.
+    PRAGMAs and other statements run with Connection.execute. EXPLAIN QUERY
+    PLAN statements of the profiler itself are not recorded.
+    """
+
+    def __init__(self):
+        self.stats = dict()
+        self.lock = threading.Lock()
+
+    def fingerprint(self, sql):
+        """
+        Normalizes a statement, so executions differing only in whitespace or
+        in the length of parameter lists share a fingerprint.
+        """
+        sql = ' '.join(sql.split())
+        return re.sub(r'\?(\s*,\s*\?)+', '?+', sql)
+
+    def explain(self, conn, sql, params):
+        """
+        Returns:
+            query plan as list of indented lines, None if not available
+        """
+        # plain cursor, explaining is not profiled
+        cursor = sqlite3.Cursor(conn)
+        try:
+            rows = cursor.execute('EXPLAIN QUERY PLAN ' + sql, params).fetchall()
+        except sqlite3.Error:
+            return None
+        finally:
+            cursor.close()
+        depth = {0: -1}
+        plan = []
+        for node, parent, _, detail in rows:
+            depth[node] = depth.get(parent, -1) + 1
+            plan.append('  ' * depth[node] + detail)
+        return plan
+
+    def start(self, conn, sql, params):
+        """
+        Registers the execution of a statement.
+
+        Returns:
+            fingerprint of the statement
+        """
+        fingerprint = self.fingerprint(sql)
+        with self.lock:
+            new = fingerprint not in self.stats
+            if new:
+                self.stats[fingerprint] = {'calls': 0, 'params': 0, 'rows': 0,
+                                           'time': 0., 'max_time': 0., 'plan': None}
+            stat = self.stats[fingerprint]
+            stat['calls'] += 1
+            stat['params'] = max(stat['params'], len(params))
+        if new:
+            # outside of the lock, explaining needs a database round trip
+            stat['plan'] = self.explain(conn, sql, params)
+        return fingerprint
+
+    def record(self, fingerprint, elapsed, rows=0):
+        """
+        Adds wall time and returned rows to a statement.
+        """
+        with self.lock:
+            stat = self.stats[fingerprint]
+            stat['time'] += elapsed
+            stat['max_time'] = max(stat['max_time'], elapsed)
+            stat['rows'] += rows
+
+    def report(self):
+        """
+        Returns:
+            list of statement statistics, slowest statements (total time)
+            first. Full table scans in the query plan are listed in 'scans'.
+        """
+        with self.lock:
+            stats = [dict(stat, sql=fingerprint) for fingerprint, stat in self.stats.items()]
+        for stat in stats:
+            stat['scans'] = [line.strip()[5:] for line in stat['plan'] or []
+                             if line.strip().startswith('SCAN ')]
+        return sorted(stats, key=lambda s: s['time'], reverse=True)
+
+    def dump(self, path):
+        """
+        Writes the report as JSON.
+        """
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, indent=2)
+
+    def format(self, limit=20):
+        """
+        Returns:
+            report of the slowest statements as text table
+        """
+        lines = ['{:>10} {:>6} {:>10} {:>8} {:>6}  {}'.format(
+            'total ms', 'calls', 'max ms', 'rows', 'params', 'statement')]
+        for stat in self.report()[:limit]:
+            sql = stat['sql'] if len(stat['sql']) <= 80 else stat['sql'][:77] + '...'
+            lines.append('{:>10.1f} {:>6} {:>10.1f} {:>8} {:>6}  {}'.format(
+                stat['time'] * 1000, stat['calls'], stat['max_time'] * 1000,
+                stat['rows'], stat['params'], sql))
+            if stat['scans']:
+                lines.append(' ' * 45 + 'full scan: ' + ', '.join(stat['scans']))
+        return '\n'.join(lines)
+
+    def connection_factory(self):
+        """
+        Returns:
+            sqlite3.Connection subclass recording into this profiler, for the
+            factory argument of sqlite3.connect
+        """
+        profiler = self
+
+        class ProfiledConnection(sqlite3.Connection):
+            def cursor(self, factory=None):
+                cursor = super().cursor(factory or ProfiledCursor)
+                cursor.profiler = profiler
+                return cursor
+
+            # the shortcuts of sqlite3.Connection create plain cursors
+            def execute(self, sql, params=()):
+                return self.cursor().execute(sql, params)
+
+            def executemany(self, sql, seq_of_params):
+                return self.cursor().executemany(sql, seq_of_params)
+
+        return ProfiledConnection
+
+
+class ProfiledCursor(sqlite3.Cursor):
+    """
+    Cursor timing its statements. SQLite computes rows lazily, so fetching
+    counts towards the statement last executed. Time and rows are collected
+    on the cursor and recorded once the statement is exhausted or replaced.
+    """
+
+    profiler = None
+    current = None
+    elapsed = 0.
+    rows = 0
+
+    def flush(self):
+        if self.current is not None:
+            self.profiler.record(self.current, self.elapsed, self.rows)
+        self.current = None
+        self.elapsed = 0.
+        self.rows = 0
+
+    def timed(self, func, *args):
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            self.elapsed += time.perf_counter() - start
+
+    def execute(self, sql, params=()):
+        self.flush()
+        self.current = self.profiler.start(self.connection, sql, params)
+        result = self.timed(super().execute, sql, params)
+        if self.description is None:
+            # no rows to fetch, e.g. PRAGMA assignments or writes
+            self.flush()
+        return result
+
+    def executemany(self, sql, seq_of_params):
+        self.flush()
+        seq_of_params = list(seq_of_params)
+        self.current = self.profiler.start(self.connection, sql,
+                                           seq_of_params[0] if seq_of_params else ())
+        result = self.timed(super().executemany, sql, seq_of_params)
+        self.flush()
+        return result
+
+    def fetchone(self):
+        row = self.timed(super().fetchone)
+        if row is None:
+            self.flush()
+        else:
+            self.rows += 1
+        return row
+
+    def fetchmany(self, size=None):
+        size = size or self.arraysize
+        rows = self.timed(super().fetchmany, size)
+        self.rows += len(rows)
+        if len(rows) < size:
+            self.flush()
+        return rows
+
+    def fetchall(self):
+        rows = self.timed(super().fetchall)
+        self.rows += len(rows)
+        self.flush()
+        return rows
+
+    def __next__(self):
+        try:
+            row = self.timed(super().__next__)
+        except StopIteration:
+            self.flush()
+            raise
+        self.rows += 1
+        return row
+
+    def close(self):
+        self.flush()
+        return super().close()
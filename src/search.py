@@ -0,0 +1,281 @@
+"""
+Full-text search index of zotero items
+"""
+
+import re
+import html
+import json
+import sqlite3
+import threading
+from collections import defaultdict
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    key TEXT UNIQUE NOT NULL,
+    version INT NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS docs USING fts5(
+    title,
+    shortTitle,
+    abstractNote,
+    publicationTitle,
+    creators,
+    tags,
+    notes,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value
+);
+"""
+
+# layout version of the index, indices of other versions are rebuilt
+SEARCH_FORMAT = 2
+
+# indexed fields of an item, in the column order of docs
+FIELDS = ('title', 'shortTitle', 'abstractNote', 'publicationTitle')
+COLUMNS = FIELDS + ('creators', 'tags', 'notes')
+
+# bm25 weights per column of docs, matches in titles and names rank highest
+WEIGHTS = (10.0, 8.0, 1.0, 2.0, 5.0, 3.0, 1.0)
+
+# characters making a query an FTS5 expression rather than plain words
+FTS_SYNTAX = re.compile(r'["*:^()]|\b(AND|OR|NOT|NEAR)\b')
+
+
+class SearchIndex():
+    """
+    Keeps an SQLite FTS5 index over titles, abstracts, publication titles,
+    creator names, tags and note texts of regular items in a separate
+    database. Notes are indexed with their parent item. On refresh, only items
+    and notes whose version or clientDateModified exceed the highest ones
+    indexed so far are read again.
+    """
+
+    def __init__(self, path):
+        """
+        Arguments:
+            path: path of the index database, created if it does not exist
+        """
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.RLock()
+
+        if self.get_format() != SEARCH_FORMAT:
+            self.clear()
+
+    def close(self):
+        self.conn.close()
+
+    def get_format(self):
+        """
+        Layout version of an existing index, None for a new one.
+        """
+        try:
+            return self.get_meta('format')
+        except sqlite3.OperationalError:
+            return None
+
+    def clear(self):
+        """
+        Removes all documents from the index, recreating its tables.
+        """
+        with self.lock, self.conn:
+            for table in ['documents', 'docs', 'meta']:
+                self.conn.execute("DROP TABLE IF EXISTS {};".format(table))
+        self.conn.executescript(SCHEMA)
+        with self.lock, self.conn:
+            self.set_meta('format', SEARCH_FORMAT)
+
+    def get_meta(self, name, default=None):
+        row = self.conn.execute("SELECT value FROM meta WHERE name = ?;", [name]).fetchone()
+        return default if row is None else json.loads(row[0])
+
+    def set_meta(self, name, value):
+        self.conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?);", [name, json.dumps(value)])
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM documents;").fetchone()[0]
+
+    def document(self, item, notes=[]):
+        """
+        Returns:
+            column values of docs for an item and its notes
+        """
+        creators = '; '.join(' '.join(filter(None, [c.get('firstName'), c.get('lastName'), c.get('name')]))
+                             for c in item.get('creators', []))
+        tags = '; '.join(t['tag'] for t in item.get('tags', []))
+        # notes are stored as html
+        notes = '\n'.join(html.unescape(re.sub(r'<[^>]+>', ' ', n.get('note', ''))) for n in notes)
+        return tuple(item.get(f, '') for f in FIELDS) + (creators, tags, notes)
+
+    def ids(self, keys):
+        """
+        Returns:
+            dict {key: rowid in docs} of indexed items
+        """
+        sql = "SELECT key, id FROM documents WHERE key IN (SELECT value FROM json_each(?));"
+        return dict(self.conn.execute(sql, [json.dumps(list(keys))]))
+
+    def upsert(self, items, notes={}):
+        """
+        Indexes items, replacing earlier versions.
+
+        Arguments:
+            items: list of zotero data items
+            notes: dict {parent key: list of note items}
+
+        Returns:
+            number of indexed items
+        """
+        with self.lock, self.conn:
+            self.conn.executemany("""INSERT INTO documents (key, version) VALUES (?, ?)
+                ON CONFLICT (key) DO UPDATE SET version = excluded.version;""",
+                [(i['key'], i['version']) for i in items])
+            ids = self.ids([i['key'] for i in items])
+            self.conn.executemany("DELETE FROM docs WHERE rowid = ?;", [(ids[i['key']],) for i in items])
+            self.conn.executemany("INSERT INTO docs (rowid, {}) VALUES (?, {});".format(
+                ', '.join(COLUMNS), ', '.join('?' * len(COLUMNS))),
+                [(ids[i['key']],) + self.document(i, notes.get(i['key'], [])) for i in items])
+        return len(items)
+
+    def delete(self, keys):
+        """
+        Removes items by key.
+
+        Returns:
+            number of removed items
+        """
+        with self.lock, self.conn:
+            ids = [(n,) for n in self.ids(keys).values()]
+            self.conn.executemany("DELETE FROM docs WHERE rowid = ?;", ids)
+            self.conn.executemany("DELETE FROM documents WHERE id = ?;", ids)
+        return len(ids)
+
+    def refresh(self, db, keys=None, force=False):
+        """
+        Brings the index up to date with the zotero database. Skipped if the
+        state of the library did not change since the last refresh, see
+        ZoteroDatabase.library_state. Erased items are removed by the delete
+        log of zotero, see ZoteroDatabase.get_deleted.
+
+        Arguments:
+            db: ZoteroDatabase instance
+            keys: keys of all regular items in zotero, if given, indexed items
+            not among them are removed, whether the state changed or not
+            force: if True, discard the index and index all items
+
+        Returns:
+            number of updated items, number of removed items
+        """
+        with self.lock:
+            if force:
+                self.clear()
+            state = db.library_state()
+            if keys is None and state is not None and state == self.get_meta('state'):
+                return 0, 0
+
+            # like ItemCache, incl. local changes not synced yet, which keep
+            # their version
+            since = self.get_meta('mark')
+            modified = db.get_modified(since=since)
+            modified_notes = db.get_modified('note', since=since)
+            marks = list(modified.values()) + list(modified_notes.values()) + [since or [0, '']]
+            mark = [max(m[0] or 0 for m in marks), max(m[1] or '' for m in marks)]
+
+            notes = defaultdict(list)
+            if since is None:
+                items = {i['key']: i for i in db.iter_items()}
+                for n in db.iter_notes():
+                    if n.get('parentItem'):
+                        notes[n['parentItem']].append(n)
+            else:
+                # notes modified on their own change the document of their parent
+                parents = set()
+                if len(modified_notes) > 0:
+                    parents = {n['parentItem'] for n in db.iter_notes(keys=list(modified_notes))
+                               if n.get('parentItem')}
+                changed = set(modified) | parents
+                items = dict()
+                if len(changed) > 0:
+                    items = {i['key']: i for i in db.iter_items(keys=list(changed))}
+                if len(items) > 0:
+                    # all notes of a reindexed item, not only the modified ones
+                    for n in db.iter_notes(parent_keys=list(items)):
+                        notes[n['parentItem']].append(n)
+
+            updated = self.upsert(list(items.values()), notes)
+
+            deleted_since = self.get_meta('deleted')
+            deleted = db.get_deleted(since=deleted_since)
+            if keys is None and deleted is None:
+                # without a delete log, compare with all keys
+                keys = db.get_keys()
+            removed = 0
+            if keys is not None:
+                keys = set(keys)
+                removed = self.delete([k for k, in self.conn.execute("SELECT key FROM documents;")
+                                       if k not in keys])
+            elif since is not None:
+                removed = self.delete([k for k in deleted if k not in items])
+
+            with self.conn:
+                self.set_meta('mark', mark)
+                self.set_meta('state', state)
+                if deleted:
+                    self.set_meta('deleted', max([deleted_since or ''] + list(deleted.values())))
+            return updated, removed
+
+    def build_query(self, query, literal=False):
+        """
+        Turns plain words into a query for items containing all words, the
+        last word as prefix, so partial input matches. Queries using FTS5
+        syntax, e.g. quotes, column filters or OR, are passed on unchanged,
+        unless literal is True.
+        """
+        if not literal and FTS_SYNTAX.search(query):
+            return query
+        words = ['"{}"'.format(w.replace('"', '')) for w in query.split()]
+        if len(words) > 0:
+            words[-1] += '*'
+        return ' '.join(words)
+
+    def search(self, query, limit=20, literal=False):
+        """
+        Finds items matching a query, see build_query.
+
+        Arguments:
+            query: words or FTS5 query
+            limit: maximum number of results
+            literal: if True, search for the words of the query, ignoring FTS5
+            syntax
+
+        Returns:
+            list of (key, score) tuples, best match first
+
+        Raises:
+            ValueError if the query is not valid FTS5 syntax, e.g. titles like
+            'COVID: a review' or 'Smith (2020)'. Search with literal=True then.
+        """
+        sql = """SELECT
+            d.key,
+            bm25(docs, {}) AS score
+        FROM docs
+        JOIN documents d ON d.id = docs.rowid
+        WHERE docs MATCH ?
+        ORDER BY score
+        LIMIT ?;""".format(', '.join(map(str, WEIGHTS)))
+
+        fts_query = self.build_query(query, literal)
+        if len(fts_query) == 0:
+            return []
+        with self.lock:
+            try:
+                rows = self.conn.execute(sql, [fts_query, limit]).fetchall()
+            except sqlite3.OperationalError as e:
+                raise ValueError('invalid search syntax: {}'.format(e)) from e
+        # bm25 scores are negative, lower is better
+        return [(key, -score) for key, score in rows]
@@ -0,0 +1,148 @@
+"""
+Memory-mapped snapshot of the indices built at startup
+"""
+
+import os
+import sys
+import mmap
+import struct
+import marshal
+
+
+# file signature, incl. the layout version of the snapshot
+MAGIC = b'PMSNAP02'
+
+# the marshal format differs between interpreters, snapshots of other ones
+# are rebuilt
+INTERPRETER = (marshal.version,) + tuple(sys.version_info[:2])
+
+# header: signature, marshal version, major and minor version of python,
+# offset and length of the table of contents
+HEADER = struct.Struct('<8sBBBQQ')
+
+
+class Snapshot():
+    """
+    File of named sections, each one object serialized with marshal, e.g. the
+    autocompletes of papers or the tag index. The file is memory-mapped and a
+    section is only deserialized when it is accessed for the first time.
+
+    Snapshots carry the state of the zotero database they were built from,
+    see ZoteroDatabase.library_state. load only returns snapshots matching
+    the current state.
+
+    Layout: header, sections, table of contents {'state': ..., 'sections':
+    {name: (offset, length)}}.
+    """
+
+    def __init__(self, path):
+        """
+        Arguments:
+            path: path of an existing snapshot file
+
+        Raises:
+            ValueError if the file is not a snapshot of this version and
+            python version
+        """
+        self.path = path
+        self.cache = dict()
+        with open(path, 'rb') as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, *interpreter, toc_offset, toc_length = HEADER.unpack_from(self.mmap, 0)
+            if magic != MAGIC:
+                raise ValueError('not a snapshot: {}'.format(path))
+            if tuple(interpreter) != INTERPRETER:
+                raise ValueError('snapshot of another python version: {}'.format(path))
+            toc = marshal.loads(self.mmap[toc_offset:toc_offset + toc_length])
+            self.state = toc['state']
+            self.sections = toc['sections']
+        except (struct.error, EOFError, TypeError, KeyError) as e:
+            self.mmap.close()
+            raise ValueError('corrupt snapshot: {}'.format(path)) from e
+        except ValueError:
+            self.mmap.close()
+            raise
+
+    @classmethod
+    def load(cls, path, state):
+        """
+        Opens a snapshot if it was built from the given database state.
+
+        Returns:
+            Snapshot instance, None if the file is missing, corrupt or stale
+        """
+        if state is None or not os.path.exists(path):
+            return None
+        try:
+            snapshot = cls(path)
+        except (OSError, ValueError):
+            return None
+        if snapshot.state != state:
+            snapshot.close()
+            return None
+        return snapshot
+
+    @staticmethod
+    def write(path, state, sections):
+        """
+        Writes a snapshot, replacing an existing file atomically.
+
+        Arguments:
+            path: path of the snapshot file
+            state: state of the zotero database the sections were built from
+            sections: dict {name: object}, objects must be serializable with
+            marshal, i.e. built-in types only
+        """
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, *INTERPRETER, 0, 0))
+            toc = {'state': state, 'sections': dict()}
+            for name, obj in sections.items():
+                payload = marshal.dumps(obj)
+                toc['sections'][name] = (f.tell(), len(payload))
+                f.write(payload)
+            toc_offset = f.tell()
+            toc = marshal.dumps(toc)
+            f.write(toc)
+            # the header is completed last, files cut short are rejected
+            f.seek(0)
+            f.write(HEADER.pack(MAGIC, *INTERPRETER, toc_offset, len(toc)))
+        os.replace(tmp_path, path)
+
+    def close(self):
+        self.cache = dict()
+        self.mmap.close()
+
+    def __contains__(self, name):
+        return name in self.sections
+
+    def __getitem__(self, name):
+        """
+        Deserializes a section on first access.
+
+        Raises:
+            ValueError if the section is corrupt, e.g. cut short
+        """
+        if name not in self.cache:
+            offset, length = self.sections[name]
+            if offset + length > len(self.mmap):
+                raise ValueError('corrupt snapshot section {}: {}'.format(name, self.path))
+            try:
+                self.cache[name] = marshal.loads(self.mmap[offset:offset + length])
+            except (EOFError, TypeError, ValueError) as e:
+                raise ValueError('corrupt snapshot section {}: {}'.format(name, self.path)) from e
+        return self.cache[name]
+
+    def discard(self):
+        """
+        Closes and deletes the snapshot file, e.g. if a section is corrupt.
+        """
+        self.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def get(self, name, default=None):
+        return self[name] if name in self else default
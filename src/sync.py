@@ -0,0 +1,117 @@
+"""
+Incremental sync of the zotero API into a local mirror
+"""
+
+import time
+import threading
+import concurrent.futures as cf
+
+
+class RemoteSync():
+    """
+    Mirrors the items of a zotero library into an ItemCache. Each sync only
+    transfers items whose version is greater than the library version of the
+    previous sync: one request lists changed keys and versions, the items are
+    then fetched in chunks of 50 (the API maximum) by parallel workers, and
+    deleted keys are purged.
+    """
+
+    def __init__(self, cache, connect, max_workers=4, chunk_size=50, max_age=60):
+        """
+        Arguments:
+            cache: ItemCache instance in mirror mode
+            connect: callable returning a new pyzotero Zotero instance, called
+            once per worker thread as instances are not thread-safe
+            max_workers: number of parallel requests
+            chunk_size: number of items per request
+            max_age: seconds a sync is considered current, see sync
+        """
+        self.cache = cache
+        self.connect = connect
+        self.max_workers = max_workers
+        self.chunk_size = chunk_size
+        self.max_age = max_age
+        self.synced_at = None
+        self.local = threading.local()
+        self.lock = threading.Lock()
+
+    @property
+    def zot(self):
+        """
+        Zotero instance of the current thread.
+        """
+        if getattr(self.local, 'zot', None) is None:
+            self.local.zot = self.connect()
+        return self.local.zot
+
+    @property
+    def library_version(self):
+        """
+        Library version the mirror is synced to, 0 if never synced.
+        """
+        return self.cache.get_meta('library_version', 0)
+
+    def item_versions(self, since):
+        """
+        Lists items modified after since.
+
+        Returns:
+            dict {key: version}, current library version
+        """
+        versions = self.zot.item_versions(since=since)
+        library_version = int(self.zot.request.headers.get('last-modified-version', since))
+        return versions, library_version
+
+    def fetch(self, keys):
+        """
+        Fetches items by key, at most chunk_size.
+
+        Returns:
+            list of zotero data items
+        """
+        return [i['data'] for i in self.zot.items(itemKey=','.join(keys), limit=len(keys))]
+
+    def deleted(self, since):
+        """
+        Lists keys of items deleted after since.
+        """
+        if since == 0:
+            return []
+        return self.zot.deleted(since=since).get('items', [])
+
+    def sync(self, force=False):
+        """
+        Brings the mirror up to date. Skipped if the last sync is less than
+        max_age seconds old.
+
+        Arguments:
+            force: if True, sync regardless of max_age
+
+        Returns:
+            number of updated items, number of deleted items
+        """
+        with self.lock:
+            if (not force and self.synced_at is not None
+                    and time.monotonic() - self.synced_at < self.max_age):
+                return 0, 0
+
+            since = self.library_version
+            versions, library_version = self.item_versions(since)
+            # items unchanged since the last sync are not fetched again
+            keys = [k for k, v in versions.items() if v > since]
+
+            updated = 0
+            if len(keys) > 0:
+                chunks = [keys[n:n + self.chunk_size] for n in range(0, len(keys), self.chunk_size)]
+                with cf.ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                    for items in pool.map(self.fetch, chunks):
+                        updated += self.cache.upsert(items)
+
+            deleted = 0
+            if library_version > since:
+                deleted = self.cache.delete(self.deleted(since))
+
+            with self.cache.lock, self.cache.conn:
+                self.cache.set_meta('library_version', library_version)
+            self.synced_at = time.monotonic()
+            return updated, deleted
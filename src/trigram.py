@@ -0,0 +1,154 @@
+"""
+Trigram index for fuzzy lookup of papers
+"""
+
+import re
+import math
+import unicodedata
+from collections import defaultdict, Counter
+
+
+class TrigramIndex():
+    """
+    Inverted index from character n-grams (trigrams by default) to the texts
+    of keys, e.g. the autocomplete string, DOI and ISBN of a paper. Lookups
+    rank keys by the share of the query's n-grams found in one of their texts,
+    so typos and partial titles still resolve.
+
+    Only postings of the rarest n-grams of a query are scanned for candidates,
+    a text sharing at least threshold of the query's n-grams usually contains
+    some of them. The candidates hitting most of these n-grams are then scored
+    exactly by intersecting their n-gram sets with the query's.
+    """
+
+    # number of candidates scored exactly per requested result
+    CANDIDATES_PER_RESULT = 20
+
+    # long queries only probe their rarest n-grams for candidates, a text
+    # rarely shares half of a query without any of them
+    MAX_PROBES = 8
+
+    def __init__(self, n=3):
+        """
+        Arguments:
+            n: length of the n-grams
+        """
+        self.n = n
+        self.postings = defaultdict(set)
+        self.grams = dict()
+        self.owners = dict()
+        self.texts = dict()
+        self.doc_ids = dict()
+        self.next_id = 0
+
+    def __len__(self):
+        return len(self.texts)
+
+    def __contains__(self, key):
+        return key in self.texts
+
+    def ngrams(self, text):
+        """
+        Returns:
+            set of n-grams of the normalized text, i.e. lower case without
+            accents and punctuation, padded with blanks
+        """
+        text = unicodedata.normalize('NFKD', text.lower())
+        text = ''.join(c for c in text if not unicodedata.combining(c))
+        text = ' ' + ' '.join(re.findall(r'\w+', text)) + ' '
+        return {text[n:n + self.n] for n in range(len(text) - self.n + 1)}
+
+    def add(self, key, texts):
+        """
+        Indexes the texts of a key, replacing earlier texts.
+        """
+        self.remove(key)
+        texts = tuple(texts)
+        self.texts[key] = texts
+        self.doc_ids[key] = list()
+        for text in texts:
+            grams = self.ngrams(text)
+            if len(grams) == 0:
+                continue
+            doc_id = self.next_id
+            self.next_id += 1
+            self.doc_ids[key].append(doc_id)
+            self.grams[doc_id] = frozenset(grams)
+            self.owners[doc_id] = key
+            for g in grams:
+                self.postings[g].add(doc_id)
+
+    def remove(self, key):
+        """
+        Removes the texts of a key, if indexed.
+        """
+        if key not in self.texts:
+            return
+        del self.texts[key]
+        for doc_id in self.doc_ids.pop(key):
+            for g in self.grams.pop(doc_id):
+                postings = self.postings[g]
+                postings.discard(doc_id)
+                if len(postings) == 0:
+                    del self.postings[g]
+            del self.owners[doc_id]
+
+    def update(self, documents):
+        """
+        Brings the index in line with documents, indexing only keys whose
+        texts changed.
+
+        Arguments:
+            documents: dict {key: tuple of texts} of all keys
+
+        Returns:
+            number of updated keys, number of removed keys
+        """
+        removed = [k for k in self.texts if k not in documents]
+        for key in removed:
+            self.remove(key)
+        updated = 0
+        for key, texts in documents.items():
+            texts = tuple(t for t in texts if t)
+            if self.texts.get(key) != texts:
+                self.add(key, texts)
+                updated += 1
+        return updated, len(removed)
+
+    def search(self, query, limit=5, threshold=0.5):
+        """
+        Finds keys with texts similar to the query.
+
+        Arguments:
+            query: text to look up
+            limit: maximum number of results
+            threshold: minimum share of the query's n-grams a text must contain
+
+        Returns:
+            list of (key, score) tuples, best match first. The score is the
+            share of the query's n-grams found in the text.
+        """
+        grams = self.ngrams(query)
+        if len(grams) == 0:
+            return []
+        required = max(1, math.ceil(threshold * len(grams)))
+        grams = sorted(grams, key=lambda g: len(self.postings.get(g, ())))
+        probes = min(len(grams) - required + 1, self.MAX_PROBES)
+
+        hits = Counter()
+        for g in grams[:probes]:
+            hits.update(self.postings.get(g, ()))
+
+        best = dict()
+        query = frozenset(grams)
+        for doc_id, _ in hits.most_common(limit * self.CANDIDATES_PER_RESULT):
+            shared = len(query & self.grams[doc_id])
+            if shared < required:
+                continue
+            # ties are broken by the overlap relative to the length of the text
+            score = (shared / len(query), 2 * shared / (len(query) + len(self.grams[doc_id])))
+            key = self.owners[doc_id]
+            if score > best.get(key, (0, 0)):
+                best[key] = score
+        ranked = sorted(best.items(), key=lambda kv: kv[1], reverse=True)[:limit]
+        return [(key, score[0]) for key, score in ranked]
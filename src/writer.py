@@ -0,0 +1,339 @@
+"""
+Concurrent, coalescing write queue for item updates to the zotero API
+"""
+
+import time
+import threading
+import concurrent.futures as cf
+from pyzotero.zotero_errors import PyZoteroError
+try:
+    from pyzotero.zotero_errors import PreConditionFailedError as PreConditionFailed
+except ImportError:
+    from pyzotero.zotero_errors import PreConditionFailed
+
+
+# codes of items failed in a write which may succeed later, the updates stay
+# pending in the journal. Items failing with other codes, e.g. 400 or 403, are
+# rejected for good.
+TRANSIENT_CODES = (412, 429, 500, 502, 503, 504)
+
+# errors of whole requests, e.g. status 429 or 5xx and network errors, which
+# are OSErrors in requests. The updates of the request stay pending.
+REQUEST_ERRORS = (PyZoteroError, OSError)
+
+
+class WriteQueue():
+    """
+    Collects item updates from any number of producers and writes them to the
+    zotero API in batches of 50 items, the maximum the API accepts per
+    request. Updates of the same key are merged while waiting. Full batches
+    are written by worker threads, with at most max_pending requests in
+    flight; producers block beyond that.
+
+    Items modified in the meantime are rejected by zotero with status 412.
+    Their current version is fetched and the update is merged into it again,
+    see rebase. Updates of fields which were changed meanwhile are dropped
+    instead of overwriting the other edit; the values the update was computed
+    from are passed as its base, see put.
+
+    With a journal, updates are recorded before they are sent and
+    acknowledged once zotero confirmed them, see Journal. Updates zotero
+    rejects for good, e.g. invalid fields or items deleted meanwhile, are
+    tombstoned with their error and reported apart from updates which may be
+    resumed.
+
+    Example:
+        with db.write_queue() as queue:
+            for update in updates:
+                queue.put(update)
+        print(queue.report())
+    """
+
+    def __init__(self, connect, batch_size=50, max_pending=4, max_retries=3, journal=None):
+        """
+        Arguments:
+            connect: callable returning a new pyzotero Zotero instance, called
+            once per worker thread
+            batch_size: number of items per request
+            max_pending: maximum number of requests in flight
+            max_retries: number of times conflicting items are rebased
+            journal: Journal instance to record updates in, optional
+        """
+        self.connect = connect
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+        self.journal = journal
+
+        self.pending = dict()
+        self.seqs = dict()
+        self.bases = dict()
+        self.futures = set()
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.pool = cf.ThreadPoolExecutor(max_workers=max_pending)
+
+        self.written = 0
+        self.requests = 0
+        self.conflicts = 0
+        self.failed = dict()
+        self.rejected = dict()
+        self.started = None
+        self.finished = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def zot(self):
+        """
+        Zotero instance of the current thread.
+        """
+        if getattr(self.local, 'zot', None) is None:
+            self.local.zot = self.connect()
+        return self.local.zot
+
+    def merge(self, update, other):
+        """
+        Merges two updates of the same item. Fields of other take precedence,
+        relations are combined.
+
+        Returns:
+            merged update
+        """
+        merged = dict(update)
+        merged.update(other)
+        if 'relations' in update and 'relations' in other:
+            relations = {p: list(o) for p, o in update['relations'].items()}
+            for p, objects in other['relations'].items():
+                relations.setdefault(p, [])
+                relations[p] += [o for o in objects if o not in relations[p]]
+            merged['relations'] = relations
+        return merged
+
+    def changed(self, update, current, base=None):
+        """
+        Finds fields of an update which were changed by someone else since the
+        update was computed. Relations are merged instead, see rebase. Without
+        the previous value of a field it counts as changed unless it has the
+        value of the update already.
+
+        Arguments:
+            update: rejected update
+            current: item data with the latest version from the zotero API
+            base: dict of the values of the fields the update was computed
+            from, optional
+
+        Returns:
+            list of changed fields
+        """
+        base = base or {}
+        return [f for f, v in update.items() if f not in ['key', 'version', 'relations']
+                and current.get(f) != v and (f not in base or current.get(f) != base[f])]
+
+    def rebase(self, update, current, base=None):
+        """
+        Applies an update to the current version of an item.
+
+        Arguments:
+            update: rejected update
+            current: item data with the latest version from the zotero API
+            base: see changed
+
+        Returns:
+            update with the latest version, None if fields of the update were
+            changed meanwhile, see changed
+        """
+        if len(self.changed(update, current, base)) > 0:
+            return None
+        rebased = self.merge({'relations': current.get('relations', {})}, update)
+        if 'relations' not in update:
+            del rebased['relations']
+        rebased['version'] = current['version']
+        return rebased
+
+    def put(self, update, seqs=None, base=None):
+        """
+        Queues an item update. Dictionaries must have the form of the zotero
+        API with 'key' and 'version' keys.
+
+        Arguments:
+            update: item update
+            seqs: journal entries of the update if it was recorded before,
+            otherwise it is recorded now
+            base: item data the update was computed from, i.e. of its version,
+            to detect conflicting edits, see changed
+        """
+        if self.started is None:
+            self.started = time.perf_counter()
+
+        if base is not None:
+            base = {f: base.get(f) for f in update if f not in ['key', 'version', 'relations']}
+        if self.journal is not None and seqs is None:
+            seqs = [self.journal.append(update, base)]
+
+        with self.lock:
+            key = update['key']
+            if key in self.pending:
+                update = self.merge(self.pending[key], update)
+            self.pending[key] = update
+            self.seqs.setdefault(key, []).extend(seqs or [])
+            if base is not None:
+                # values of earlier updates were computed from first
+                self.bases[key] = dict(base, **self.bases.get(key, {}))
+            if len(self.pending) < self.batch_size:
+                return
+            keys = list(self.pending)[:self.batch_size]
+            batch = [self.pending.pop(k) for k in keys]
+            seqs = [self.seqs.pop(k) for k in keys]
+            bases = [self.bases.pop(k, None) for k in keys]
+        self.submit(batch, seqs, bases)
+
+    def submit(self, batch, seqs, bases):
+        """
+        Hands a batch to the workers, blocks while max_pending requests are in
+        flight. The journal entries of the batch are written to disk first.
+        """
+        with self.lock:
+            futures = set(self.futures)
+        if len(futures) >= self.max_pending:
+            done, _ = cf.wait(futures, return_when=cf.FIRST_COMPLETED)
+            with self.lock:
+                self.futures -= done
+            for f in done:
+                f.result()
+
+        if self.journal is not None:
+            self.journal.sync()
+        future = self.pool.submit(self.write, batch, seqs, bases, self.max_retries)
+        with self.lock:
+            self.futures.add(future)
+
+    def write(self, batch, seqs, bases, retries=0):
+        """
+        Writes one batch and rebases items rejected because of conflicts. If the
+        request fails, the batch is counted as failed and stays pending in the
+        journal.
+
+        Arguments:
+            batch: list of item updates
+            seqs: list of journal entries per update
+            bases: list of the bases per update, see put
+            retries: number of times conflicts are rebased
+        """
+        zot = self.zot
+        try:
+            zot.update_items(batch)
+            failed = zot.request.json().get('failed', {})
+        except PreConditionFailed:
+            failed = {str(n): {'code': 412, 'message': 'library modified'} for n in range(len(batch))}
+        except REQUEST_ERRORS as e:
+            with self.lock:
+                self.requests += 1
+            self.fail(batch, e)
+            return
+
+        with self.lock:
+            self.requests += 1
+            self.written += len(batch) - len(failed)
+        if self.journal is not None:
+            self.journal.ack([s for n, ss in enumerate(seqs) if str(n) not in failed for s in ss])
+
+        conflicts = [n for n, f in failed.items() if f.get('code') == 412]
+        for n, f in failed.items():
+            if f.get('code') not in TRANSIENT_CODES:
+                self.reject(batch[int(n)], seqs[int(n)], '{} {}'.format(f.get('code'), f.get('message')))
+            elif f.get('code') != 412 or retries == 0:
+                with self.lock:
+                    self.failed[batch[int(n)]['key']] = f.get('message')
+
+        if len(conflicts) > 0 and retries > 0:
+            with self.lock:
+                self.conflicts += len(conflicts)
+            keys = ','.join(batch[int(n)]['key'] for n in conflicts)
+            try:
+                current = {i['key']: i['data'] for i in zot.items(itemKey=keys, limit=len(conflicts))}
+            except REQUEST_ERRORS as e:
+                self.fail([batch[int(n)] for n in conflicts], e)
+                return
+            rebased, rebased_seqs, rebased_bases = [], [], []
+            for n in conflicts:
+                update, base = batch[int(n)], bases[int(n)]
+                if update['key'] not in current:
+                    self.reject(update, seqs[int(n)], 'item not found')
+                    continue
+                changed = self.changed(update, current[update['key']], base)
+                if len(changed) > 0:
+                    self.reject(update, seqs[int(n)], 'changed meanwhile: {}'.format(', '.join(changed)))
+                    continue
+                rebased.append(self.rebase(update, current[update['key']], base))
+                rebased_seqs.append(seqs[int(n)])
+                rebased_bases.append(base)
+            if len(rebased) > 0:
+                self.write(rebased, rebased_seqs, rebased_bases, retries - 1)
+
+    def fail(self, batch, error):
+        """
+        Records updates of a failed request, their journal entries stay
+        pending so they are resumed.
+        """
+        with self.lock:
+            for update in batch:
+                self.failed[update['key']] = str(error) or type(error).__name__
+
+    def reject(self, update, seqs, error):
+        """
+        Records an update zotero rejected for good, its journal entries are
+        tombstoned with the error so they are not resumed.
+        """
+        with self.lock:
+            self.rejected[update['key']] = error
+        if self.journal is not None:
+            self.journal.reject(seqs, error)
+
+    def flush(self):
+        """
+        Writes all queued updates and waits for all requests to finish.
+        """
+        with self.lock:
+            updates = list(self.pending.values())
+            seqs = [self.seqs.pop(k, []) for k in self.pending]
+            bases = [self.bases.pop(k, None) for k in self.pending]
+            self.pending = dict()
+        for n in range(0, len(updates), self.batch_size):
+            self.submit(updates[n:n + self.batch_size], seqs[n:n + self.batch_size],
+                        bases[n:n + self.batch_size])
+
+        with self.lock:
+            futures = self.futures
+            self.futures = set()
+        for f in cf.as_completed(futures):
+            f.result()
+        self.finished = time.perf_counter()
+
+    def close(self):
+        """
+        Flushes the queue and stops the workers.
+        """
+        try:
+            self.flush()
+        finally:
+            self.pool.shutdown()
+
+    def report(self):
+        """
+        Returns:
+            summary of written items, requests, conflicts and throughput
+        """
+        elapsed = (self.finished or time.perf_counter()) - (self.started or time.perf_counter())
+        rate = self.written / elapsed if elapsed > 0 else 0
+        report = '{} items updated in {} requests ({:.1f} items/s), {} conflicts rebased'.format(
+            self.written, self.requests, rate, self.conflicts)
+        if len(self.failed) > 0:
+            report += ', {} failed, resume to retry: {}'.format(len(self.failed), self.failed)
+        if len(self.rejected) > 0:
+            report += ', {} rejected: {}'.format(len(self.rejected), self.rejected)
+        return report
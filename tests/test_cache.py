@@ -0,0 +1,55 @@
+import pytest
+from src.db import ZoteroDatabase
+from src.cache import ItemCache
+
+@pytest.fixture
+def db(tmp_path):
+    db = ZoteroDatabase(cache_path=str(tmp_path / 'cache.sqlite'))
+    yield db
+    db.close_connection()
+
+def test_covers():
+    cache = ItemCache(':memory:')
+    assert cache.covers('-note || attachment')
+    assert cache.covers('journalArticle')
+    assert not cache.covers('')
+    assert not cache.covers('-note')
+    assert not cache.covers('note || book')
+
+def test_refresh(db):
+    updated, purged = db.item_cache.refresh(db)
+    assert updated > 0
+    assert purged == 0
+    # unchanged library, nothing to do
+    assert db.item_cache.refresh(db) == (0, 0)
+    db.item_cache.db_stat = None
+    assert db.item_cache.refresh(db) == (0, 0)
+
+def test_refresh_items_batches(db):
+    cursor = db.cursor.connection.cursor()
+    updated, purged = db.item_cache.refresh_items(db, cursor, force=True, batch_size=7)
+    cursor.close()
+    assert updated > 7
+    assert updated == db.item_cache.conn.execute("SELECT COUNT(*) FROM items;").fetchone()[0]
+
+def test_get_items(db):
+    items = db.get_items()
+    uncached = db.get_items(local_cursor=db.cursor)
+    assert sorted(items, key=lambda i: i['key']) == sorted(uncached, key=lambda i: i['key'])
+
+    items = db.get_items(keys=['XXLF2GYS', 'JTWSQKIS'])
+    assert {i['key'] for i in items} == {'XXLF2GYS', 'JTWSQKIS'}
+    assert len(db.get_items(limit=3)) == 3
+
+def test_get_items_tags(db):
+    tags = db.get_autocomplete_tags()
+    tag = next(t for t in tags if t != 'none')
+
+    items = db.get_items(tags=[tag])
+    assert sorted(i['key'] for i in items) == sorted(tags[tag])
+    items = db.get_items(tags=['-' + tag])
+    assert not set(i['key'] for i in items) & set(tags[tag])
+    # empty filters, e.g. of a trailing ' && ', do not filter
+    items = db.get_items(tags=[tag, ''])
+    assert sorted(i['key'] for i in items) == sorted(tags[tag])
+    assert sorted(db.get_keys(tags=[tag, ''])) == sorted(tags[tag])
@@ -0,0 +1,68 @@
+import json
+import time
+import pytest
+from src.citations import CitationCache, EMPTY_BATCH_TTL, normalize_doi
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = CitationCache(str(tmp_path / 'citations.sqlite'))
+    yield cache
+    cache.close()
+
+def test_normalize_doi():
+    assert normalize_doi(' https://doi.org/10.1000/ABC ') == '10.1000/abc'
+    assert normalize_doi('doi:10.1000/abc') == '10.1000/abc'
+
+def test_store_lookup(cache):
+    assert cache.lookup('references', '10.1/A') == (None, None)
+    records = [{'citing': '10.1/a', 'cited': '10.1/b'}]
+    assert cache.store('references', '10.1/A', None, 200, json.dumps(records), {'ETag': '"v1"'}) == records
+    # answered from the cache, keyed by the normalized DOI
+    assert cache.lookup('references', '10.1/a')[0] == records
+    assert cache.stats['hits'] == 1
+
+def test_revalidate(cache):
+    cache.store('references', '10.1/a', None, 200, json.dumps([{'cited': '10.1/b'}]), {'ETag': '"v1"'})
+    cache.ttl = 0
+    records, cached = cache.lookup('references', '10.1/a')
+    assert records is None
+    assert cache.conditional_headers(cached) == {'If-None-Match': '"v1"'}
+    assert cache.store('references', '10.1/a', cached, 304) == [{'cited': '10.1/b'}]
+    assert cache.stats['revalidated'] == 1
+
+def test_not_found_and_errors(cache):
+    assert cache.store('references', '10.1/a', None, 404) == []
+    assert cache.get('references', '10.1/a')['status'] == 404
+    with pytest.warns(UserWarning):
+        assert cache.store('citations', '10.1/a', None, 500) == []
+    # server errors are not cached
+    assert cache.get('citations', '10.1/a') is None
+
+def test_offline(cache):
+    cache.put('references', '10.1/a', 200, json.dumps([{'cited': '10.1/b'}]), fetched=0)
+    cache.offline = True
+    assert cache.lookup('references', '10.1/a')[0] == [{'cited': '10.1/b'}]
+    assert cache.lookup('references', '10.1/x')[0] == []
+    assert cache.stats['missing'] == 1
+
+def test_store_batch(cache):
+    references = [{'citing': '10.1/A', 'cited': '10.1/x'}, {'citing': '10.1/b', 'cited': '10.1/y'},
+                  {'citing': 'omid:br/1 doi:10.1/b', 'cited': '10.1/z'}]
+    batch = cache.store_batch('references', ['10.1/a', '10.1/b', '10.1/c'], 200, json.dumps(references))
+    assert [len(batch[d]) for d in ['10.1/a', '10.1/b', '10.1/c']] == [1, 2, 0]
+    assert cache.relations({'references': batch['10.1/b'], 'citations': []}) == \
+        {'citing': ['10.1/y', '10.1/z'], 'cited_by': []}
+    assert cache.store_batch('references', ['10.1/a', '10.1/b'], 500) is None
+    assert cache.store_batch('references', ['10.1/a', '10.1/b'], 200, 'invalid') is None
+
+def test_store_batch_empty(cache):
+    # a response without records of the batch is not cached
+    assert cache.store_batch('references', ['10.1/a', '10.1/b'], 200, json.dumps([])) is None
+    assert cache.get('references', '10.1/a') is None
+    # DOIs left out of a response expire after EMPTY_BATCH_TTL
+    references = [{'citing': '10.1/a', 'cited': '10.1/x'}]
+    cache.store_batch('references', ['10.1/a', '10.1/b'], 200, json.dumps(references))
+    assert cache.is_fresh(cache.get('references', '10.1/a'))
+    empty = cache.get('references', '10.1/b')
+    assert cache.is_fresh(empty)
+    assert empty['fetched'] + cache.ttl - time.time() <= EMPTY_BATCH_TTL
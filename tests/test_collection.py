@@ -0,0 +1,48 @@
+import pytest
+from src.db import ZoteroDatabase
+from src.collection import CollectionIndex
+
+@pytest.fixture
+def index():
+    collections = [('A', 'papers', None), ('B', 'reviews', 'A'), ('C', 'old', 'B'),
+                   ('D', 'papers', None), ('E', 'misc', None)]
+    memberships = [('A', 'K1'), ('B', 'K2'), ('C', 'K3'), ('C', 'K1'), ('D', 'K4')]
+    return CollectionIndex(collections, memberships)
+
+def test_get_keys(index):
+    assert index.get_keys('B') == ['K2']
+    assert index.get_keys('B', recursive=True) == ['K1', 'K2', 'K3']
+    assert index.get_keys('A', recursive=True) == ['K1', 'K2', 'K3']
+    assert index.get_keys('E', recursive=True) == []
+    assert index.get_keys('unknown') == []
+
+def test_duplicate_names(index):
+    assert index.resolve('papers') == ['A', 'D']
+    assert index.get_keys('papers') == ['K1', 'K4']
+    assert index.get_keys('papers', recursive=True) == ['K1', 'K2', 'K3', 'K4']
+    assert index.get_names() == ['misc', 'old', 'papers', 'reviews']
+
+def test_descendants(index):
+    assert index.descendants['A'] == {'A', 'B', 'C'}
+    assert index.descendants['C'] == {'C'}
+
+def test_deep_tree():
+    n = 2000
+    collections = [(str(k), 'c%d' % k, str(k - 1) if k > 0 else None) for k in range(n)]
+    memberships = [(str(k), 'K%d' % k) for k in range(n)]
+    index = CollectionIndex(collections, memberships)
+    assert len(index.get_keys('c0', recursive=True)) == n
+    assert index.get_keys(str(n - 1), recursive=True) == ['K%d' % (n - 1)]
+
+def test_cycle():
+    index = CollectionIndex([('A', 'a', 'B'), ('B', 'b', 'A')], [('A', 'K1'), ('B', 'K2')])
+    assert len(index) == 2
+    assert set(index.get_keys('a', recursive=True)) <= {'K1', 'K2'}
+
+def test_get_collection_index():
+    db = ZoteroDatabase()
+    index = db.get_collection_index()
+    keys = {i['key'] for i in db.get_items()}
+    for name in index.get_names():
+        assert set(index.get_keys(name)) <= set(index.get_keys(name, recursive=True)) <= keys
+    db.close_connection()
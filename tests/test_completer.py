@@ -0,0 +1,40 @@
+import pytest
+from prompt_toolkit.document import Document
+from prompt_toolkit.completion import CompleteEvent
+from src.completer import PaperCompleter
+
+@pytest.fixture
+def completer():
+    return PaperCompleter(['smith2020 - Deep learning of graphs',
+                           'smith2021 - Graph neural networks',
+                           'müller2019 - Shallow water equations',
+                           'jones2018 - Learning to learn'], max_results=3)
+
+def complete(completer, text):
+    return [c.text for c in completer.get_completions(Document(text), CompleteEvent())]
+
+def test_prefix(completer):
+    assert complete(completer, 'smith') == ['smith2020 - Deep learning of graphs',
+                                            'smith2021 - Graph neural networks']
+    assert complete(completer, 'SMITH2021') == ['smith2021 - Graph neural networks']
+    assert complete(completer, 'mü') == ['müller2019 - Shallow water equations']
+
+def test_tokens(completer):
+    assert complete(completer, 'graph') == ['smith2021 - Graph neural networks',
+                                            'smith2020 - Deep learning of graphs']
+    assert complete(completer, 'deep gra') == ['smith2020 - Deep learning of graphs']
+    assert complete(completer, 'water shal') == ['müller2019 - Shallow water equations']
+    assert complete(completer, 'quantum') == []
+
+def test_tokens_inside_words():
+    completer = PaperCompleter(['a2020 - Quantum dots', 'b2020 - Ant colonies', 'c2020 - Quantum ants'])
+    # 'ant' is inside 'quantum' but starts no word of the first entry
+    assert complete(completer, 'quantum ant') == ['c2020 - Quantum ants']
+
+def test_max_results(completer):
+    assert len(complete(completer, '')) == 3
+    assert len(complete(completer, 'learn')) == 2
+
+def test_start_position(completer):
+    completions = list(completer.get_completions(Document('deep gra'), CompleteEvent()))
+    assert completions[0].start_position == -len('deep gra')
@@ -11,36 +11,75 @@ def test_connect(db):
     assert isinstance(db.connect(), Cursor)
     db.close_connection()
 
+def test_get_fields(db):
+    fields = db.get_fields()
+    assert 'title' in fields.values()
+    assert 'DOI' in fields.values()
+    assert db.get_fields() is fields
+
 def test_build_sql(db):
     sql = "SELECT"
     keys = ['a', 'b']
-    parent_keys = ['c', 'd']
+    parent_keys = ['c', 'd', 'e']
     item_type = 'book || note'
     limit = 10
     groupby = ['e', 'f']
 
     sql_out = """SELECT
-AND i.key IN ('a','b')
-AND pi.key IN ('c','d')
-AND it.typeName IN ('book','note')
+AND i.libraryID IN (SELECT libraryID FROM libraries)
+AND i.key IN (?,?)
+AND pi.libraryID IN (SELECT libraryID FROM libraries)
+AND pi.key IN (?,?,?,?)
+AND it.typeName IN (?,?)
 GROUP BY e,f
-LIMIT 10;"""
+LIMIT ?;"""
+    params_out = ['a', 'b', 'c', 'd', 'e', 'e', 'book', 'note', 10]
 
-    assert sql_out == db.build_sql(sql, keys=keys, parent_keys=parent_keys,
-                                    item_type=item_type, limit=limit,
-                                    groupby=groupby)
+    assert (sql_out, params_out) == db.build_sql(sql, keys=keys, parent_keys=parent_keys,
+                                                 item_type=item_type, limit=limit,
+                                                 groupby=groupby)
 
 def test_build_sql_item_type(db):
     sql = "SELECT"
     item_type = '-journalArticle || book'
 
     sql_out = """SELECT
-AND it.typeName NOT IN ('journalArticle','book');"""
+AND it.typeName NOT IN (?,?);"""
+
+    assert (sql_out, ['journalArticle', 'book']) == db.build_sql(sql, item_type=item_type)
+
+def test_build_sql_many_keys(db):
+    sql = "SELECT"
+    keys = ['K{:07d}'.format(n) for n in range(1000)]
+
+    sql_out = """SELECT
+AND i.libraryID IN (SELECT libraryID FROM libraries)
+AND i.key IN (SELECT key FROM temp.filter_keys WHERE slot = ?);"""
 
-    assert sql_out == db.build_sql(sql, item_type=item_type)
+    assert (sql_out, ['keys']) == db.build_sql(sql, keys=keys)
+    db.cursor.execute("SELECT COUNT(*) FROM temp.filter_keys WHERE slot = 'keys';")
+    assert db.cursor.fetchone()[0] == len(keys)
 
 def test_build_sql_tags(db):
-    pass
+    sql = "SELECT"
+    tags = ['a || b', '-c']
+
+    sql_out, params = db.build_sql(sql, tags=tags)
+    assert sql_out.count("\nAND i.itemID IN (SELECT ftg.itemID") == 1
+    assert sql_out.count("\nAND i.itemID NOT IN (SELECT ftg.itemID") == 1
+    assert params == ['a', 'b', 'c']
+
+    sql_out, params = db.build_sql(sql, tags=['', 'a'])
+    assert sql_out.count("\nAND i.itemID IN (SELECT ftg.itemID") == 1
+    assert params == ['a']
+
+def test_get_items_tags(db):
+    keys = ['XXLF2GYS', 'JTWSQKIS', '4SDR5E5R', 'UYJJPTXG']
+
+    items = db.get_items(keys=keys, tags=['# important'])
+    assert [i['key'] for i in items] == ['XXLF2GYS']
+    items = db.get_items(keys=keys, tags=['-# important'])
+    assert 'XXLF2GYS' not in [i['key'] for i in items]
 
 def test_get_items_remote():
     db = ZoteroDatabase(local=False)
@@ -71,8 +110,27 @@ def test_attachments_remote():
 def test_get_items_local(db):
     pass
 
+def test_iter_items(db):
+    keys = ['XXLF2GYS', 'JTWSQKIS', '4SDR5E5R', 'UYJJPTXG']
+    items = db.iter_items(keys=keys, item_type='journalArticle')
+    assert not isinstance(items, list)
+    assert [i['key'] for i in items] == ['XXLF2GYS']
+
+def test_iter_notes(db):
+    keys = ['XXLF2GYS', 'JTWSQKIS', '4SDR5E5R', 'UYJJPTXG']
+    assert [i['key'] for i in db.iter_notes(keys=keys)] == ['4SDR5E5R']
+
+def test_iter_attachments(db):
+    keys = ['XXLF2GYS', 'JTWSQKIS', '4SDR5E5R', 'UYJJPTXG']
+    assert [i['key'] for i in db.iter_attachments(keys=keys)] == ['JTWSQKIS']
+
 def test_get_items_local_cache(db):
-    pass
+    keys = ['XXLF2GYS', 'JTWSQKIS', '4SDR5E5R', 'UYJJPTXG']
+    item_type = 'journalArticle'
+
+    items = db.get_items(keys=keys, item_type=item_type, use_cache=True)
+    assert [i['key'] for i in items] == ['XXLF2GYS']
+    assert items == db.get_items(keys='XXLF2GYS', use_cache=True)
 
 def test_get_notes_local(db):
     pass
@@ -80,6 +138,19 @@ def test_get_notes_local(db):
 def test_get_attachments_local(db):
     pass
 
+def test_hydrate_items_local(db):
+    keys = ['XXLF2GYS', 'JTWSQKIS', '4SDR5E5R', 'UYJJPTXG']
+    item_type = 'journalArticle'
+
+    items = db.hydrate_items_local(keys=keys, item_type=item_type)
+    assert len(items) == 1
+    assert items[0]['key'] == 'XXLF2GYS'
+
+    data = db.get_items_data_local(keys=keys, item_type=item_type)[0]
+    creators = db.get_items_creators_local(keys=keys, item_type=item_type)
+    assert all(items[0][k] == v for k, v in data.items())
+    assert items[0].get('creators') == creators.get('XXLF2GYS')
+
 def test_get_items_data_local(db):
     keys = ['XXLF2GYS', 'JTWSQKIS', '4SDR5E5R', 'UYJJPTXG']
     item_type = 'journalArticle'
@@ -126,7 +197,8 @@ def test_get_autocompletes(db):
     assert ac_dict['2B3ZWD3G'] == "Creutzig, 2016 - Beyond Technology"
 
 def test_get_autocomplete_tags(db):
-    pass
+    tags_dict = db.get_autocomplete_tags()
+    assert 'XXLF2GYS' in tags_dict['# important']
     db.get_items_tags_local()
 
 def test_create_attachment(db):
@@ -1,4 +1,7 @@
 import pytest
+import json
+import asyncio
+import threading
 from src.dispatcher import Dispatcher
 
 @pytest.fixture
@@ -26,6 +29,13 @@ def test_dispatch(d):
 def test_execute_find(d):
     pass
 
+def test_search_invalid_syntax(d, tmp_path, monkeypatch, capsys):
+    monkeypatch.setenv('PAPIERMACHE_SEARCH_PATH', str(tmp_path / 'search.sqlite'))
+    item = d.db.get_items(limit=1)[0]
+    word = item['title'].split()[0]
+    assert item['key'] in [k for k, _ in d.search('{} ('.format(word), limit=1000)]
+    assert 'searching for the words instead' in capsys.readouterr().out
+
 def test_execute_select(d):
     pass
 
@@ -35,6 +45,19 @@ def test_execute_add_relations(d):
 def test_execute_add_pdf(d):
     pass
 
+def test_execute_add_link_current_children(d, capsys):
+    parent = next(p for p, c in d.db.get_children().items()
+                  if [t for _, t in c].count('application/pdf') == 1)
+    d.selected_keys = [next(k for k in d.papers if k != parent)]
+
+    class Zotero():
+        # a second pdf added in this session, not synced to the local database
+        def children(self, key):
+            return [{'key': 'NEWPDF01', 'data': {'contentType': 'application/pdf'}}]
+    d.db.zot = Zotero()
+    d.execute_add_link(d.papers[parent].split(' ') + ['3'])
+    assert 'Multiple pdfs found' in capsys.readouterr().out
+
 def test_execute_backup(d):
     pass
 
@@ -44,8 +67,109 @@ def test_download_file(d):
 def test_select_keys(d):
     pass
 
+def test_select_keys_tag_expression(d):
+    a, b = list(d.tags)[:2]
+    keys = d.select_keys(['tags'] + '{} || {}'.format(a, b).split(' '))
+    assert sorted(keys) == sorted(set(d.tags[a]) | set(d.tags[b]))
+
 def test_get_relations_by_doi(d):
     pass
 
 def test_item_add_relations(d):
     pass
+
+def test_warm_up():
+    d = Dispatcher(session=None, background=True)
+    d.wait_ready()
+    assert d.ready.is_set()
+    assert len(d.papers) > 0
+    assert d.papers_reverse[next(iter(d.papers.values()))] == next(iter(d.papers))
+    assert d.completer.get_completer() is d.index_completer
+
+def test_execute_suggest(tmp_path, monkeypatch):
+    monkeypatch.setenv('PAPIERMACHE_CITATIONS_PATH', str(tmp_path / 'citations.sqlite'))
+    monkeypatch.setenv('PAPIERMACHE_GRAPH_PATH', str(tmp_path / 'graph.npz'))
+    d = Dispatcher(session=None)
+    doi, key = next(iter(d.dois.items()))
+    other = next(k for k in d.dois if k != doi)
+    records = [{'citing': doi, 'cited': '10.9999/missing'}, {'citing': doi, 'cited': other}]
+    d.get_citation_cache().put('references', doi, 200, json.dumps(records))
+    d.selected_keys = [key]
+    assert [s['doi'] for s in d.execute_suggest(['-n', '5'])] == ['10.9999/missing']
+
+def serve(handler):
+    """
+    Runs a local web server answering every GET with handler in a thread.
+
+    Returns:
+        base URL of the server and a function stopping it
+    """
+    from aiohttp import web
+    loop = asyncio.new_event_loop()
+    app = web.Application()
+    app.router.add_get('/{path:.+}', handler)
+    runner = web.AppRunner(app)
+    loop.run_until_complete(runner.setup())
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    loop.run_until_complete(site.start())
+    port = site._server.sockets[0].getsockname()[1]
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+
+    def stop():
+        asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+    return 'http://127.0.0.1:{}'.format(port), stop
+
+def test_execute_add_relations_in_event_loop(tmp_path, monkeypatch):
+    from aiohttp import web
+    monkeypatch.setenv('PAPIERMACHE_CITATIONS_PATH', str(tmp_path / 'citations.sqlite'))
+    monkeypatch.setenv('PAPIERMACHE_GRAPH_PATH', str(tmp_path / 'graph.npz'))
+    requested = []
+
+    async def handler(request):
+        requested.append(request.path)
+        # a record of the first DOI shows the batch was answered
+        _, endpoint, dois = request.path.split('/', 2)
+        owner, other = ('citing', 'cited') if endpoint == 'references' else ('cited', 'citing')
+        return web.json_response([{owner: dois.split('__')[0], other: '10.1/x'}])
+
+    url, stop = serve(handler)
+    d = Dispatcher(session=None)
+    d.get_citation_cache().url = lambda endpoint, doi: '{}/{}/{}'.format(url, endpoint, doi)
+    d.selected_keys = list(d.dois.values())[:3]
+
+    # commands are executed from the prompt loop of cli.py
+    async def main():
+        d.execute_add_relations([])
+    try:
+        asyncio.run(main())
+    finally:
+        stop()
+    assert len(requested) == 2
+    assert d.get_citation_cache().stale(list(d.dois)[:3]) == []
+
+def test_execute_add_relations_fetched(tmp_path, monkeypatch):
+    from aiohttp import web
+    monkeypatch.setenv('PAPIERMACHE_CITATIONS_PATH', str(tmp_path / 'citations.sqlite'))
+    monkeypatch.setenv('PAPIERMACHE_GRAPH_PATH', str(tmp_path / 'graph.npz'))
+    d = Dispatcher(session=None)
+    doi, other = list(d.dois)[:2]
+
+    async def handler(request):
+        if request.path.startswith('/references'):
+            return web.json_response([{'citing': doi, 'cited': other}])
+        return web.json_response([])
+
+    url, stop = serve(handler)
+    d.get_citation_cache().url = lambda endpoint, doi: '{}/{}/{}'.format(url, endpoint, doi)
+    d.selected_keys = [d.dois[doi]]
+    relations = []
+    monkeypatch.setattr(d, 'get_item_relations', lambda item, dois, rel: relations.append(rel))
+    try:
+        d.execute_add_relations([])
+    finally:
+        stop()
+    # updates are built from the citations fetched by the pipeline
+    assert relations == [{'citing': [other.lower()], 'cited_by': []}]
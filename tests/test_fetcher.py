@@ -0,0 +1,113 @@
+import time
+import json
+import asyncio
+import threading
+import pytest
+from aiohttp import web
+from src.citations import CitationCache
+from src.fetcher import RelationFetcher, TokenBucket
+
+REFERENCES = {'10.1/a': [{'citing': '10.1/a', 'cited': '10.1/x'}], '10.1/b': [{'citing': '10.1/b', 'cited': '10.1/y'}]}
+CITATIONS = {'10.1/a': [{'citing': '10.1/w', 'cited': '10.1/a'}]}
+
+class Server():
+    """
+    Local OpenCitations answering joined DOIs, failing with the statuses in
+    failures first.
+    """
+    def __init__(self, failures=[], batches=True):
+        self.failures = list(failures)
+        self.batches = batches
+        self.requests = []
+
+    async def handle(self, request):
+        endpoint, dois = request.match_info['endpoint'], request.match_info['dois']
+        self.requests.append(dois)
+        if self.failures:
+            return web.Response(status=self.failures.pop(0))
+        if '__' in dois and not self.batches:
+            return web.Response(status=400)
+        records = REFERENCES if endpoint == 'references' else CITATIONS
+        return web.json_response([r for d in dois.split('__') for r in records.get(d, [])])
+
+    async def run(self, fetcher, batches, task=None):
+        app = web.Application()
+        app.router.add_get('/{endpoint}/{dois:.+}', self.handle)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        fetcher.cache.url = lambda endpoint, doi: 'http://127.0.0.1:{}/{}/{}'.format(port, endpoint, doi)
+        results = dict()
+        try:
+            if task is not None:
+                return await task
+            await fetcher.process(batches, lambda batch, relations: results.update(relations))
+        finally:
+            await runner.cleanup()
+        return results
+
+@pytest.fixture
+def fetcher(tmp_path):
+    cache = CitationCache(str(tmp_path / 'citations.sqlite'))
+    fetcher = RelationFetcher(cache, rate=1000, concurrency=4, retries=2)
+    fetcher.backoff = lambda attempt, retry_after=None: 0
+    yield fetcher
+    cache.close()
+
+def test_token_bucket():
+    async def acquire(n):
+        bucket = TokenBucket(rate=50)
+        for _ in range(n):
+            await bucket.acquire()
+    start = time.monotonic()
+    asyncio.run(acquire(11))
+    assert time.monotonic() - start >= 0.19
+
+def test_batches(fetcher):
+    server = Server()
+    relations = asyncio.run(server.run(fetcher, [['10.1/a', '10.1/B', '10.1/c'], ['10.1/d']]))
+    assert relations['10.1/a'] == {'citing': ['10.1/x'], 'cited_by': ['10.1/w']}
+    assert relations['10.1/b'] == {'citing': ['10.1/y'], 'cited_by': []}
+    assert relations['10.1/c'] == {'citing': [], 'cited_by': []}
+    # one request per endpoint and batch
+    assert len(server.requests) == 4
+    # all cached now
+    server.requests = []
+    asyncio.run(server.run(fetcher, [['10.1/a', '10.1/b']]))
+    assert server.requests == []
+
+def test_relations(fetcher):
+    server = Server()
+    async def relations(dois):
+        # relations blocks, the server keeps answering on this loop
+        return await asyncio.get_running_loop().run_in_executor(None, fetcher.relations, dois)
+    results = asyncio.run(server.run(fetcher, [], relations(['10.1/A'])))
+    assert results == {'10.1/a': {'citing': ['10.1/x'], 'cited_by': ['10.1/w']}}
+
+def test_retry(fetcher):
+    server = Server(failures=[429, 503])
+    relations = asyncio.run(server.run(fetcher, [['10.1/a']]))
+    assert relations['10.1/a'] == {'citing': ['10.1/x'], 'cited_by': ['10.1/w']}
+    assert len(server.requests) == 4
+
+def test_fallback(fetcher):
+    server = Server(batches=False)
+    relations = asyncio.run(server.run(fetcher, [['10.1/a', '10.1/b']]))
+    assert relations['10.1/b'] == {'citing': ['10.1/y'], 'cited_by': []}
+    # a failed batch per endpoint, then one request per DOI
+    assert len(server.requests) == 6
+    assert fetcher.cache.get('references', '10.1/a')['status'] == 200
+
+def test_batches_read_off_loop(fetcher):
+    threads = set()
+    def batches():
+        # e.g. items read from a database
+        for doi in ['10.1/a', '10.1/b']:
+            threads.add(threading.get_ident())
+            yield [doi]
+        threads.add(threading.get_ident())
+    relations = asyncio.run(Server().run(fetcher, batches()))
+    assert sorted(relations) == ['10.1/a', '10.1/b']
+    assert threading.get_ident() not in threads
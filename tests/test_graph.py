@@ -0,0 +1,59 @@
+import json
+import pytest
+from src.citations import CitationCache
+from src.graph import CitationGraph
+
+# p1 and p2 both cite a and b, p3 cites b and c
+EDGES = [('p1', 'a'), ('p1', 'b'), ('p2', 'a'), ('p2', 'b'), ('p3', 'b'), ('p3', 'c')]
+
+@pytest.fixture
+def graph():
+    return CitationGraph.from_edges(EDGES)
+
+def test_neighbors(graph):
+    assert len(graph) == 6
+    assert graph.count_edges() == 6
+    assert graph.references('p1') == ['a', 'b']
+    assert graph.citations('b') == ['p1', 'p2', 'p3']
+    assert graph.relations('unknown') == {'citing': [], 'cited_by': []}
+
+def test_co_citations(graph):
+    assert graph.co_citations('a') == [('b', 2)]
+    assert graph.co_citations('b') == [('a', 2), ('c', 1)]
+    assert graph.co_citations('b', limit=1) == [('a', 2)]
+    assert graph.co_citations('p1') == []
+
+def test_coupling(graph):
+    assert graph.coupling('p1') == [('p2', 2), ('p3', 1)]
+    assert graph.coupling('a') == []
+
+def test_build(tmp_path):
+    cache = CitationCache(str(tmp_path / 'citations.sqlite'))
+    path = str(tmp_path / 'graph.npz')
+    cache.put('references', '10.1/A', 200, json.dumps([{'citing': '10.1/a', 'cited': 'omid:br/1 doi:10.1/X'}]))
+    cache.put('citations', '10.1/a', 200, json.dumps([{'citing': '10.1/y', 'cited': '10.1/a'}]))
+    graph = CitationGraph.build(cache, path)
+    assert graph.relations('10.1/a') == {'citing': ['10.1/x'], 'cited_by': ['10.1/y']}
+
+    # unchanged edges are loaded, changed edges compacted again
+    assert CitationGraph.load(path, cache.edges_version()).dois == graph.dois
+    cache.put('references', '10.1/a', 404)
+    assert CitationGraph.load(path, cache.edges_version()) is None
+    assert CitationGraph.build(cache, path).references('10.1/a') == []
+    cache.close()
+
+def test_suggest(graph):
+    # p1 and p2 cite a twice, p3 cites b and c
+    suggestions = graph.suggest(['p1', 'p2', 'p3'], exclude=['b'])
+    assert [s['doi'] for s in suggestions] == ['a', 'c']
+    assert suggestions[0] == {'doi': 'a', 'cited_by': 2, 'citing': 0, 'coupling': 0}
+    assert graph.suggest(['p1', 'p2', 'p3'], limit=1)[0]['doi'] == 'b'
+    # papers citing the selection, ranked by shared references on ties
+    assert [s['doi'] for s in graph.suggest(['a'])] == ['p1', 'p2']
+    assert graph.suggest(['unknown']) == []
+
+def test_suggest_coupling():
+    # r and s cite p1 and share two and one of its references
+    graph = CitationGraph.from_edges(EDGES + [('r', 'p1'), ('r', 'a'), ('r', 'b'), ('s', 'p1'), ('s', 'a')])
+    suggestions = graph.suggest(['p1'])
+    assert [(s['doi'], s['coupling']) for s in suggestions] == [('r', 2), ('s', 1), ('a', 0), ('b', 0)]
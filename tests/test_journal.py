@@ -0,0 +1,53 @@
+import pytest
+from src.journal import Journal
+
+@pytest.fixture
+def journal(tmp_path):
+    journal = Journal(str(tmp_path / 'journal.jsonl'))
+    yield journal
+    journal.close()
+
+def test_append_ack(journal):
+    seqs = [journal.append({'key': k, 'version': 1}) for k in ['A', 'B', 'C']]
+    journal.ack(seqs[:2])
+
+    assert journal.pending() == {seqs[2]: {'key': 'C', 'version': 1}}
+
+def test_reopen(journal):
+    seq = journal.append({'key': 'A', 'version': 1})
+    journal.close()
+
+    # torn last line of a crashed process
+    with open(journal.path, 'a') as f:
+        f.write('{"seq": ')
+    reopened = Journal(journal.path)
+    assert reopened.pending() == {seq: {'key': 'A', 'version': 1}}
+    assert reopened.append({'key': 'B', 'version': 1}) == seq + 1
+    reopened.close()
+
+def test_reject(journal):
+    seqs = [journal.append({'key': k, 'version': 1}) for k in ['A', 'B']]
+    journal.reject(seqs[1:], '403 forbidden')
+
+    assert journal.pending() == {seqs[0]: {'key': 'A', 'version': 1}}
+    assert journal.rejected() == {seqs[1]: ({'key': 'B', 'version': 1}, '403 forbidden')}
+    journal.compact()
+    assert journal.rejected() == {seqs[1]: ({'key': 'B', 'version': 1}, '403 forbidden')}
+
+def test_compact(journal):
+    seqs = [journal.append({'key': k, 'version': 1}) for k in ['A', 'B']]
+    journal.ack(seqs[:1])
+    journal.compact()
+    journal.ack(seqs[1:])
+
+    assert journal.pending() == {}
+    assert journal.append({'key': 'C', 'version': 1}) == seqs[1] + 1
+
+def test_bases(journal):
+    seqs = [journal.append({'key': 'A', 'version': 1, 'title': 'b'}, {'title': 'a'}),
+            journal.append({'key': 'B', 'version': 1})]
+    journal.compact()
+
+    assert journal.bases() == {seqs[0]: {'title': 'a'}}
+    journal.ack(seqs[:1])
+    assert journal.bases() == {}
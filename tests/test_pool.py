@@ -0,0 +1,39 @@
+import os
+import pytest
+from sqlite3 import Cursor, OperationalError
+from src.pool import ConnectionPool
+
+@pytest.fixture
+def pool():
+    pool = ConnectionPool(os.environ['ZOTERO_DB_PATH'], size=2)
+    yield pool
+    pool.close()
+
+def test_open_read_only(pool):
+    conn = pool.open()
+    with pytest.raises(OperationalError):
+        conn.execute("UPDATE items SET synced = synced;")
+    conn.close()
+
+def test_cursor(pool):
+    with pool.cursor() as cursor:
+        assert isinstance(cursor, Cursor)
+        cursor.execute("SELECT COUNT(*) FROM items;")
+        assert cursor.fetchone()[0] > 0
+
+def test_acquire_release(pool):
+    conns = [pool.acquire() for _ in range(pool.size)]
+    assert len(set(map(id, conns))) == pool.size
+    for conn in conns:
+        pool.release(conn)
+    assert pool.acquire() in conns
+
+def test_snapshot():
+    pool = ConnectionPool(os.environ['ZOTERO_DB_PATH'], snapshot=True)
+    with pool.cursor() as cursor:
+        cursor.execute("SELECT COUNT(*) FROM items;")
+        assert cursor.fetchone()[0] > 0
+    snapshot_path = pool.snapshot_path
+    assert os.path.isfile(snapshot_path)
+    pool.close()
+    assert not os.path.exists(snapshot_path)
@@ -0,0 +1,44 @@
+import json
+import sqlite3
+import pytest
+from src.db import ZoteroDatabase
+from src.profiler import QueryProfiler
+
+@pytest.fixture
+def db():
+    db = ZoteroDatabase(profile=True)
+    yield db
+    db.close_connection()
+
+def test_fingerprint():
+    profiler = QueryProfiler()
+    assert profiler.fingerprint("SELECT *\n  FROM items WHERE key IN (?,?, ?)") == \
+        "SELECT * FROM items WHERE key IN (?+)"
+
+def test_report(db, tmp_path):
+    items = db.get_items(limit=5)
+    report = db.profiler.report()
+
+    stat = next(s for s in report if s['sql'].startswith('WITH sel AS'))
+    assert stat['calls'] == 1
+    assert stat['params'] == 3
+    assert stat['rows'] >= len(items)
+    assert stat['plan']
+
+    db.profiler.dump(str(tmp_path / 'report.json'))
+    with open(tmp_path / 'report.json') as f:
+        assert len(json.load(f)) == len(report)
+
+def test_connection_execute():
+    profiler = QueryProfiler()
+    conn = sqlite3.connect(':memory:', factory=profiler.connection_factory())
+    conn.execute("PRAGMA cache_size = -2000;")
+    conn.execute("CREATE TABLE t (a);")
+    conn.executemany("INSERT INTO t VALUES (?);", [(1,), (2,)])
+    assert conn.execute("SELECT a FROM t;").fetchall() == [(1,), (2,)]
+    conn.close()
+
+    stats = {s['sql']: s for s in profiler.report()}
+    assert set(stats) == {"PRAGMA cache_size = -2000;", "CREATE TABLE t (a);",
+                          "INSERT INTO t VALUES (?);", "SELECT a FROM t;"}
+    assert stats["SELECT a FROM t;"]['rows'] == 2
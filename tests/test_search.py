@@ -0,0 +1,139 @@
+import pytest
+from src.db import ZoteroDatabase
+from src.search import SearchIndex
+
+@pytest.fixture
+def db():
+    db = ZoteroDatabase()
+    yield db
+    db.close_connection()
+
+@pytest.fixture
+def index(tmp_path):
+    index = SearchIndex(str(tmp_path / 'search.sqlite'))
+    yield index
+    index.close()
+
+def test_build_query(index):
+    assert index.build_query('deep learn') == '"deep" "learn"*'
+    assert index.build_query('title:deep') == 'title:deep'
+    assert index.build_query('"deep learning"') == '"deep learning"'
+    assert index.build_query('  ') == ''
+
+def test_upsert(index):
+    items = [{'key': 'A', 'version': 1, 'title': 'Deep learning of graphs',
+              'creators': [{'firstName': 'Ada', 'lastName': 'Lovelace'}], 'tags': [{'tag': 'ml'}]},
+             {'key': 'B', 'version': 2, 'title': 'Shallow water', 'abstractNote': 'learning'}]
+    notes = {'B': [{'note': '<p>caf&eacute; notes</p>'}]}
+    assert index.upsert(items, notes) == 2
+    assert [k for k, _ in index.search('learning')] == ['A', 'B']
+    assert [k for k, _ in index.search('lovel')] == ['A']
+    assert [k for k, _ in index.search('cafe')] == ['B']
+    assert index.search('tags:ml')[0][0] == 'A'
+
+    items[0]['title'] = 'Graphs'
+    index.upsert(items[:1])
+    assert [k for k, _ in index.search('deep')] == []
+    assert index.delete(['B', 'C']) == 1
+    assert len(index) == 1
+
+def test_invalid_syntax(index):
+    items = [{'key': 'A', 'version': 1, 'title': 'COVID: a review'},
+             {'key': 'B', 'version': 1, 'title': 'Smith (2020) and others'}]
+    index.upsert(items)
+    assert index.build_query('a: (b', literal=True) == '"a:" "(b"*'
+    for query in ['COVID: review', 'Smith (2020)', 'AND']:
+        with pytest.raises(ValueError):
+            index.search(query)
+    assert [k for k, _ in index.search('COVID: review', literal=True)] == ['A']
+    assert [k for k, _ in index.search('Smith (2020)', literal=True)] == ['B']
+    assert [k for k, _ in index.search('AND', literal=True)] == ['B']
+    assert index.search('"', literal=True) == []
+
+def test_refresh(db, index):
+    keys = db.get_keys()
+    updated, removed = index.refresh(db, keys)
+    assert updated == len(keys)
+    assert removed == 0
+    assert index.refresh(db, keys) == (0, 0)
+    assert index.refresh(db) == (0, 0)
+
+    item = db.get_items(limit=1)[0]
+    word = item['title'].split()[0]
+    assert item['key'] in [k for k, _ in index.search(word, limit=len(keys))]
+    assert index.refresh(db, [k for k in keys if k != item['key']]) == (0, 1)
+
+def test_get_keys(db):
+    keys = db.get_keys()
+    assert sorted(keys) == sorted(i['key'] for i in db.get_items())
+
+class Library():
+    """
+    Items of a zotero database with their [version, clientDateModified].
+    """
+    def __init__(self, items, notes=[]):
+        self.items = {i['key']: i for i in items}
+        self.notes = {n['key']: n for n in notes}
+        self.version = 1
+        self.deleted = dict()
+
+    def library_state(self):
+        return [self.version]
+
+    def get_deleted(self, since=None):
+        return {k: d for k, d in self.deleted.items() if since is None or d > since}
+
+    def get_keys(self):
+        return list(self.items)
+
+    def get_modified(self, item_type='-note || attachment', since=None):
+        items = self.notes if item_type == 'note' else self.items
+        return {k: [i['version'], i['modified']] for k, i in items.items()
+                if since is None or i['version'] > since[0] or i['modified'] > since[1]}
+
+    def iter_items(self, keys=[]):
+        return [i for k, i in self.items.items() if len(keys) == 0 or k in keys]
+
+    def iter_notes(self, keys=[], parent_keys=[]):
+        return [n for k, n in self.notes.items() if (len(keys) == 0 or k in keys)
+                and (len(parent_keys) == 0 or n['parentItem'] in parent_keys)]
+
+def test_refresh_unsynced(index):
+    library = Library([{'key': 'A', 'version': 5, 'modified': '2024-01-01 10:00:00', 'title': 'Graphs'},
+                       {'key': 'B', 'version': 3, 'modified': '2024-01-02 10:00:00', 'title': 'Trees'}],
+                      [{'key': 'N', 'version': 2, 'modified': '2024-01-01 10:00:00', 'parentItem': 'B',
+                        'note': 'forest'}])
+    assert index.refresh(library) == (2, 0)
+    assert index.refresh(library) == (0, 0)
+
+    # edited locally, not synced yet: same version, newer modification date
+    library.items['A'].update(title='Networks', modified='2024-02-01 10:00:00')
+    library.notes['N'].update(note='jungle', modified='2024-02-01 10:00:00')
+    # created locally, not synced yet
+    library.items['C'] = {'key': 'C', 'version': 0, 'modified': '2024-02-02 10:00:00', 'title': 'Lakes'}
+    # the library state did not change, the library is not read
+    assert index.refresh(library) == (0, 0)
+    library.version += 1
+    assert index.refresh(library) == (3, 0)
+    assert [k for k, _ in index.search('networks')] == ['A']
+    assert [k for k, _ in index.search('jungle')] == ['B']
+    assert [k for k, _ in index.search('lakes')] == ['C']
+
+def test_refresh_deleted(index):
+    library = Library([{'key': k, 'version': 1, 'modified': '2024-01-01 10:00:00', 'title': k}
+                       for k in ['A', 'B', 'C']])
+    library.deleted['X'] = '2024-01-01 09:00:00'
+    assert index.refresh(library) == (3, 0)
+
+    del library.items['B']
+    library.deleted['B'] = '2024-01-03 10:00:00'
+    library.version += 1
+    assert index.refresh(library) == (0, 1)
+    assert sorted(k for k, _ in index.search('a OR b OR c')) == ['A', 'C']
+
+    # without a delete log, all keys are compared
+    library.get_deleted = lambda since=None: None
+    del library.items['C']
+    library.version += 1
+    assert index.refresh(library) == (0, 1)
+    assert len(index) == 1
@@ -0,0 +1,114 @@
+import os
+import pytest
+from src.snapshot import Snapshot, HEADER, MAGIC, INTERPRETER
+from src.dispatcher import Dispatcher
+
+@pytest.fixture
+def path(tmp_path):
+    path = str(tmp_path / 'snapshot.bin')
+    Snapshot.write(path, [3, 'stat'], {'papers': {'K1': 'a - b'}, 'tags': ['x', 'y'], 'empty': None})
+    return path
+
+def test_roundtrip(path):
+    snapshot = Snapshot.load(path, [3, 'stat'])
+    assert 'papers' in snapshot
+    assert snapshot['papers'] == {'K1': 'a - b'}
+    assert snapshot['tags'] == ['x', 'y']
+    assert snapshot['empty'] is None
+    assert snapshot.get('missing', 1) == 1
+    snapshot.close()
+
+def test_stale(path):
+    assert Snapshot.load(path, [4, 'stat']) is None
+    assert Snapshot.load(path, None) is None
+    assert Snapshot.load(path + '.missing', [3, 'stat']) is None
+
+def test_corrupt(path):
+    # cut short before the table of contents
+    with open(path, 'r+b') as f:
+        f.truncate(HEADER.size + 4)
+    assert Snapshot.load(path, [3, 'stat']) is None
+    with open(path, 'wb') as f:
+        f.write(b'not a snapshot')
+    assert Snapshot.load(path, [3, 'stat']) is None
+
+def test_corrupt_section(path):
+    snapshot = Snapshot.load(path, [3, 'stat'])
+    offset, length = snapshot.sections['papers']
+    snapshot.close()
+    with open(path, 'r+b') as f:
+        f.seek(offset)
+        f.write(b'\xff' * length)
+    snapshot = Snapshot.load(path, [3, 'stat'])
+    assert snapshot['tags'] == ['x', 'y']
+    with pytest.raises(ValueError):
+        snapshot['papers']
+    snapshot.discard()
+    assert not os.path.exists(path)
+
+def test_other_interpreter(path):
+    with open(path, 'r+b') as f:
+        header = list(HEADER.unpack(f.read(HEADER.size)))
+        assert header[:4] == [MAGIC, *INTERPRETER]
+        header[1] += 1
+        f.seek(0)
+        f.write(HEADER.pack(*header))
+    assert Snapshot.load(path, [3, 'stat']) is None
+
+def test_dispatcher(tmp_path, monkeypatch):
+    monkeypatch.setenv('PAPIERMACHE_SNAPSHOT_PATH', str(tmp_path / 'snapshot.bin'))
+    built = Dispatcher(session=None)
+    assert os.path.exists(str(tmp_path / 'snapshot.bin'))
+
+    loaded = Dispatcher(session=None, background=True)
+    loaded.wait_ready()
+    # read on first use
+    assert not any(name in loaded.sections for name in ['papers_reverse', 'identifiers', 'dois', 'children'])
+    assert loaded.papers == built.papers
+    assert loaded.papers_reverse == built.papers_reverse
+    assert loaded.tags == built.tags
+    assert loaded.dois == built.dois
+    assert loaded.children == built.children
+    assert loaded.collections.get_names() == built.collections.get_names()
+    name = next(iter(built.papers.values()))
+    assert list(loaded.paper_completer.matches(name)) == list(built.paper_completer.matches(name))
+
+def test_dispatcher_corrupt_section(tmp_path, monkeypatch):
+    path = str(tmp_path / 'snapshot.bin')
+    monkeypatch.setenv('PAPIERMACHE_SNAPSHOT_PATH', path)
+    built = Dispatcher(session=None)
+    snapshot = Snapshot(path)
+    offset, length = snapshot.sections['completer']
+    snapshot.close()
+    with open(path, 'r+b') as f:
+        f.seek(offset)
+        f.write(b'\xff' * length)
+
+    with pytest.warns(UserWarning, match='snapshot discarded'):
+        rebuilt = Dispatcher(session=None, background=True)
+        rebuilt.wait_ready()
+    assert rebuilt.papers == built.papers
+    name = next(iter(built.papers.values()))
+    assert list(rebuilt.paper_completer.matches(name)) == list(built.paper_completer.matches(name))
+    # the rebuilt indices are saved again
+    snapshot = Snapshot.load(path, rebuilt.db.library_state())
+    assert snapshot is not None
+    snapshot.close()
+
+def test_dispatcher_corrupt_deferred_section(tmp_path, monkeypatch):
+    path = str(tmp_path / 'snapshot.bin')
+    monkeypatch.setenv('PAPIERMACHE_SNAPSHOT_PATH', path)
+    built = Dispatcher(session=None)
+    snapshot = Snapshot(path)
+    offset, length = snapshot.sections['children']
+    snapshot.close()
+    with open(path, 'r+b') as f:
+        f.seek(offset)
+        f.write(b'\xff' * length)
+
+    loaded = Dispatcher(session=None)
+    assert loaded.snapshot is not None
+    with pytest.warns(UserWarning, match='snapshot discarded'):
+        assert loaded.children == built.children
+    assert loaded.snapshot is None
+    assert loaded.dois == built.dois
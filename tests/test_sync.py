@@ -0,0 +1,45 @@
+import pytest
+from src.db import ZoteroDatabase
+
+@pytest.fixture
+def db(tmp_path):
+    db = ZoteroDatabase(local=False, cache_path=str(tmp_path / 'mirror.sqlite'))
+    yield db
+    db.close_connection()
+
+def test_sync(db):
+    updated, deleted = db.remote_sync.sync()
+    assert updated > 0
+    assert db.remote_sync.library_version > 0
+    # nothing changed in between
+    assert db.remote_sync.sync(force=True) == (0, 0)
+
+def test_library_state(db):
+    versions = {'A': 5}
+    db.remote_sync.item_versions = lambda since: ({k: v for k, v in versions.items() if v > since},
+                                                  max(versions.values()))
+    db.remote_sync.fetch = lambda keys: [{'key': k, 'version': versions[k], 'itemType': 'book'} for k in keys]
+    db.remote_sync.deleted = lambda since: []
+    assert db.library_state() == [5]
+    # modified by another client after the last session
+    versions['B'] = 7
+    db.remote_sync.synced_at = None
+    assert db.library_state() == [7]
+    assert db.item_cache.conn.execute('SELECT COUNT(*) FROM items;').fetchone()[0] == 2
+
+def test_get_items_mirror(db):
+    keys = ['XXLF2GYS', 'JTWSQKIS', '4SDR5E5R', 'UYJJPTXG']
+    item_type = 'journalArticle'
+    tags = '# important'
+
+    items = db.get_items(keys=keys, item_type=item_type, tags=tags)
+    assert len(items) == 1
+    assert items[0]['key'] == 'XXLF2GYS'
+
+def test_get_notes_mirror(db):
+    keys = ['XXLF2GYS', 'JTWSQKIS', '4SDR5E5R', 'UYJJPTXG']
+    parent_keys = ['FVGL3T4D']
+
+    notes = db.get_notes(keys=keys, parent_keys=parent_keys)
+    assert len(notes) == 1
+    assert notes[0]['key'] == '4SDR5E5R'
@@ -0,0 +1,47 @@
+import pytest
+from src.trigram import TrigramIndex
+from src.dispatcher import Dispatcher
+
+@pytest.fixture
+def index():
+    index = TrigramIndex()
+    index.update({'A': ('smith2020 - Deep learning of graphs', '10.1000/abc.123'),
+                  'B': ('müller2019 - Shallow water equations', None, '9780195399820'),
+                  'C': ('smith2021 - Graph neural networks',)})
+    return index
+
+def test_ngrams(index):
+    assert index.ngrams('Ab') == {' ab', 'ab '}
+    assert index.ngrams('Müller') == index.ngrams('muller')
+    assert index.ngrams('') == set()
+
+def test_search(index):
+    assert index.search('smith2020 - Deep learning of graphs')[0] == ('A', 1.0)
+    assert index.search('smtih2020 - deep lerning')[0][0] == 'A'
+    assert index.search('shallow water')[0][0] == 'B'
+    assert index.search('muller2019')[0][0] == 'B'
+    assert index.search('10.1000/abc.123')[0][0] == 'A'
+    assert index.search('9780195399820')[0][0] == 'B'
+    assert index.search('quantum chromodynamics') == []
+    assert [k for k, _ in index.search('smith', limit=5)] == ['A', 'C'] or \
+           [k for k, _ in index.search('smith', limit=5)] == ['C', 'A']
+
+def test_update(index):
+    grams = len(index.postings)
+    assert index.update({'A': ('smith2020 - Deep learning of graphs', '10.1000/abc.123'),
+                         'C': ('smith2021 - Graph neural networks',)}) == (0, 1)
+    assert 'B' not in index
+    assert index.search('shallow water') == []
+    assert len(index.postings) < grams
+    assert index.update({'A': ('jones2020 - Deep learning of graphs',),
+                         'C': ('smith2021 - Graph neural networks',)}) == (1, 0)
+    assert index.search('jones2020')[0][0] == 'A'
+    assert index.search('10.1000/abc.123') == []
+
+def test_lookup_paper():
+    d = Dispatcher(session=None)
+    key, name = next(iter(d.papers.items()))
+    assert d.lookup_paper(name) == key
+    assert d.lookup_paper(name[:-3]) == key
+    assert d.select_keys(name[1:].split(), verbose=False) == [key]
+    assert d.select_keys(name[1:].split(), verbose=False, fuzzy=False) == [None]
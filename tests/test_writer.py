@@ -0,0 +1,148 @@
+import pytest
+from src.writer import WriteQueue
+from src.journal import Journal
+from pyzotero.zotero_errors import HTTPError
+
+@pytest.fixture
+def queue():
+    queue = WriteQueue(connect=None)
+    yield queue
+    queue.pool.shutdown()
+
+def test_merge(queue):
+    update = {'key': 'A', 'version': 1, 'title': 'a', 'relations': {'dc:relation': ['x']}}
+    other = {'key': 'A', 'version': 1, 'title': 'b', 'relations': {'dc:relation': ['x', 'y']}}
+
+    merged = queue.merge(update, other)
+    assert merged['title'] == 'b'
+    assert merged['relations'] == {'dc:relation': ['x', 'y']}
+
+def test_rebase(queue):
+    update = {'key': 'A', 'version': 1, 'relations': {'dc:relation': ['x']}}
+    current = {'key': 'A', 'version': 5, 'title': 'a', 'relations': {'dc:relation': ['z']}}
+
+    rebased = queue.rebase(update, current)
+    assert rebased == {'key': 'A', 'version': 5, 'relations': {'dc:relation': ['z', 'x']}}
+    assert 'relations' not in queue.rebase({'key': 'A', 'version': 1, 'title': 'b'}, current, {'title': 'a'})
+
+def test_rebase_changed(queue):
+    update = {'key': 'A', 'version': 1, 'title': 'b', 'creators': [{'lastName': 'Smith'}]}
+    current = {'key': 'A', 'version': 5, 'title': 'a', 'creators': [{'lastName': 'Smyth'}]}
+
+    assert queue.changed(update, current, {'title': 'a', 'creators': [{'lastName': 'Smith, J.'}]}) == ['creators']
+    assert queue.rebase(update, current, {'title': 'a', 'creators': [{'lastName': 'Smith, J.'}]}) is None
+    # unknown previous values count as changed
+    assert queue.changed(update, current) == ['title', 'creators']
+    assert queue.changed(update, dict(current, creators=[{'lastName': 'Smith'}]), {'title': 'a'}) == []
+
+def test_put_coalesces(queue):
+    queue.put({'key': 'A', 'version': 1, 'title': 'a'})
+    queue.put({'key': 'A', 'version': 1, 'url': 'u'})
+    assert queue.pending == {'A': {'key': 'A', 'version': 1, 'title': 'a', 'url': 'u'}}
+
+class Zotero():
+    """
+    Fake pyzotero client answering update_items with fixed failures.
+    """
+
+    def __init__(self, failed, items=()):
+        self.failed = failed
+        self.items_data = list(items)
+        self.updated = []
+        self.request = self
+
+    def update_items(self, batch):
+        self.updated.append(batch)
+        if isinstance(self.failed, Exception):
+            raise self.failed
+
+    def json(self):
+        failed, self.failed = self.failed, {}
+        return {'failed': failed}
+
+    def items(self, itemKey, limit):
+        return [{'key': i['key'], 'data': i} for i in self.items_data if i['key'] in itemKey.split(',')]
+
+def test_write_rejected(tmp_path):
+    journal = Journal(str(tmp_path / 'journal.jsonl'))
+    zot = Zotero({'1': {'key': 'B', 'code': 400, 'message': "invalid field 'foo'"}})
+    with WriteQueue(connect=lambda: zot, journal=journal) as queue:
+        queue.put({'key': 'A', 'version': 1, 'title': 'a'})
+        queue.put({'key': 'B', 'version': 1, 'foo': 'b'})
+
+    assert journal.pending() == {}
+    assert list(journal.rejected().values()) == [({'key': 'B', 'version': 1, 'foo': 'b'}, "400 invalid field 'foo'")]
+    assert queue.rejected == {'B': "400 invalid field 'foo'"}
+    assert queue.failed == {}
+    assert '1 rejected' in queue.report()
+
+    # tombstones survive compaction and are not resumed
+    journal.close()
+    journal = Journal(journal.path)
+    assert journal.pending() == {}
+    assert len(journal.rejected()) == 1
+    journal.close()
+
+def test_write_deleted(tmp_path):
+    journal = Journal(str(tmp_path / 'journal.jsonl'))
+    zot = Zotero({'0': {'key': 'A', 'code': 412, 'message': 'library modified'}})
+    with WriteQueue(connect=lambda: zot, journal=journal) as queue:
+        queue.put({'key': 'A', 'version': 1, 'title': 'a'})
+
+    assert journal.pending() == {}
+    assert queue.rejected == {'A': 'item not found'}
+    journal.close()
+
+def test_write_transient(tmp_path):
+    journal = Journal(str(tmp_path / 'journal.jsonl'))
+    zot = Zotero({'0': {'key': 'A', 'code': 503, 'message': 'service unavailable'}})
+    with WriteQueue(connect=lambda: zot, journal=journal) as queue:
+        queue.put({'key': 'A', 'version': 1, 'title': 'a'})
+
+    assert list(journal.pending().values()) == [{'key': 'A', 'version': 1, 'title': 'a'}]
+    assert queue.failed == {'A': 'service unavailable'}
+    assert queue.rejected == {}
+    journal.close()
+
+def test_write_request_failed(tmp_path):
+    journal = Journal(str(tmp_path / 'journal.jsonl'))
+    zot = Zotero(HTTPError('Code: 503 service unavailable'))
+    with WriteQueue(connect=lambda: zot, batch_size=2, journal=journal) as queue:
+        for key in ['A', 'B', 'C']:
+            queue.put({'key': key, 'version': 1, 'title': key.lower()})
+
+    # every batch was sent, none acknowledged
+    assert len(zot.updated) == 2
+    assert len(journal.pending()) == 3
+    assert queue.failed == {k: 'Code: 503 service unavailable' for k in ['A', 'B', 'C']}
+    assert queue.rejected == {}
+    assert '3 failed' in queue.report()
+    journal.close()
+
+def test_write_conflicting_edit(tmp_path):
+    journal = Journal(str(tmp_path / 'journal.jsonl'))
+    item = {'key': 'A', 'version': 1, 'title': 'a', 'creators': [{'firstName': 'J', 'lastName': 'Smith'}]}
+    # creators were edited by someone else meanwhile, the title was not
+    current = dict(item, version=2, creators=[{'firstName': 'John', 'lastName': 'Smith'}])
+    zot = Zotero({'0': {'key': 'A', 'code': 412, 'message': 'library modified'}}, [current])
+    with WriteQueue(connect=lambda: zot, journal=journal) as queue:
+        queue.put({'key': 'A', 'version': 1, 'creators': [{'firstName': 'J.', 'lastName': 'Smith'}]}, base=item)
+
+    assert len(zot.updated) == 1
+    assert queue.rejected == {'A': 'changed meanwhile: creators'}
+    assert journal.pending() == {}
+    journal.close()
+
+def test_write_rebased_edit(tmp_path):
+    journal = Journal(str(tmp_path / 'journal.jsonl'))
+    item = {'key': 'A', 'version': 1, 'title': 'a', 'creators': [{'firstName': 'J', 'lastName': 'Smith'}]}
+    current = dict(item, version=2, title='b')
+    zot = Zotero({'0': {'key': 'A', 'code': 412, 'message': 'library modified'}}, [current])
+    update = {'key': 'A', 'version': 1, 'creators': [{'firstName': 'J.', 'lastName': 'Smith'}]}
+    with WriteQueue(connect=lambda: zot, journal=journal) as queue:
+        queue.put(update, base=item)
+
+    assert zot.updated[-1] == [dict(update, version=2)]
+    assert queue.rejected == {}
+    assert journal.pending() == {}
+    journal.close()